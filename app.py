@@ -1,40 +1,116 @@
 # app.py
 
+import time
+from page_timings import record_imports, record_run, record_page
+_imports_started = time.perf_counter()
+
+import importlib
+import sys
 import streamlit as st
 from utils import COR_PRINCIPAL, LOGO_PATH, NUMERO_CONTATO
-from pages.auth import pagina_login_cadastro
-from pages.home import pagina_home
-from pages.servicos import pagina_servicos
-from pages.administracao import pagina_administracao
-from pages.admin_produtos import pagina_admin_produtos 
-from pathlib import Path
-from database import initialize_db, get_all_users
+from assets import get_css_markup, get_logo_png
+from backup import start_backup_scheduler
+from database import initialize_db
+from ingest import start_ingest
+from order_queue import start_order_writer
+from session_store import SESSION_COOKIE, end_session, rotate_session, session_cookie_script
 
-def load_css(file_name):
-    """Carrega o arquivo CSS e o injeta no Streamlit."""
+record_imports((time.perf_counter() - _imports_started) * 1000)
+
+# Registro de páginas: o módulo de cada página (e o que ele importa, como pandas) só é
+# importado na primeira vez que a página é aberta. Nome -> (módulo, função, só para Admin)
+PAGES = {
+    "Home": ("pages.home", "pagina_home", False),
+    "Nossos Serviços": ("pages.servicos", "pagina_servicos", False),
+    "Gerenciar Produtos (Admin)": ("pages.admin_produtos", "pagina_admin_produtos", True),
+    "Pedidos (Admin)": ("pages.pedidos", "pagina_pedidos", True),
+    "Relatórios de Vendas (Admin)": ("pages.relatorios", "pagina_relatorios", True),
+    "Administração (Usuários)": ("pages.administracao", "pagina_administracao", True),
+    "Métricas (Admin)": ("pages.metricas", "pagina_metricas", True),
+}
+LOGIN_PAGE = ("pages.auth", "pagina_login_cadastro")
+
+def render_page(name: str, module_name: str, function_name: str) -> None:
+    """Importa o módulo da página se necessário, executa a função da página e registra os tempos."""
+    # Sempre via import_module: se outra sessão estiver importando a página neste momento, ele espera
+    # o import terminar (sys.modules já contém o módulo parcialmente inicializado durante o import)
+    first_import = module_name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_ms = (time.perf_counter() - start) * 1000 if first_import else None
+    page = getattr(module, function_name)
+    
+    start = time.perf_counter()
     try:
-        with open(file_name) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    except FileNotFoundError:
+        page()
+    finally:
+        # Também conta quando a página interrompe a execução com st.rerun()
+        record_page(name, (time.perf_counter() - start) * 1000, import_ms)
+
+def load_css(file_name):
+    """Injeta o CSS no Streamlit (lido e minificado uma vez por processo, servido da memória)."""
+    css_markup = get_css_markup(file_name)
+    if css_markup:
+        st.markdown(css_markup, unsafe_allow_html=True)
+    else:
         st.sidebar.error("Arquivo CSS (style.css) não encontrado. Verifique o caminho.")
         
 def inicializar_estado():
     """Inicializa as variáveis de estado de sessão e dados iniciais."""
     initialize_db()
+    start_order_writer()
+    start_backup_scheduler()
+    start_ingest()
     
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
         st.session_state.username = "Convidado"
         st.session_state.user_email = ""
         st.session_state.is_admin = False 
+        st.session_state.session_token = ""
+        restaurar_sessao()
     
-    st.session_state.users = get_all_users() 
+    # Links antigos traziam o token na URL: nunca é aceito, só removido
+    if "sessao" in st.query_params:
+        del st.query_params["sessao"]
     
     if 'page' not in st.session_state:
         st.session_state.page = 'Home'
 
+def restaurar_sessao():
+    """
+    Restaura a sessão de uma aba recarregada pelo cookie (uma busca indexada, sem refazer o hash da
+    senha). O token é trocado por um novo a cada restauração; só roda no início da sessão do navegador,
+    pois o cookie lido pelo Streamlit é o do momento da conexão.
+    """
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token or not isinstance(token, str): # Fora do servidor (ex.: AppTest) não há cookies reais
+        return
+    restored = rotate_session(token)
+    if restored is None:
+        st.session_state.pending_session_cookie = "" # Expirado: apaga o cookie
+        return
+    new_token, session = restored
+    st.session_state.logged_in = True
+    st.session_state.username = session['name']
+    st.session_state.user_email = session['email']
+    st.session_state.is_admin = session['role'] == 'admin'
+    st.session_state.session_token = new_token
+    st.session_state.pending_session_cookie = new_token
+
+def gravar_cookie_sessao():
+    """Grava no navegador o cookie pendente (login, restauração ou saída)."""
+    if 'pending_session_cookie' not in st.session_state:
+        return
+    token = st.session_state.pop('pending_session_cookie')
+    # Sessões de administrador não sobrevivem ao fechamento do navegador
+    st.html(session_cookie_script(token, persistent=not st.session_state.is_admin), unsafe_allow_javascript=True)
+
 def pagina_sair():
     """Função para encerrar a sessão do usuário."""
+    end_session(st.session_state.get('session_token'))
+    st.session_state.session_token = ""
+    st.session_state.pending_session_cookie = ""
     st.session_state.logged_in = False
     st.session_state.username = "Convidado"
     st.session_state.user_email = ""
@@ -56,50 +132,36 @@ def main():
     
     # 2. Inicializar estado
     inicializar_estado()
+    gravar_cookie_sessao()
     
     # 3. Exibir Logo na Sidebar
-    if Path(LOGO_PATH).exists():
-        st.sidebar.image(LOGO_PATH, width='stretch', output_format="PNG")
+    logo_png = get_logo_png(LOGO_PATH)
+    if logo_png:
+        st.sidebar.image(logo_png, width='stretch', output_format="PNG")
     else:
         st.sidebar.warning("Logo não encontrada! Usando título.")
         st.sidebar.header("A Fadinha Bordados")
         
     # 4. Gerenciamento de Autenticação e Navegação
     if not st.session_state.logged_in:
-        pagina_login_cadastro()
-        pagina_home() 
+        render_page("Login", *LOGIN_PAGE)
+        render_page("Home", *PAGES["Home"][:2]) 
     else:
         st.sidebar.markdown(f"**Usuário:** {st.session_state.username} ({'Admin' if st.session_state.is_admin else 'Cliente'})")
         
-        pages = ["Home", "Nossos Serviços"]
-        
-        if st.session_state.is_admin:
-            pages.append("Gerenciar Produtos (Admin)") 
-            pages.append("Administração (Usuários)") 
-
+        pages = [name for name, (_, _, admin_only) in PAGES.items() if st.session_state.is_admin or not admin_only]
         pages.append("Sair")
         
         st.session_state.page = st.sidebar.radio("Navegação", pages, index=pages.index(st.session_state.page) if st.session_state.page in pages else 0)
         
         st.sidebar.markdown("---")
         
-        # Roteamento
-        if st.session_state.page == "Home":
-            pagina_home()
-        elif st.session_state.page == "Nossos Serviços":
-            pagina_servicos()
-        elif st.session_state.page == "Administração (Usuários)":
-            if st.session_state.is_admin:
-                pagina_administracao() 
-            else:
-                pagina_home() 
-        elif st.session_state.page == "Gerenciar Produtos (Admin)":
-            if st.session_state.is_admin:
-                pagina_admin_produtos() 
-            else:
-                pagina_home() 
-        elif st.session_state.page == "Sair":
+        # Roteamento (páginas de Admin só aparecem na lista acima para administradores)
+        if st.session_state.page == "Sair":
             pagina_sair()
+        else:
+            module_name, function_name, _ = PAGES[st.session_state.page]
+            render_page(st.session_state.page, module_name, function_name)
 
     # 5. Adicionar Contato e Link do WhatsApp (BOTTOM)
     clean_number = NUMERO_CONTATO.replace('+', '').replace(' ', '').replace('-', '')
@@ -118,4 +180,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    _run_started = time.perf_counter()
+    try:
+        main()
+    finally:
+        record_run((time.perf_counter() - _run_started) * 1000)
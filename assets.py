@@ -0,0 +1,73 @@
+# assets.py
+
+import io
+import os
+import re
+import threading
+from typing import Optional, Dict, Tuple, Callable
+
+LOGO_MAX_WIDTH = 600   # Largura máxima do logo (px): ~2x a barra lateral, nítido em telas de alta densidade
+
+# Arquivos estáticos processados uma vez por processo e servidos da memória.
+# Chave (tipo, caminho) -> (mtime_ns, conteúdo): editar o arquivo em desenvolvimento recarrega na próxima execução.
+_cache: Dict[Tuple[str, str], Tuple[int, object]] = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "loads": 0}
+
+def _cached(kind: str, path: str, loader: Callable[[str], object]) -> Optional[object]:
+    """Retorna o conteúdo em cache se o arquivo não mudou (um stat por chamada); None se o arquivo não existe."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    key = (kind, path)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == mtime:
+            _stats["hits"] += 1
+            return entry[1]
+
+    value = loader(path)
+    with _lock:
+        _cache[key] = (mtime, value)
+        _stats["loads"] += 1
+    return value
+
+def minify_css(css: str) -> str:
+    """Remove comentários e espaços desnecessários (sem alterar seletores ou valores)."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+def _load_css(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f"<style>{minify_css(f.read())}</style>"
+
+def _load_logo(path: str) -> bytes:
+    """Reduz o logo para no máximo LOGO_MAX_WIDTH e regrava o PNG otimizado (sem perdas)."""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+        if image.width > LOGO_MAX_WIDTH:
+            height = round(image.height * LOGO_MAX_WIDTH / image.width)
+            image = image.resize((LOGO_MAX_WIDTH, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+def get_css_markup(path: str) -> Optional[str]:
+    """Bloco <style> com o CSS minificado, pronto para st.markdown (None se o arquivo não existe)."""
+    return _cached("css", path, _load_css)
+
+def get_logo_png(path: str) -> Optional[bytes]:
+    """
+    Bytes PNG do logo já redimensionado. Como o formato e a largura já servem, o st.image
+    repassa os bytes sem decodificar nem recodificar a imagem a cada execução.
+    """
+    return _cached("logo", path, _load_logo)
+
+def get_asset_stats() -> Dict:
+    with _lock:
+        return dict(_stats, cached=len(_cache))
@@ -0,0 +1,332 @@
+# backup.py
+"""
+Backups online do banco (fadinha_db.db) e das imagens referenciadas.
+
+Cada backup gera em BACKUP_FOLDER:
+  - db/fadinha-<data>.db.gz: cópia do banco feita pela API de backup do SQLite, em passos
+    de poucas páginas, comprimida com gzip;
+  - db/fadinha-<data>.json: manifesto (tamanhos, duração e as imagens referenciadas);
+  - images/<2 primeiros hex>/<sha256><extensão>: imagens guardadas pelo hash do conteúdo,
+    compartilhadas entre os backups (cada backup só copia as imagens que ainda não estão lá).
+São mantidos os BACKUP_KEEP backups mais recentes; imagens que nenhum deles usa são apagadas.
+Depois de cada backup automático, as imagens do armazenamento que nenhum produto/pedido referencia
+(uploads de cadastros que falharam, imagens que o ingest não conseguiu associar) são removidas.
+
+Uso (na raiz do projeto):
+    python backup.py create
+    python backup.py list
+    python backup.py restore [fadinha-<data>]   (com o app parado; sem nome, restaura o mais recente)
+    python backup.py collect-orphans            (remove as imagens sem referência)
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+import database
+from database import get_db_connection
+from image_store import collect_orphan_images
+from storage import get_storage, put_object
+
+BACKUP_FOLDER = Path(os.environ.get("FADINHA_BACKUP_DIR", "backups"))
+BACKUP_KEEP = int(os.environ.get("FADINHA_BACKUP_KEEP", "7"))                       # Backups mantidos na rotação
+BACKUP_INTERVAL_HOURS = float(os.environ.get("FADINHA_BACKUP_INTERVAL_HOURS", "6")) # 0 desliga o backup automático
+BACKUP_PAGES_PER_STEP = 256        # Páginas copiadas por passo da API de backup (~1 MiB com páginas de 4 KiB)
+BACKUP_STEP_PAUSE_MS = 2           # Pausa entre os passos: a cópia cede CPU/IO às requisições do app
+BACKUP_COMPRESS_LEVEL = 6
+BACKUP_CHUNK_SIZE = 1024 * 1024    # Bytes lidos/gravados por vez ao comprimir e copiar arquivos
+
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+_lock = threading.Lock()           # Um backup por vez no processo
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_stats = {"runs": 0, "errors": 0, "last_name": None, "last_at": None, "last_ms": 0.0,
+          "last_db_bytes": 0, "last_archive_bytes": 0, "last_new_images": 0, "last_error": None,
+          "orphans_removed": 0}
+_stats_lock = threading.Lock()
+
+def _db_folder() -> Path:
+    return BACKUP_FOLDER / "db"
+
+def _image_folder() -> Path:
+    return BACKUP_FOLDER / "images"
+
+def _blob_path(digest: str, suffix: str) -> Path:
+    return _image_folder() / digest[:2] / f"{digest}{suffix.lower()}"
+
+def _download_blob(key: str) -> Tuple[Path, bool]:
+    """
+    Lê a imagem do armazenamento (disco ou S3, em blocos) calculando o SHA-256 e a guarda no backup.
+    Retorna (caminho do blob, True se o blob é novo). FileNotFoundError se a imagem não existe mais.
+    """
+    _image_folder().mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(dir=_image_folder(), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in get_storage().stream(key, BACKUP_CHUNK_SIZE):
+                sha.update(chunk)
+                tmp.write(chunk)
+        blob = _blob_path(sha.hexdigest(), Path(key).suffix)
+        if blob.exists():
+            return blob, False
+        blob.parent.mkdir(exist_ok=True)
+        os.replace(tmp_name, blob)
+        return blob, True
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+def _snapshot_database(target: Path) -> int:
+    """
+    Copia o banco para `target` com a API de backup, BACKUP_PAGES_PER_STEP páginas por passo.
+    A origem mantém uma transação de leitura aberta durante a cópia: em WAL isso não bloqueia
+    as escritas do app e fixa o snapshot (sem ela, cada commit de outra conexão reiniciaria a cópia).
+    Retorna o número de páginas copiadas.
+    """
+    source = get_db_connection(read_only=True)
+    dest = sqlite3.connect(target)
+    pages = [0]
+
+    def pause(status, remaining, total):
+        pages[0] = total
+        time.sleep(BACKUP_STEP_PAUSE_MS / 1000)
+
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(dest, pages=BACKUP_PAGES_PER_STEP, progress=pause)
+        source.commit()
+        check = dest.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"cópia do banco inválida: {check}")
+        dest.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dest.close()
+        source.close()
+    return pages[0]
+
+def _referenced_images(copy: Path) -> List[str]:
+    """Imagens referenciadas segundo a cópia do banco (consistente com o snapshot, não com o banco atual)."""
+    conn = sqlite3.connect(copy)
+    try:
+        return [row[0] for row in conn.execute("SELECT path FROM image_refs WHERE refcount > 0 ORDER BY path")]
+    finally:
+        conn.close()
+
+def _snapshot_images(image_paths: List[str]) -> Dict:
+    """
+    Copia as imagens que ainda não estão no backup. Imagens endereçadas por conteúdo (nome = hash)
+    que já têm blob não são lidas de novo. Retorna {'files': {chave: blob}, 'new': n}.
+    """
+    files, new = {}, 0
+    for image_path in image_paths:
+        path = Path(image_path)
+        blob = _blob_path(path.stem, path.suffix) if _HASH_NAME.match(path.stem) else None
+        if blob is None or not blob.exists():
+            try:
+                blob, created = _download_blob(image_path)
+            except FileNotFoundError:
+                continue
+            new += created
+        files[image_path] = blob.relative_to(BACKUP_FOLDER).as_posix()
+    return {"files": files, "new": new}
+
+def create_backup() -> Dict:
+    """Faz um backup completo (banco + imagens), aplica a rotação e retorna o manifesto gravado."""
+    with _lock:
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        name = base = f"fadinha-{now.strftime('%Y%m%d-%H%M%S')}"
+        _db_folder().mkdir(parents=True, exist_ok=True)
+        suffix = 1
+        while (_db_folder() / f"{name}.json").exists():  # Dois backups no mesmo segundo
+            suffix += 1
+            name = f"{base}-{suffix}"
+        archive = _db_folder() / f"{name}.db.gz"
+
+        with tempfile.TemporaryDirectory(dir=_db_folder()) as tmp:
+            copy = Path(tmp) / "fadinha_db.db"
+            pages = _snapshot_database(copy)
+            db_bytes = copy.stat().st_size
+            image_paths = _referenced_images(copy)
+            partial = archive.with_suffix(".gz.part")
+            with open(copy, "rb") as src, gzip.open(partial, "wb", compresslevel=BACKUP_COMPRESS_LEVEL) as dst:
+                shutil.copyfileobj(src, dst, BACKUP_CHUNK_SIZE)
+            os.replace(partial, archive)
+
+        images = _snapshot_images(image_paths)
+        manifest = {
+            "name": name,
+            "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": now.timestamp(),
+            "database": archive.name,
+            "db_pages": pages,
+            "db_bytes": db_bytes,
+            "archive_bytes": archive.stat().st_size,
+            "images": images["files"],
+            "new_images": images["new"],
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+        with open(_db_folder() / f"{name}.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+        prune_backups()
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats.update(last_name=name, last_at=manifest["created_at"], last_ms=manifest["elapsed_ms"],
+                      last_db_bytes=db_bytes, last_archive_bytes=manifest["archive_bytes"], last_new_images=images["new"])
+    return manifest
+
+def list_backups() -> List[Dict]:
+    """Manifestos dos backups existentes, do mais recente para o mais antigo."""
+    manifests = []
+    for path in _db_folder().glob("fadinha-*.json"):
+        with open(path, encoding="utf-8") as f:
+            manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m["timestamp"], reverse=True)
+
+def prune_backups(keep: int = None) -> int:
+    """Apaga os backups além dos `keep` mais recentes e as imagens que nenhum backup restante usa. Retorna os backups apagados."""
+    keep = BACKUP_KEEP if keep is None else keep
+    manifests = list_backups()
+    for manifest in manifests[keep:]:
+        (_db_folder() / manifest["database"]).unlink(missing_ok=True)
+        (_db_folder() / f"{manifest['name']}.json").unlink(missing_ok=True)
+
+    used = {blob for manifest in manifests[:keep] for blob in manifest["images"].values()}
+    for blob in _image_folder().glob("??/*"):
+        if blob.relative_to(BACKUP_FOLDER).as_posix() not in used:
+            blob.unlink(missing_ok=True)
+    return max(0, len(manifests) - keep)
+
+def restore_backup(name: Optional[str] = None) -> Dict:
+    """
+    Restaura o banco e as imagens de um backup (o mais recente se `name` for None).
+    O banco é gravado pela API de backup sobre DATABASE_NAME (seguro mesmo com arquivos -wal/-shm
+    presentes); as imagens voltam para o armazenamento configurado (storage.py), sem sobrescrever
+    as que ainda existem. Execute com o app parado.
+    """
+    manifests = list_backups()
+    manifest = next((m for m in manifests if name in (None, m["name"])), None)
+    if manifest is None:
+        raise FileNotFoundError(f"Backup não encontrado: {name or '(nenhum backup)'}")
+
+    with tempfile.TemporaryDirectory(dir=_db_folder()) as tmp:
+        copy = Path(tmp) / "fadinha_db.db"
+        with gzip.open(_db_folder() / manifest["database"], "rb") as src, open(copy, "wb") as dst:
+            shutil.copyfileobj(src, dst, BACKUP_CHUNK_SIZE)
+        source = sqlite3.connect(copy)
+        try:
+            check = source.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"backup {manifest['name']} corrompido: {check}")
+            database.close_db_connections()
+            dest = sqlite3.connect(database.DATABASE_NAME)
+            try:
+                source.backup(dest, pages=BACKUP_PAGES_PER_STEP)
+            finally:
+                dest.close()
+        finally:
+            source.close()
+
+    restored = 0
+    storage = get_storage()
+    for image_path, blob in manifest["images"].items():
+        if not storage.exists(image_path):
+            with open(BACKUP_FOLDER / blob, "rb") as f:
+                put_object(image_path, f)
+            restored += 1
+    return {"name": manifest["name"], "images_restored": restored}
+
+# --- Backup automático (thread do servidor) ---
+
+def _scheduler_loop() -> None:
+    interval = BACKUP_INTERVAL_HOURS * 3600
+    while True:
+        time.sleep(interval)
+        _run_logged()
+        _collect_orphans_logged()
+
+def start_backup_scheduler() -> None:
+    """Inicia (uma vez por processo) o backup a cada BACKUP_INTERVAL_HOURS; não faz nada se o intervalo for 0."""
+    global _scheduler
+    if BACKUP_INTERVAL_HOURS <= 0 or (_scheduler is not None and _scheduler.is_alive()):
+        return
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_scheduler_loop, name="backup", daemon=True)
+            _scheduler.start()
+
+def _run_logged() -> None:
+    try:
+        create_backup()
+    except Exception as e:
+        print(f"ERRO ao gerar backup: {e}")
+        with _stats_lock:
+            _stats["errors"] += 1
+            _stats["last_error"] = str(e)
+
+def _collect_orphans_logged() -> None:
+    """Limpeza das imagens sem referência; roda depois do backup, que só copia as referenciadas."""
+    try:
+        removed = collect_orphan_images()
+    except Exception as e:
+        print(f"ERRO ao remover imagens sem referência: {e}")
+        return
+    with _stats_lock:
+        _stats["orphans_removed"] += removed
+
+def start_backup_now() -> bool:
+    """Gera um backup em segundo plano (botão da página de métricas). Retorna False se já há um em andamento."""
+    if _lock.locked():
+        return False
+    threading.Thread(target=_run_logged, name="backup-manual", daemon=True).start()
+    return True
+
+def get_backup_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["running"] = _lock.locked()
+    stats["scheduled"] = _scheduler is not None and _scheduler.is_alive()
+    return stats
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="Gera um novo backup")
+    commands.add_parser("list", help="Lista os backups existentes")
+    restore = commands.add_parser("restore", help="Restaura um backup (com o app parado)")
+    restore.add_argument("name", nargs="?", help="Nome do backup (padrão: o mais recente)")
+    commands.add_parser("collect-orphans", help="Remove do armazenamento as imagens que nenhum produto/pedido referencia")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        database.initialize_db()
+        m = create_backup()
+        print(f"{m['name']}: banco {m['db_bytes'] / 1e6:.1f} MB -> {m['archive_bytes'] / 1e6:.1f} MB comprimido, "
+              f"{len(m['images'])} imagens ({m['new_images']} novas) em {m['elapsed_ms'] / 1000:.2f}s")
+    elif args.command == "list":
+        for m in list_backups():
+            print(f"{m['name']}  {m['created_at']} UTC  {m['archive_bytes'] / 1e6:8.1f} MB  {len(m['images'])} imagens")
+    elif args.command == "collect-orphans":
+        database.initialize_db()
+        print(f"{collect_orphan_images()} imagens sem referência removidas.")
+    else:
+        result = restore_backup(args.name)
+        print(f"Backup {result['name']} restaurado em {database.DATABASE_NAME} ({result['images_restored']} imagens recuperadas).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/backup_impact.py
+"""
+Impacto do backup online (backup.py) na latência dos pedidos.
+
+Em um banco temporário populado (mesmo gerador do bench_database), várias threads gravam
+pedidos com add_order continuamente e a latência é medida:
+  1. sem backup (referência);
+  2. durante create_backup() com BACKUP_PAGES_PER_STEP páginas por passo (padrão);
+  3. durante create_backup() copiando o banco em um único passo, para comparação.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.backup_impact --orders 500000 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import backup  # noqa: E402
+import database  # noqa: E402
+from benchmarks.bench_database import seed_database  # noqa: E402
+from benchmarks.contention import summarize  # noqa: E402
+
+def write_orders(threads: int, until) -> tuple:
+    """Grava pedidos em `threads` threads até `until()` ser verdadeiro. Retorna (latências ms, erros, segundos)."""
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def worker(i):
+        local, failed = [], 0
+        while not until():
+            t0 = time.perf_counter()
+            if not database.add_order(f"cliente{i}@exemplo.com", "Produto 00001", 1, "benchmark de backup"):
+                failed += 1
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+def report(label: str, latencies: list, errors: int, elapsed: float) -> None:
+    print(f"{label}")
+    print(f"  {len(latencies)} pedidos em {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s), {errors} erros")
+    print(f"  Latência de add_order: {summarize(latencies)}")
+
+def run_with_backup(label: str, threads: int, pages_per_step: int) -> None:
+    backup.BACKUP_PAGES_PER_STEP = pages_per_step
+    done = threading.Event()
+    result = {}
+
+    def run_backup():
+        time.sleep(0.2)  # Deixa os escritores começarem antes
+        try:
+            result["manifest"] = backup.create_backup()
+        finally:
+            done.set()
+
+    runner = threading.Thread(target=run_backup)
+    runner.start()
+    latencies, errors, elapsed = write_orders(threads, done.is_set)
+    runner.join()
+    report(label, latencies, errors, elapsed)
+    m = result.get("manifest")
+    if m:
+        print(f"  Backup: {m['db_bytes'] / 1e6:.1f} MB -> {m['archive_bytes'] / 1e6:.1f} MB comprimido em {m['elapsed_ms'] / 1000:.2f}s")
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=300_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    default_pages = backup.BACKUP_PAGES_PER_STEP
+    with tempfile.TemporaryDirectory(prefix="fadinha_backup_") as tmp:
+        print(f"Populando banco temporário ({args.users} usuários, {args.products} produtos, {args.orders} pedidos)...")
+        seed_database(os.path.join(tmp, "bench.db"), args.users, args.products, args.orders)
+        backup.BACKUP_FOLDER = Path(tmp) / "backups"
+
+        deadline = time.perf_counter() + args.baseline_seconds
+        report("\n1. Sem backup", *write_orders(args.threads, lambda: time.perf_counter() >= deadline))
+        run_with_backup(f"\n2. Durante o backup ({default_pages} páginas por passo)", args.threads, default_pages)
+        run_with_backup("\n3. Durante o backup (banco inteiro em um único passo)", args.threads, -1)
+        database.close_db_connections()
+
+if __name__ == "__main__":
+    main()
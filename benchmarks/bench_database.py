@@ -0,0 +1,311 @@
+# benchmarks/bench_database.py
+"""
+Micro-benchmarks da camada de acesso a dados (database.py).
+
+Cria um banco temporário com volumes configuráveis, mede cada função pública com
+aquecimento e repetições e grava p50/p95/p99 e ops/s em JSON para comparar commits.
+As funções lentas por natureza (hash de senha, recálculo dos agregados, exportação
+completa) usam no máximo SLOW_REPEAT repetições.
+
+Fora da medição: get_db_connection, db_connection, db_read_connection, close_db_connections,
+initialize_db e invalidate_catalog_cache/get_catalog_cache_stats (infraestrutura, exercitada
+por todas as outras entradas) e main (linha de comando).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_database --users 10000 --products 5000 --orders 1000000
+    python -m benchmarks.bench_database --compare benchmarks/results/<arquivo>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+import order_queue  # noqa: E402
+from security import hash_password  # noqa: E402
+
+RESULTS_FOLDER = Path(__file__).resolve().parent / "results"
+SEED_CHUNK_SIZE = 50_000
+SEED_PASSWORD = "senha123"
+SEED_SESSIONS = 1000
+SLOW_REPEAT = 5
+SLOW_BENCHMARKS = {"add_user (hash da senha)", "authenticate_user (hash da senha)",
+                   "rebuild_sales_aggregates", "iter_export_rows (orders, completo)"}
+STATUSES = list(database.ORDER_STATUS_TRANSITIONS.keys())
+
+def seed_database(path: str, users: int, products: int, orders: int, seed: int = 42) -> None:
+    """Popula o banco temporário direto via SQL (um único hash de senha reaproveitado por todos os usuários)."""
+    database.DATABASE_NAME = path
+    database.close_db_connections()
+    database.initialize_db()
+
+    rng = random.Random(seed)
+    password_hash = hash_password(SEED_PASSWORD)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+
+    # Os ids dos produtos vão de 1 a `products` (banco novo): os pedidos os referenciam com o preço da época
+    prices = [round(rng.uniform(10, 300), 2) for _ in range(products)]
+    with database.db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (email, name, password, cpf, address, role) VALUES (?, ?, ?, ?, ?, 'client')",
+            ((f"cliente{i}@exemplo.com", f"Cliente {i}", password_hash, f"{i:011d}", f"Rua {i}, {i % 999}") for i in range(users))
+        )
+        conn.executemany(
+            "INSERT INTO products (id, name, description, price, stock) VALUES (?, ?, ?, ?, ?)",
+            ((i + 1, f"Produto {i:05d} {rng.choice(['toalha', 'camiseta', 'bolsa', 'fralda'])}",
+              f"Bordado personalizado modelo {i}", prices[i], rng.randint(0, 50))
+             for i in range(products))
+        )
+
+    for offset in range(0, orders, SEED_CHUNK_SIZE):
+        batch = []
+        for i in range(offset, min(offset + SEED_CHUNK_SIZE, orders)):
+            created = start + timedelta(seconds=i * (365 * 86400 // max(orders, 1)))
+            product = rng.randrange(max(products, 1))
+            batch.append((
+                f"cliente{rng.randrange(max(users, 1))}@exemplo.com",
+                product + 1 if products else None, f"Produto {product:05d}", prices[product] if products else None,
+                rng.randint(1, 5), "Detalhes do pedido", rng.choice(STATUSES),
+                created.strftime("%Y-%m-%d %H:%M:%S"), f"S{i:015X}",
+            ))
+        with database.db_connection() as conn:
+            conn.executemany(
+                "INSERT INTO orders (user_email, product_id, product_name, unit_price, quantity, details, status, created_at, confirmation_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch
+            )
+
+    with database.db_connection() as conn:
+        conn.execute("ANALYZE")
+
+def measure(fn, warmup: int, repeat: int) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t0)
+    samples.sort()
+    
+    def pct(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] / 1e6
+
+    mean_ms = statistics.fmean(samples) / 1e6
+    return {
+        "repeat": repeat,
+        "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+        "mean_ms": mean_ms, "ops_per_sec": 1000 / mean_ms if mean_ms else float("inf"),
+    }
+
+def build_benchmarks(users: int, products: int, rng: random.Random) -> dict:
+    """Cada entrada é uma função sem argumentos; os parâmetros variam a cada chamada."""
+    user_email = lambda: f"cliente{rng.randrange(max(users, 1))}@exemplo.com"
+    product_id = lambda: rng.randint(1, max(products, 1))
+    last_order_id = database.list_orders(limit=1)
+    order_id = lambda: rng.randint(1, last_order_id[0]['id'] if last_order_id else 1)
+    confirmation_id = lambda: f"S{order_id() - 1:015X}"
+    period = {"date_from": (datetime.now(timezone.utc) - timedelta(days=29)).strftime("%Y-%m-%d"), "date_to": None}
+    expires_at = (datetime.now(timezone.utc) + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    session_hashes = [f"{rng.getrandbits(256):064x}" for _ in range(SEED_SESSIONS)]
+    for token_hash in session_hashes:
+        database.add_session(token_hash, user_email(), expires_at)
+    # Registros de imagem com contagem zero (produto apagado) para drop_unreferenced_image consumir
+    zero_refs = [f"product_images/00/{rng.getrandbits(256):064x}.jpg" for _ in range(SEED_SESSIONS)]
+    with database.db_connection() as conn:
+        conn.executemany("INSERT INTO image_refs (path, refcount) VALUES (?, 0)", ((path,) for path in zero_refs))
+    second_page = database.search_products(limit=database.CATALOG_PAGE_SIZE)
+    after = (second_page[-1]['name'], second_page[-1]['id']) if second_page else None
+
+    def get_all_products_cold():
+        database.invalidate_catalog_cache()
+        database.get_all_products()
+
+    def delete_product():
+        database.add_product(f"Removido {rng.random()}", "desc", 10.0, 1)
+        database.delete_product(database.search_products("Removido", limit=1)[0]['id'])
+
+    def delete_session():
+        token_hash = f"{rng.getrandbits(256):064x}"
+        database.add_session(token_hash, user_email(), expires_at)
+        database.delete_session(token_hash)
+
+    def export_first_chunk(kind):
+        rows = database.iter_export_rows(kind)
+        next(rows, None)
+        rows.close() # Devolve a conexão de leitura ao pool
+
+    def export_all(kind):
+        for _ in database.iter_export_rows(kind):
+            pass
+
+    def add_user():
+        database.add_user({"email": f"novo{rng.getrandbits(64):016x}@exemplo.com", "name": "Novo", "password": SEED_PASSWORD,
+                           "cpf": "00000000000", "address": "Rua Nova", "role": "client"})
+
+    def update_product():
+        p = database.get_product(product_id())
+        if p:
+            database.update_product(p['id'], p['name'], p['description'], p['price'], p['stock'])
+
+    def update_order_status():
+        orders = database.list_orders(status="Pendente", limit=1)
+        if orders:
+            database.update_order_status(orders[0]['id'], "Em produção")
+
+    def upsert_products_500():
+        database.upsert_products([
+            {"id": None, "name": f"Importado {rng.random()}", "description": "", "price": 9.9, "stock": 1}
+            for _ in range(500)
+        ])
+
+    def add_orders_batch_200():
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        database.add_orders_batch([
+            {"user_email": user_email(), "product_name": "Produto 00001", "quantity": 1, "details": "bench",
+             "reference_image_path": None, "created_at": now, "confirmation_id": f"B{rng.getrandbits(64):016X}"}
+            for _ in range(200)
+        ])
+
+    return {
+        "run_migrations (já atualizado)": database.run_migrations,
+        "get_user": lambda: database.get_user(user_email()),
+        "add_user (hash da senha)": add_user,
+        "authenticate_user (hash da senha)": lambda: database.authenticate_user(user_email(), SEED_PASSWORD),
+        "add_session": lambda: database.add_session(f"{rng.getrandbits(256):064x}", user_email(), expires_at),
+        "get_session_user": lambda: database.get_session_user(rng.choice(session_hashes)),
+        "delete_session (com add_session)": delete_session,
+        "delete_expired_sessions": database.delete_expired_sessions,
+        "get_all_users_list": database.get_all_users_list,
+        "count_users": lambda: database.count_users(),
+        "count_users (busca)": lambda: database.count_users(f"cliente{rng.randrange(100)}"),
+        "query_users_frame": lambda: database.query_users_frame(),
+        "query_users_frame (busca, ordenado)": lambda: database.query_users_frame(f"cliente{rng.randrange(100)}", sort_by="name", descending=True),
+        "get_product": lambda: database.get_product(product_id()),
+        "get_all_products": database.get_all_products,
+        "get_all_products (cache frio)": get_all_products_cold,
+        "get_products_frame": database.get_products_frame,
+        "search_products (1a página)": lambda: database.search_products(),
+        "search_products (2a página)": lambda: database.search_products(after=after),
+        "search_products (FTS)": lambda: database.search_products(rng.choice(["toal", "camis", "bols", "modelo 12"])),
+        "add_product": lambda: database.add_product(f"Novo {rng.random()}", "desc", 10.0, 1),
+        "update_product": update_product,
+        "delete_product": delete_product,
+        "upsert_products (lote de 500)": upsert_products_500,
+        "add_order": lambda: database.add_order(user_email(), "Produto 00001", 1, "bench"),
+        "add_order (reserva de estoque)": lambda: database.add_order(user_email(), "Produto", 1, "bench", product_id=product_id()),
+        "add_orders_batch (lote de 200)": add_orders_batch_200,
+        "enqueue_order": lambda: order_queue.enqueue_order(user_email(), "Produto 00001", 1, "bench"),
+        "get_order": lambda: database.get_order(order_id()),
+        "get_order_by_confirmation": lambda: database.get_order_by_confirmation(confirmation_id()),
+        "set_order_reference_image": lambda: database.set_order_reference_image(confirmation_id(), "product_images/ab/bench.webp"),
+        "set_order_reference_image (na fila)": lambda: database.set_order_reference_image(f"Q{rng.getrandbits(64):016X}", "product_images/ab/bench.webp"),
+        "list_orders": lambda: database.list_orders(),
+        "list_orders (status)": lambda: database.list_orders(status=rng.choice(STATUSES)),
+        "list_orders (período)": lambda: database.list_orders(date_from="2026-01-01", date_to="2026-01-31"),
+        "get_customer_orders": lambda: database.get_customer_orders(user_email()),
+        "get_product_orders": lambda: database.get_product_orders(product_id()),
+        "count_orders_by_status": database.count_orders_by_status,
+        "update_order_status": update_order_status,
+        "get_sales_totals (30 dias)": lambda: database.get_sales_totals(**period),
+        "get_sales_totals (tudo)": lambda: database.get_sales_totals(),
+        "get_daily_sales (30 dias)": lambda: database.get_daily_sales(**period),
+        "get_product_sales (30 dias)": lambda: database.get_product_sales(**period),
+        "get_sales_by_status": database.get_sales_by_status,
+        "get_top_customers": lambda: database.get_top_customers(),
+        "rebuild_sales_aggregates": database.rebuild_sales_aggregates,
+        "get_referenced_images": database.get_referenced_images,
+        "drop_unreferenced_image": lambda: database.drop_unreferenced_image(zero_refs.pop() if zero_refs else "inexistente.jpg"),
+        "iter_export_rows (orders, 1º bloco)": lambda: export_first_chunk("orders"),
+        "iter_export_rows (products, completo)": lambda: export_all("products"),
+        "iter_export_rows (orders, completo)": lambda: export_all("orders"),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "desconhecido"
+
+def print_table(results: dict, baseline: dict = None) -> None:
+    header = f"{'função':<38}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>12}"
+    if baseline:
+        header += f"{'Δ p50':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        line = f"{name:<38}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['ops_per_sec']:>12.1f}"
+        if baseline and name in baseline and baseline[name]['p50_ms']:
+            line += f"{(r['p50_ms'] / baseline[name]['p50_ms'] - 1) * 100:>+9.1f}%"
+        print(line)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="Mede apenas as funções cujo nome começa com estes prefixos")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/<data>_<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para mostrar a variação do p50")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="fadinha_bench_") as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        order_queue.ORDER_QUEUE_DB = os.path.join(tmp, "bench_queue.db")
+        t0 = time.perf_counter()
+        seed_database(db_path, args.users, args.products, args.orders)
+        print(f"Banco populado em {time.perf_counter() - t0:.1f}s ({args.users} usuários, {args.products} produtos, {args.orders} pedidos)\n")
+
+        benchmarks = build_benchmarks(args.users, args.products, random.Random(7))
+        results = {}
+        for name, fn in benchmarks.items():
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            if name in SLOW_BENCHMARKS:
+                results[name] = measure(fn, min(args.warmup, 1), min(args.repeat, SLOW_REPEAT))
+            else:
+                results[name] = measure(fn, args.warmup, args.repeat)
+        order_queue.stop_order_writer()
+        database.close_db_connections()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "volumes": {"users": args.users, "products": args.products, "orders": args.orders},
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = Path(args.output) if args.output else RESULTS_FOLDER / f"{datetime.now():%Y%m%d-%H%M%S}_{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados gravados em {output}")
+
+if __name__ == "__main__":
+    main()
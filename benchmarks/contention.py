@@ -0,0 +1,210 @@
+# benchmarks/contention.py
+"""
+Teste de contenção: várias threads disputando o mesmo produto.
+
+1. Reserva de estoque: cada thread faz pedidos (add_order com product_id) até o estoque acabar.
+   Verifica que nada foi vendido além do estoque e que cada pedido aceito baixou o estoque.
+2. Pedidos em lote: o mesmo, via add_orders_batch (como a fila de pedidos grava).
+3. Atualizações concorrentes: cada thread soma 1 ao preço N vezes com update_product.
+   Com expected_version (concorrência otimista) nenhuma atualização se perde; sem ela, o
+   teste mostra quantas se perdem.
+4. Leituras durante escritas: uma exportação (conexão somente leitura) fica aberta no meio da
+   leitura enquanto pedidos são gravados. Verifica que as escritas não esperam pelo leitor e
+   que o leitor continua no seu snapshot.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.contention --threads 16 --stock 2000
+Termina com código 1 se alguma verificação falhar.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+
+def setup_database(path: str, stock: int) -> int:
+    database.DATABASE_NAME = path
+    database.close_db_connections()
+    database.initialize_db()
+    database.add_product("Produto disputado", "Teste de contenção", 10.0, stock)
+    with database.db_connection() as conn:
+        return conn.execute("SELECT id FROM products WHERE name = 'Produto disputado'").fetchone()[0]
+
+def run_threads(threads: int, target) -> float:
+    workers = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start
+
+def summarize(samples: list) -> str:
+    samples = sorted(samples)
+    if not samples:
+        return "sem amostras"
+    p99 = samples[min(len(samples) - 1, int(round(0.99 * (len(samples) - 1))))]
+    return f"p50 {statistics.median(samples):.2f} ms · p99 {p99:.2f} ms · máx. {samples[-1]:.2f} ms"
+
+def check(label: str, ok: bool) -> bool:
+    print(f"  [{'OK' if ok else 'FALHOU'}] {label}")
+    return ok
+
+def stock_of(product_id: int) -> int:
+    with database.db_connection() as conn:
+        return conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()[0]
+
+def test_reservations(product_id: int, threads: int, stock: int) -> bool:
+    print(f"\n1. Reserva de estoque: {threads} threads, estoque inicial {stock}")
+    lock = threading.Lock()
+    accepted, rejected, latencies = [], [0], []
+
+    def worker(i):
+        local_accepted, local_latencies = [], []
+        while True:
+            quantity = 1 + (i + len(local_accepted)) % 3
+            t0 = time.perf_counter()
+            ok = database.add_order(f"cliente{i}@exemplo.com", "Produto disputado", quantity, "contenção", product_id=product_id)
+            local_latencies.append((time.perf_counter() - t0) * 1000)
+            if ok:
+                local_accepted.append(quantity)
+            elif stock_of(product_id) < 1:
+                break
+            else:
+                with lock:
+                    rejected[0] += 1
+        with lock:
+            accepted.extend(local_accepted)
+            latencies.extend(local_latencies)
+
+    elapsed = run_threads(threads, worker)
+    final_stock = stock_of(product_id)
+    with database.db_connection() as conn:
+        ordered = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM orders WHERE details = 'contenção'").fetchone()[0]
+    print(f"  {len(accepted)} pedidos aceitos, {rejected[0]} recusados por estoque em {elapsed:.2f}s ({len(latencies) / elapsed:.0f} tentativas/s)")
+    print(f"  Latência de add_order: {summarize(latencies)}")
+    return all([
+        check(f"estoque final não negativo ({final_stock})", final_stock >= 0),
+        check(f"quantidade vendida = baixa no estoque ({sum(accepted)} = {stock} - {final_stock})", sum(accepted) == stock - final_stock),
+        check(f"pedidos gravados = pedidos aceitos ({ordered})", ordered == sum(accepted)),
+    ])
+
+def test_batches(product_id: int, threads: int, stock: int, batch_size: int = 20) -> bool:
+    print(f"\n2. Pedidos em lote (add_orders_batch): {threads} threads, lotes de {batch_size}, estoque {stock}")
+    with database.db_connection() as conn:
+        conn.execute("UPDATE products SET stock = ? WHERE id = ?", (stock, product_id))
+    rounds = max(1, (stock * 2) // (threads * batch_size))
+    lock = threading.Lock()
+    totals = {"inserted": 0, "out_of_stock": 0}
+    latencies = []
+
+    def worker(i):
+        for _ in range(rounds):
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            batch = [
+                {"user_email": f"cliente{i}@exemplo.com", "product_name": "Produto disputado", "quantity": 1,
+                 "details": "contenção-lote", "reference_image_path": None, "created_at": now,
+                 "confirmation_id": uuid.uuid4().hex, "product_id": product_id}
+                for _ in range(batch_size)
+            ]
+            t0 = time.perf_counter()
+            inserted, out_of_stock = database.add_orders_batch(batch)
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000)
+                totals["inserted"] += inserted
+                totals["out_of_stock"] += out_of_stock
+
+    elapsed = run_threads(threads, worker)
+    final_stock = stock_of(product_id)
+    with database.db_connection() as conn:
+        active = conn.execute("SELECT COUNT(*) FROM orders WHERE details = 'contenção-lote' AND status != 'Cancelado'").fetchone()[0]
+    print(f"  {totals['inserted']} pedidos gravados ({totals['out_of_stock']} cancelados por estoque) em {elapsed:.2f}s")
+    print(f"  Latência por lote (uma transação): {summarize(latencies)}")
+    return all([
+        check(f"estoque final não negativo ({final_stock})", final_stock >= 0),
+        check(f"pedidos ativos = baixa no estoque ({active} = {stock} - {final_stock})", active == stock - final_stock),
+    ])
+
+def test_updates(product_id: int, threads: int, increments: int, optimistic: bool) -> bool:
+    mode = "com expected_version" if optimistic else "sem expected_version (sobrescrita cega)"
+    print(f"\n3{'a' if optimistic else 'b'}. Atualizações concorrentes {mode}: {threads} threads x {increments} incrementos")
+    start_price = database.get_product(product_id)['price']
+    lock = threading.Lock()
+    conflicts = [0]
+
+    def worker(i):
+        for _ in range(increments):
+            while True:
+                p = database.get_product(product_id)
+                ok = database.update_product(
+                    product_id, p['name'], p['description'], p['price'] + 1, p['stock'],
+                    expected_version=p['version'] if optimistic else None
+                )
+                if ok:
+                    break
+                with lock:
+                    conflicts[0] += 1
+
+    elapsed = run_threads(threads, worker)
+    expected = start_price + threads * increments
+    final_price = database.get_product(product_id)['price']
+    print(f"  {threads * increments} atualizações em {elapsed:.2f}s, {conflicts[0]} conflitos refeitos")
+    lost = int(round(expected - final_price))
+    if optimistic:
+        return check(f"nenhuma atualização perdida (preço {final_price:.0f} = {expected:.0f})", lost == 0)
+    print(f"  Atualizações perdidas sem controle de versão: {lost}")
+    return True
+
+def test_reads_during_writes(product_id: int, orders: int) -> bool:
+    print(f"\n4. Leituras durante escritas: exportação aberta enquanto {orders} pedidos são gravados")
+    with database.db_connection() as conn:
+        conn.execute("UPDATE products SET stock = ? WHERE id = ?", (orders, product_id))
+    rows = database.iter_export_rows("orders", chunk_size=100)
+    first = next(rows)  # Leitor parado no meio da consulta, com o snapshot aberto
+    latencies = []
+    for i in range(orders):
+        t0 = time.perf_counter()
+        database.add_order("leitura@exemplo.com", "Produto disputado", 1, "contenção-leitura", product_id=product_id)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    read = len(first) + sum(len(chunk) for chunk in rows)
+    with database.db_connection() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    print(f"  Latência de add_order com o leitor aberto: {summarize(latencies)}")
+    return all([
+        check(f"escritas não bloqueadas pelo leitor (máx. {max(latencies):.1f} ms < {database.DB_BUSY_TIMEOUT_MS} ms)", max(latencies) < database.DB_BUSY_TIMEOUT_MS),
+        check(f"leitor viu só o seu snapshot ({read} = {total} - {orders})", read == total - orders),
+    ])
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--stock", type=int, default=2000)
+    parser.add_argument("--increments", type=int, default=50, help="Incrementos de preço por thread no teste 3")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="fadinha_contention_") as tmp:
+        product_id = setup_database(os.path.join(tmp, "contention.db"), args.stock)
+        results = [
+            test_reservations(product_id, args.threads, args.stock),
+            test_batches(product_id, args.threads, args.stock),
+            test_updates(product_id, args.threads, args.increments, optimistic=True),
+            test_updates(product_id, args.threads, args.increments, optimistic=False),
+            test_reads_during_writes(product_id, args.threads * args.increments),
+        ]
+        database.close_db_connections()
+
+    print("\nTodas as verificações passaram." if all(results) else "\nHÁ VERIFICAÇÕES COM FALHA.")
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
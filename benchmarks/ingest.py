@@ -0,0 +1,115 @@
+# benchmarks/ingest.py
+"""
+Envio de imagens de referência: gravação síncrona x processamento em segundo plano (ingest.py).
+
+Gera N fotos JPEG grandes (com EXIF) e mede:
+  1. o caminho antigo: save_uploaded_file dentro do envio do formulário (grava o arquivo original);
+  2. o caminho novo: enqueue_order + submit_reference_image (só grava na pasta de espera), e o
+     tempo até todas as imagens serem processadas e associadas aos pedidos, com vazão e bytes economizados.
+
+Banco, fila de pedidos e armazenamento são temporários.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.ingest --images 20 --workers 2
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+import ingest  # noqa: E402
+import order_queue  # noqa: E402
+import storage  # noqa: E402
+from benchmarks.contention import summarize  # noqa: E402
+from utils import save_uploaded_file  # noqa: E402
+
+class Upload(io.BytesIO):
+    """Imita o UploadedFile do Streamlit (BytesIO com .name)."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+def make_photo(seed: int, width: int, height: int) -> bytes:
+    """Foto JPEG com ruído (comprime pouco, como uma foto de celular) e EXIF de orientação/câmera."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (width // 4, height // 4), rng.randbytes((width // 4) * (height // 4) * 3)).resize((width, height))
+    exif = Image.Exif()
+    exif[0x0112] = 6            # Orientação: girar 90°
+    exif[0x010F] = "Celular"    # Fabricante
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--workers", type=int, default=ingest.INGEST_WORKERS)
+    args = parser.parse_args(argv)
+
+    photos = [make_photo(i, args.width, args.height) for i in range(args.images)]
+    print(f"{args.images} fotos {args.width}x{args.height}, média {sum(map(len, photos)) / len(photos) / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory(prefix="fadinha_ingest_") as tmp:
+        database.DATABASE_NAME = os.path.join(tmp, "bench.db")
+        database.close_db_connections()
+        database.initialize_db()
+        order_queue.ORDER_QUEUE_DB = os.path.join(tmp, "queue.db")
+        storage.set_storage(storage.LocalStorage(tmp))
+        ingest.INGEST_SPOOL_FOLDER = Path(tmp) / "spool"
+        ingest.INGEST_WORKERS = args.workers
+
+        samples = []
+        for i, photo in enumerate(photos):
+            t0 = time.perf_counter()
+            save_uploaded_file(Upload(photo, f"sincrono{i}.jpg"))
+            samples.append((time.perf_counter() - t0) * 1000)
+        print("\n1. Gravação síncrona do original (save_uploaded_file)")
+        print(f"  Tempo no envio do formulário: {summarize(samples)}")
+
+        # Aquece o pool (criação dos processos) fora da medição
+        warmup = order_queue.enqueue_order("bench@exemplo.com", "Aquecimento", 1, "aquecimento")
+        ingest.submit_reference_image(warmup, Upload(make_photo(999, 640, 480), "aquecimento.jpg"))
+        ingest.wait_for_ingest(120)
+        before = ingest.get_ingest_stats()
+
+        samples = []
+        start = time.perf_counter()
+        for i, photo in enumerate(photos):
+            t0 = time.perf_counter()
+            confirmation_id = order_queue.enqueue_order("bench@exemplo.com", "Produto", 1, f"pedido {i}")
+            ingest.submit_reference_image(confirmation_id, Upload(photo, f"foto{i}.jpg"))
+            samples.append((time.perf_counter() - t0) * 1000)
+        ingest.wait_for_ingest(600)
+        elapsed = time.perf_counter() - start
+        stats = ingest.get_ingest_stats()
+
+        done = stats["done"] - before["done"]
+        bytes_in = stats["bytes_in"] - before["bytes_in"]
+        bytes_out = stats["bytes_out"] - before["bytes_out"]
+        with database.db_read_connection() as conn:
+            attached = conn.execute("SELECT COUNT(*) FROM orders WHERE details LIKE 'pedido %' AND reference_image_path IS NOT NULL").fetchone()[0]
+        print(f"\n2. Pedido + imagem em segundo plano ({args.workers} processo(s) no pool)")
+        print(f"  Tempo no envio do formulário: {summarize(samples)}")
+        print(f"  {done} imagens processadas em {elapsed:.2f}s ({done / elapsed:.2f} imagens/s), {stats['failed'] - before['failed']} falhas")
+        print(f"  Tempo por imagem no pool: média {(stats['total_ms'] - before['total_ms']) / max(done, 1):.0f} ms")
+        print(f"  Bytes: {bytes_in / 1e6:.1f} MB recebidos -> {bytes_out / 1e6:.1f} MB guardados ({100 * (1 - bytes_out / max(bytes_in, 1)):.0f}% a menos)")
+        print(f"  Pedidos com a imagem associada: {attached}/{args.images}")
+
+        order_queue.stop_order_writer()
+        database.close_db_connections()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+# benchmarks/loadtest.py
+"""
+Teste de carga com várias sessões simultâneas, usando as páginas reais do app.
+
+Cada processo é um usuário virtual: abre uma sessão nova do app.py com o AppTest do Streamlit
+(sem navegador), faz login pela página pagina_login_cadastro e executa um roteiro sorteado pela
+mistura configurada, até o tempo acabar:
+  - browse: cliente busca no catálogo de pagina_servicos, pagina e seleciona produtos;
+  - order:  cliente faz um pedido em pagina_servicos com imagem de referência anexada;
+  - admin:  Admin altera o preço de um produto em pagina_admin_produtos.
+
+Todos os processos usam a mesma cópia semeada do banco (--db, padrão fadinha_db.db) em uma pasta
+temporária, com produtos e clientes de carga extras. Armazenamento de imagens, fila de pedidos
+e miniaturas também ficam na pasta temporária; o backup agendado é desligado.
+
+Relatório: latência de cada rerun (p50/p95/p99) por etapa, taxa de erros por roteiro, erros
+"database is locked" e o tempo de espera pelo lock de escrita do SQLite (BEGIN IMMEDIATE e
+instruções de escrita, medidos pelo query_stats em cada processo). No fim confere que todo
+pedido confirmado na tela foi gravado no banco.
+
+O AppTest guarda o runtime do Streamlit em uma variável global e reprocessa o script a cada
+rerun, então não roda duas sessões ao mesmo tempo no mesmo processo: a concorrência vem dos
+processos (--users). Cada processo tem sua própria conexão de escrita, como réplicas do app
+usando o mesmo arquivo; a disputa pelo lock do SQLite é, portanto, maior que em um único servidor.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.loadtest --users 8 --duration 60 --mix browse=6,order=3,admin=1
+Termina com código 1 se a taxa de erros passar de --max-error-rate ou se faltar algum pedido.
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+LOAD_PRODUCT_PREFIX = "Carga"
+LOAD_CUSTOMER_PASSWORD = "carga-123456"
+ORDER_DETAILS_PREFIX = "carga:"
+ORDER_CONFIRMED_TEXT = "Pedido de serviço recebido"
+CONFLICT_TEXT = "alterado por outra pessoa"
+ORDER_CONFIRMATION_SEPARATOR = "**"
+
+# --- Preparação (processo principal) ---
+
+def seed_database(source: str, target: str, products: int, customers: int) -> None:
+    """Copia o banco (API de backup: consistente mesmo com WAL), aplica as migrações e cria os dados de carga."""
+    import database
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+    database.DATABASE_NAME = target
+    database.close_db_connections()
+    database.initialize_db()
+    with database.db_connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM products WHERE name LIKE ?", (f"{LOAD_PRODUCT_PREFIX} %",)).fetchone()[0]
+    rows = [
+        {"id": None, "name": f"{LOAD_PRODUCT_PREFIX} {i:04d}", "description": "Produto do teste de carga", "price": 10.0 + i % 50, "stock": 1_000_000}
+        for i in range(existing, products)
+    ]
+    if rows:
+        database.upsert_products(rows)
+    for i in range(customers):
+        email = customer_email(i)
+        if database.get_user(email) is None:
+            database.add_user({"email": email, "name": f"Cliente Carga {i}", "password": LOAD_CUSTOMER_PASSWORD,
+                               "cpf": f"000.000.{i // 100:03d}-{i % 100:02d}", "address": "Rua do Teste, 1", "role": "client"})
+    database.close_db_connections()
+
+def customer_email(i: int) -> str:
+    return f"carga{i}@exemplo.com"
+
+def parse_mix(text: str) -> dict:
+    """'browse=6,order=3,admin=1' -> {'browse': 6, 'order': 3, 'admin': 1}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"roteiro desconhecido: {name} (use {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+# --- Usuário virtual (processo de carga) ---
+
+class ScenarioError(Exception):
+    """O roteiro não chegou ao resultado esperado (página errada, elemento ausente, exceção no app)."""
+
+class CapturedOutput(io.TextIOBase):
+    """Substitui o stdout do processo: o app registra erros com print("ERRO ...")."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text: str) -> int:
+        self.lines.extend(line for line in text.splitlines() if line.strip())
+        return len(text)
+
+class Session:
+    """Uma sessão do navegador: um AppTest do app.py, com o tempo de cada rerun registrado por etapa."""
+
+    def __init__(self, samples: dict, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.samples = samples
+        self.at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=timeout)
+        self.run("abrir app", self.at)
+
+    def run(self, step: str, widget) -> None:
+        t0 = time.perf_counter()
+        widget.run()
+        self.samples[step].append((time.perf_counter() - t0) * 1000)
+        if self.at.exception:
+            raise ScenarioError(f"{step}: exceção no app: {self.at.exception[0].message}")
+
+    def errors(self) -> list:
+        return [e.value for e in self.at.error] + [e.value for e in self.at.sidebar.error]
+
+    def login(self, email: str, password: str) -> None:
+        self.at.text_input(key="login_email_auth").input(email)
+        self.at.text_input(key="login_password_auth").input(password)
+        self.run("login", self.at.button(key="btn_login_auth").click())
+        if not self.at.session_state["logged_in"]:
+            raise ScenarioError(f"login: falhou para {email}: {self.errors()}")
+
+    def navigate(self, page: str) -> None:
+        self.run(f"abrir {page}", self.at.sidebar.radio[0].set_value(page))
+
+    def pick_product(self, key: str, rng: random.Random, products: int) -> int:
+        """Busca um produto de carga pelo picker do catálogo e o seleciona. Retorna o id."""
+        term = f"{LOAD_PRODUCT_PREFIX} {rng.randrange(products):04d}"
+        self.run("buscar produto", self.at.text_input(key=f"{key}_search").input(term))
+        select = self.at.selectbox(key=f"{key}_select")
+        if not select.options:
+            raise ScenarioError(f"buscar produto: nada encontrado para '{term}'")
+        return select.value
+
+def scenario_browse(session: Session, rng: random.Random, args) -> str:
+    session.login(customer_email(rng.randrange(args.customers)), LOAD_CUSTOMER_PASSWORD)
+    session.navigate("Nossos Serviços")
+    session.run("buscar produto", session.at.text_input(key="order_product_search").input(LOAD_PRODUCT_PREFIX))
+    for _ in range(rng.randint(1, 3)):
+        next_button = session.at.button(key="order_product_next")
+        if next_button.disabled:
+            break
+        session.run("próxima página", next_button.click())
+    select = session.at.selectbox(key="order_product_select")
+    session.run("selecionar produto", select.select_index(rng.randrange(len(select.options))))
+    return "ok"
+
+def scenario_order(session: Session, rng: random.Random, args) -> str:
+    session.login(customer_email(rng.randrange(args.customers)), LOAD_CUSTOMER_PASSWORD)
+    session.navigate("Nossos Serviços")
+    session.pick_product("order_product", rng, args.products)
+    at = session.at
+    at.number_input(key="order_quantity").set_value(rng.randint(1, 3))
+    at.text_area(key="order_details").input(f"{ORDER_DETAILS_PREFIX} pedido do teste de carga")
+    if rng.random() < args.upload_ratio:
+        at.file_uploader(key="order_reference_image").set_value(("referencia.jpg", args.upload_bytes, "image/jpeg"))
+    session.run("enviar pedido", at.button(key="FormSubmitter:form_order_product-Finalizar Pedido").click())
+    confirmed = [s.value for s in at.success if ORDER_CONFIRMED_TEXT in s.value]
+    if not confirmed:
+        raise ScenarioError(f"enviar pedido: sem confirmação: {session.errors()}")
+    args.confirmed.append(confirmed[0].split(ORDER_CONFIRMATION_SEPARATOR)[1])
+    return "ok"
+
+def scenario_admin(session: Session, rng: random.Random, args) -> str:
+    session.login(args.admin_email, args.admin_password)
+    session.navigate("Gerenciar Produtos (Admin)")
+    product_id = session.pick_product("mod_prod", rng, args.products)
+    at = session.at
+    at.number_input(key="mod_prod_price").set_value(round(rng.uniform(10, 60), 2))
+    session.run("salvar produto", at.button(key=f"FormSubmitter:form_modify_product_{product_id}-Salvar Modificações").click())
+    if any(CONFLICT_TEXT in message for message in session.errors()):
+        return "conflito" # Concorrência otimista: outra sessão (ou uma reserva de estoque) mudou o produto
+    if f"mod_prod_version_{product_id}" in at.session_state:
+        raise ScenarioError(f"salvar produto: alteração não gravada: {session.errors()}")
+    return "ok"
+
+SCENARIOS = {"browse": scenario_browse, "order": scenario_order, "admin": scenario_admin}
+
+def _lock_stats() -> dict:
+    """Tempo gasto em BEGIN IMMEDIATE (espera pelo lock de escrita) e nas instruções de escrita deste processo."""
+    from query_stats import top_statements
+
+    stats = {"begin": [0, 0.0, 0.0], "write": [0, 0.0, 0.0]}
+    for row in top_statements(limit=100_000):
+        verb = row["sql"].split(None, 1)[0].upper()
+        kind = "begin" if row["sql"].upper().startswith("BEGIN IMMEDIATE") else "write" if verb in ("INSERT", "UPDATE", "DELETE") else None
+        if kind:
+            entry = stats[kind]
+            entry[0] += row["count"]
+            entry[1] += row["total_ms"]
+            entry[2] = max(entry[2], row["max_ms"])
+    return stats
+
+def run_user(index: int, workdir: str, options: dict) -> dict:
+    """Processo de carga: configura o app para a pasta temporária e executa roteiros até o tempo acabar."""
+    import logging
+
+    os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error") # Sem os avisos de depreciação a cada rerun
+    os.chdir(ROOT) # style.css e logo.png são lidos por caminho relativo
+    import backup
+    import database
+    import ingest
+    import order_queue
+    import storage
+    import thumbnails
+
+    work = Path(workdir)
+    database.DATABASE_NAME = str(work / "loadtest.db")
+    order_queue.ORDER_QUEUE_DB = str(work / f"queue_{index}.db")
+    storage.set_storage(storage.LocalStorage(str(work / "storage")))
+    thumbnails.THUMBNAIL_FOLDER = work / "thumbnails"
+    ingest.INGEST_SPOOL_FOLDER = work / f"spool_{index}"
+    ingest.INGEST_WORKERS = 1
+    backup.BACKUP_INTERVAL_HOURS = 0
+    logging.getLogger("fadinha.sql").setLevel(logging.ERROR) # Consultas lentas entram no relatório pelo query_stats
+
+    args = argparse.Namespace(**options, confirmed=[])
+    rng = random.Random(options["seed"] * 1000 + index)
+    names, weights = zip(*options["mix"].items())
+    samples, outcomes, failures = defaultdict(list), Counter(), []
+    captured, stdout = CapturedOutput(), sys.stdout
+    sys.stdout = captured
+
+    deadline = time.monotonic() + options["duration"]
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            try:
+                outcome = SCENARIOS[name](Session(samples, options["timeout"]), rng, args)
+            except Exception as e: # ScenarioError, timeout do AppTest ou elemento ausente na página
+                outcome = "erro"
+                failures.append(f"{name}: {type(e).__name__}: {e}"[:300])
+            outcomes[(name, outcome)] += 1
+        order_queue.flush_order_queue(30)
+        ingest.wait_for_ingest(60)
+    finally:
+        sys.stdout = stdout
+        ingest.stop_ingest()
+
+    return {
+        "samples": dict(samples),
+        "outcomes": dict(outcomes),
+        "failures": failures,
+        "confirmed": args.confirmed,
+        "app_errors": [line for line in captured.lines if "ERRO" in line],
+        "locks": _lock_stats(),
+        "queue_failed": order_queue.get_order_queue_stats()["failed_stored"],
+    }
+
+# --- Relatório ---
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    if not samples:
+        return "sem amostras"
+    def pick(q):
+        return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+    return (f"n={len(samples):5d}  p50 {statistics.median(samples):8.1f}  p95 {pick(0.95):8.1f}  "
+            f"p99 {pick(0.99):8.1f}  máx. {samples[-1]:8.1f} ms")
+
+def report(results: list, elapsed: float, workdir: str, max_error_rate: float) -> bool:
+    samples, outcomes = defaultdict(list), Counter()
+    failures, app_errors, confirmed = [], [], []
+    locks = {"begin": [0, 0.0, 0.0], "write": [0, 0.0, 0.0]}
+    queue_failed = 0
+    for result in results:
+        for step, values in result["samples"].items():
+            samples[step].extend(values)
+        for key, count in result["outcomes"].items():
+            outcomes[key] += count
+        failures += result["failures"]
+        app_errors += result["app_errors"]
+        confirmed += result["confirmed"]
+        queue_failed += result["queue_failed"]
+        for kind, (count, total, peak) in result["locks"].items():
+            locks[kind][0] += count
+            locks[kind][1] += total
+            locks[kind][2] = max(locks[kind][2], peak)
+
+    reruns = sum(len(v) for v in samples.values())
+    print(f"\nLatência dos reruns ({reruns} reruns, {reruns / elapsed:.1f}/s)")
+    print(f"  {'todas':<32} {percentiles([x for v in samples.values() for x in v])}")
+    for step in sorted(samples):
+        print(f"  {step:<32} {percentiles(samples[step])}")
+
+    print("\nRoteiros")
+    total, errors = 0, 0
+    for name in SCENARIOS:
+        runs = {outcome: count for (scenario, outcome), count in outcomes.items() if scenario == name}
+        if not runs:
+            continue
+        count = sum(runs.values())
+        total += count
+        errors += runs.get("erro", 0)
+        details = ", ".join(f"{outcome} {n}" for outcome, n in sorted(runs.items()))
+        print(f"  {name:<8} {count:5d} execuções ({details}); taxa de erros {100 * runs.get('erro', 0) / count:.1f}%")
+    error_rate = errors / total if total else 0.0
+    print(f"  Total: {total} roteiros em {elapsed:.0f}s, taxa de erros {100 * error_rate:.1f}%")
+    for message, count in Counter(failures).most_common(5):
+        print(f"    {count}x {message}")
+
+    locked = [line for line in app_errors if "locked" in line or "busy" in line]
+    print("\nSQLite")
+    print(f"  Erros 'database is locked' registrados pelo app: {len(locked)} (de {len(app_errors)} linhas de ERRO)")
+    for message, count in Counter(app_errors).most_common(3):
+        print(f"    {count}x {message[:200]}")
+    for kind, label in (("begin", "Espera pelo lock (BEGIN IMMEDIATE)"), ("write", "Instruções de escrita")):
+        count, total_ms, peak = locks[kind]
+        print(f"  {label}: {count} execuções, total {total_ms:.0f} ms, média {total_ms / count if count else 0:.2f} ms, máx. {peak:.1f} ms")
+
+    with sqlite3.connect(os.path.join(workdir, "loadtest.db")) as conn:
+        stored = {row[0] for row in conn.execute("SELECT confirmation_id FROM orders WHERE details LIKE ?", (f"{ORDER_DETAILS_PREFIX}%",))}
+        images = conn.execute("SELECT COUNT(*) FROM orders WHERE details LIKE ? AND reference_image_path IS NOT NULL", (f"{ORDER_DETAILS_PREFIX}%",)).fetchone()[0]
+    missing = [c for c in confirmed if c not in stored]
+    print(f"\nPedidos confirmados na tela: {len(confirmed)}; gravados: {len(confirmed) - len(missing)}; "
+          f"com imagem associada: {images}; na fila de falhas: {queue_failed}")
+
+    ok = error_rate <= max_error_rate and not missing
+    print(f"\n[{'OK' if ok else 'FALHOU'}] taxa de erros {100 * error_rate:.1f}% (limite {100 * max_error_rate:.1f}%), {len(missing)} pedidos confirmados ausentes")
+    return ok
+
+def make_upload(size: int = 1600) -> bytes:
+    """Foto JPEG com ruído, como a imagem de referência de um celular (reduzida)."""
+    from PIL import Image
+
+    rng = random.Random(0)
+    image = Image.frombytes("RGB", (size // 4, size * 3 // 16), rng.randbytes((size // 4) * (size * 3 // 16) * 3)).resize((size, size * 3 // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="Usuários virtuais simultâneos (um processo cada)")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga por usuário")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("browse=6,order=3,admin=1"), help="Peso de cada roteiro")
+    parser.add_argument("--db", default="fadinha_db.db", help="Banco copiado para a pasta temporária")
+    parser.add_argument("--products", type=int, default=200, help="Produtos de carga criados na cópia")
+    parser.add_argument("--customers", type=int, default=20, help="Clientes de carga criados na cópia")
+    parser.add_argument("--upload-ratio", type=float, default=1.0, help="Fração dos pedidos com imagem de referência")
+    parser.add_argument("--admin-email", default="admin@fadinha.com")
+    parser.add_argument("--admin-password", default="456")
+    parser.add_argument("--timeout", type=float, default=60, help="Tempo máximo de um rerun (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--keep", action="store_true", help="Mantém a pasta temporária (banco e imagens) no fim")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="fadinha_loadtest_")
+    try:
+        import storage
+        storage.set_storage(storage.LocalStorage(os.path.join(workdir, "storage")))
+        seed_start = time.perf_counter()
+        seed_database(str(ROOT / args.db), os.path.join(workdir, "loadtest.db"), args.products, args.customers)
+        print(f"Banco semeado em {workdir} ({time.perf_counter() - seed_start:.1f}s): {args.products} produtos e {args.customers} clientes de carga")
+        print(f"{args.users} usuários virtuais por {args.duration:.0f}s, mistura {args.mix}")
+
+        options = {key: value for key, value in vars(args).items() if key not in ("keep", "db", "max_error_rate")}
+        options["upload_bytes"] = make_upload()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.users, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(run_user, i, workdir, options) for i in range(args.users)]
+            results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+
+        ok = report(results, elapsed, workdir, args.max_error_rate)
+    finally:
+        if args.keep:
+            print(f"Arquivos mantidos em {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/startup.py
+"""
+Tempo de partida do app e de navegação entre páginas.
+
+Mede, em um processo Python novo (cache de módulos vazio):
+  - a importação do app.py e quais dependências pesadas ela carrega;
+  - a primeira execução do script (tela de login) via streamlit.testing (AppTest);
+  - cada página com uma sessão de Admin já autenticada: primeira visita (inclui
+    importar o módulo da página) e visitas seguintes.
+
+O banco e a fila de pedidos usados são cópias temporárias; o banco do projeto não é alterado.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("pandas", "PIL", "fpdf", "openpyxl", "pyarrow")
+ADMIN_EMAIL = "admin@fadinha.com"
+
+# Executado em um subprocesso, dentro de uma cópia do projeto
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - t0) * 1000
+heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60).run()
+first_run_ms = (time.perf_counter() - t0) * 1000
+
+pages = {}
+for page in app.PAGES:
+    samples = []
+    for _ in range(REPEAT):
+        nav = AppTest.from_file("app.py", default_timeout=60)
+        nav.session_state["logged_in"] = True
+        nav.session_state["username"] = "Admin"
+        nav.session_state["user_email"] = ADMIN_EMAIL
+        nav.session_state["is_admin"] = True
+        nav.session_state["session_token"] = ""
+        nav.session_state["page"] = page
+        t0 = time.perf_counter()
+        nav.run()
+        samples.append((time.perf_counter() - t0) * 1000)
+        if nav.exception:
+            raise SystemExit(f"Erro na página {page}: {nav.exception[0].message}")
+    pages[page] = samples
+
+print(json.dumps({"import_ms": import_ms, "heavy": heavy, "first_run_ms": first_run_ms, "pages": pages}))
+"""
+
+def run_child(workdir: str, repeat: int) -> dict:
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\nADMIN_EMAIL = {ADMIN_EMAIL!r}\nREPEAT = {repeat}\n" + _CHILD
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=workdir, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(output.strip().splitlines()[-1])
+
+def copy_project(target: str) -> None:
+    for item in ROOT.iterdir():
+        if item.name in (".git", "benchmarks", "__pycache__", ".thumbnail_cache") or item.name.endswith((".db-wal", ".db-shm")):
+            continue
+        if item.is_dir():
+            shutil.copytree(item, Path(target) / item.name)
+        else:
+            shutil.copy2(item, Path(target) / item.name)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções medidas por página")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="fadinha_startup_") as tmp:
+        copy_project(tmp)
+        result = run_child(tmp, args.repeat)
+
+    print(f"Importação do app.py:       {result['import_ms']:8.1f} ms")
+    print(f"  dependências pesadas carregadas: {', '.join(result['heavy']) or 'nenhuma'}")
+    print(f"Primeira execução (login):  {result['first_run_ms']:8.1f} ms\n")
+    print(f"{'página':<30}{'1a visita ms':>14}{'seguintes p50':>15}")
+    print("-" * 59)
+    for page, samples in result["pages"].items():
+        rest = statistics.median(samples[1:]) if len(samples) > 1 else float("nan")
+        print(f"{page:<30}{samples[0]:>14.1f}{rest:>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/storage.py
+"""
+Latência do armazenamento de imagens (storage.py): disco local x objeto S3.
+
+Para cada backend grava N imagens JPEG e mede:
+  - get sem cache (objeto inteiro), get_range (primeiros 64 KiB) e read_object com o LRU quente;
+  - get_thumbnail na primeira visita (baixa a original e gera a miniatura) e nas seguintes
+    (caminho das páginas do catálogo: só o cache local de miniaturas).
+
+O S3 usa --endpoint/--bucket se informados; senão sobe um servidor S3 local do moto
+(pip install "moto[server]") como substituto do bucket. Sem nenhum dos dois, só o disco local é medido.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.storage --images 50
+    python -m benchmarks.storage --endpoint http://localhost:9000 --bucket fadinha-teste
+"""
+
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage  # noqa: E402
+import thumbnails  # noqa: E402
+from benchmarks.contention import summarize  # noqa: E402
+
+def make_image(seed: int) -> bytes:
+    """JPEG 1600x1200 com ruído (não comprime demais, como uma foto)."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (400, 300), rng.randbytes(400 * 300 * 3)).resize((1600, 1200))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+def timed(fn, keys: list) -> list:
+    samples = []
+    for key in keys:
+        t0 = time.perf_counter()
+        fn(key)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+def run_backend(label: str, backend: storage.Storage, images: list, thumbs_dir: Path) -> None:
+    storage.set_storage(backend)
+    thumbnails.THUMBNAIL_FOLDER = thumbs_dir
+    keys = [f"product_images/bench/{i:04d}.jpg" for i in range(len(images))]
+    for key, data in zip(keys, images):
+        storage.put_object(key, io.BytesIO(data))
+
+    print(f"\n{label}")
+    print(f"  get (sem cache):          {summarize(timed(backend.get, keys))}")
+    print(f"  get_range (64 KiB):       {summarize(timed(lambda k: backend.get_range(k, 0, 64 * 1024), keys))}")
+    storage.clear_cache()
+    timed(storage.read_object, keys)
+    print(f"  read_object (LRU quente): {summarize(timed(storage.read_object, keys))}")
+    storage.clear_cache()
+    print(f"  miniatura, 1ª visita:     {summarize(timed(lambda k: thumbnails.get_thumbnail(k, 200), keys))}")
+    print(f"  miniatura, seguintes:     {summarize(timed(lambda k: thumbnails.get_thumbnail(k, 200), keys))}")
+    stats = storage.get_storage_stats()
+    print(f"  LRU: {stats['cached']} objetos, {stats['bytes'] / 1e6:.1f} MB")
+
+def start_standin():
+    """Servidor S3 local (moto) em uma porta livre. Retorna (servidor, endpoint) ou (None, None) sem moto."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        return None, None
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "teste")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "teste")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # Sem uma linha de log por requisição
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--endpoint", help="Endpoint S3 (ex.: MinIO local)")
+    parser.add_argument("--bucket", default="fadinha-benchmark")
+    args = parser.parse_args(argv)
+
+    images = [make_image(i) for i in range(args.images)]
+    print(f"{args.images} imagens de ~{sum(map(len, images)) / len(images) / 1e3:.0f} KB")
+
+    server, endpoint = (None, args.endpoint) if args.endpoint else start_standin()
+    with tempfile.TemporaryDirectory(prefix="fadinha_storage_") as tmp:
+        run_backend("Disco local (LocalStorage)", storage.LocalStorage(tmp), images, Path(tmp) / "thumbs_local")
+        if endpoint:
+            s3 = storage.S3Storage(args.bucket, endpoint)
+            if not args.endpoint:
+                s3._client.create_bucket(Bucket=args.bucket)
+            run_backend(f"S3 ({endpoint}, bucket {args.bucket})", s3, images, Path(tmp) / "thumbs_s3")
+        else:
+            print("\nS3 não medido: informe --endpoint ou instale moto[server] para o servidor local.")
+    if server:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
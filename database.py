@@ -1,26 +1,171 @@
 # database.py
 
+import queue
+import re
 import sqlite3
-from typing import Optional, Dict, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Tuple, Iterator
 from pathlib import Path 
+from security import hash_password, verify_password
+from query_stats import InstrumentedConnection, install_trace
 
 DATABASE_NAME = "fadinha_db.db"
 IMAGE_FOLDER = Path("product_images") 
 
 IMAGE_FOLDER.mkdir(exist_ok=True)
 
-def get_db_connection():
-    """Cria e retorna a conexão com o banco de dados SQLite."""
+# Ajustes de desempenho das conexões (aplicados uma única vez por conexão)
+DB_POOL_SIZE = 8                      # Máximo de conexões de leitura mantidas abertas pelo processo
+DB_BUSY_TIMEOUT_MS = 5000             # Espera por locks antes de "database is locked"
+DB_CACHE_SIZE_KIB = 16 * 1024         # Cache de páginas da conexão de escrita (16 MiB)
+DB_READ_CACHE_SIZE_KIB = 64 * 1024    # Cache de páginas por conexão de leitura (64 MiB)
+DB_MMAP_SIZE = 64 * 1024 * 1024       # Leitura via mmap (64 MiB)
+
+def get_db_connection(read_only: bool = False):
+    """
+    Abre uma nova conexão SQLite já configurada e instrumentada (cada instrução é medida em query_stats).
+    Escrita: WAL, synchronous=NORMAL. Leitura (read_only=True): URI mode=ro + query_only e cache maior;
+    em WAL, leitores trabalham sobre um snapshot e nunca bloqueiam nem são bloqueados pelo escritor.
+    """
+    if read_only:
+        database = f"{Path(DATABASE_NAME).resolve().as_uri()}?mode=ro"
+    else:
+        database = DATABASE_NAME
     # check_same_thread=False é crucial para Streamlit Cloud
-    conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False) 
+    conn = sqlite3.connect(database, uri=read_only, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000, factory=InstrumentedConnection) 
     conn.row_factory = sqlite3.Row
+    install_trace(conn)
+    if read_only:
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute(f"PRAGMA cache_size=-{DB_READ_CACHE_SIZE_KIB}")
+    else:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
-def initialize_db():
-    """Cria as tabelas de usuários, produtos e pedidos se elas não existirem."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+class ConnectionPool:
+    """Pool limitado de conexões de longa duração, compartilhado por todas as sessões do servidor."""
+
+    def __init__(self, factory, max_size: int):
+        self._factory = factory
+        self._max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._max_size:
+                self._created += 1
+                try:
+                    return self._factory()
+                except Exception:
+                    self._created -= 1
+                    raise
+        # Pool cheio: aguarda uma conexão ser devolvida (mesmo erro da conexão de escrita ocupada,
+        # para que os chamadores, que tratam sqlite3.Error, também tratem este caso)
+        try:
+            return self._idle.get(timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError("database is locked (pool de leitura esgotado)") from None
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        """Fecha as conexões ociosas (usado ao trocar de banco, em testes ou no desligamento)."""
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._created -= 1
+
+_read_pool = ConnectionPool(lambda: get_db_connection(read_only=True), DB_POOL_SIZE)
+
+# Uma única conexão de escrita por processo: as escritas deste processo aguardam neste lock,
+# em vez de disputar o lock de escrita do SQLite entre várias conexões.
+_writer_conn = None
+_writer_lock = threading.RLock()
+_writer_depth = 0
+
+@contextmanager
+def db_connection():
+    """
+    Conexão de escrita (a única do processo, usada por uma thread de cada vez). Ao sair do bloco
+    faz commit (ou rollback em caso de erro). Um bloco aninhado na mesma thread participa da
+    transação do bloco externo, que é quem faz o commit.
+    """
+    global _writer_conn, _writer_depth
+    if not _writer_lock.acquire(timeout=DB_BUSY_TIMEOUT_MS / 1000):
+        raise sqlite3.OperationalError("database is locked (conexão de escrita ocupada)")
+    try:
+        if _writer_conn is None:
+            _writer_conn = get_db_connection()
+        conn = _writer_conn
+        _writer_depth += 1
+        try:
+            yield conn
+            if _writer_depth == 1 and conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if _writer_depth == 1 and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            _writer_depth -= 1
+    finally:
+        _writer_lock.release()
+
+@contextmanager
+def db_read_connection():
+    """
+    Empresta uma conexão somente leitura do pool (catálogo, listagens e relatórios).
+    Ao sair do bloco, encerra a transação de leitura e devolve a conexão ao pool.
+    """
+    conn = _read_pool.acquire()
+    try:
+        yield conn
+    finally:
+        _read_pool.release(conn)
+
+def close_db_connections() -> None:
+    """Fecha as conexões abertas (a próxima chamada reabre com DATABASE_NAME atual)."""
+    global _schema_ready, _catalog_watcher, _writer_conn
+    _read_pool.close_all()
+    with _writer_lock:
+        if _writer_conn is not None:
+            _writer_conn.close()
+            _writer_conn = None
+    _schema_ready = False
+    with _catalog_lock:
+        if _catalog_watcher is not None:
+            _catalog_watcher.close()
+            _catalog_watcher = None
+        _catalog["products"] = None
+        _products_frame.update(version=None, frame=None)
+
+# --- Migrações de Esquema ---
+# Cada passo é aplicado uma única vez e registrado em PRAGMA user_version.
+# Para alterar o esquema, adicione um novo passo ao FINAL de MIGRATIONS (nunca edite um já publicado).
+
+def _migration_1_schema_inicial(cursor: sqlite3.Cursor) -> None:
+    """Cria as tabelas de usuários, produtos e pedidos e o Admin inicial."""
+
     # 1. Tabela de Usuários
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -32,7 +177,7 @@ def initialize_db():
             role TEXT DEFAULT 'client' CHECK(role IN ('client', 'admin'))
         )
     """)
-    
+
     # 2. Tabela de Produtos
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS products (
@@ -44,7 +189,7 @@ def initialize_db():
             image_path TEXT 
         )
     """)
-    
+
     # 3. Tabela de Pedidos
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS orders (
@@ -67,140 +212,1128 @@ def initialize_db():
             "INSERT INTO users (email, name, password, cpf, address, role) VALUES (?, ?, ?, ?, ?, ?)",
             (admin_email, "Admin Master", "456", "999.999.999-99", "Rua do Poder, 100", "admin")
         )
+
+def _migration_2_versao_catalogo(cursor: sqlite3.Cursor) -> None:
+    """Contador de versão do catálogo, incrementado por triggers a cada escrita em products."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_{event.lower()}_catalog_version
+            AFTER {event} ON products
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+def _migration_3_busca_catalogo(cursor: sqlite3.Cursor) -> None:
+    """Índice para ORDER BY name e índice FTS5 (nome/descrição) mantido por triggers."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """)
+    # Indexa os produtos já existentes
+    cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+def _migration_4_referencias_imagens(cursor: sqlite3.Cursor) -> None:
+    """
+    Contagem de referências das imagens (products.image_path e orders.reference_image_path),
+    mantida por triggers, e cópia das imagens antigas para o armazenamento por conteúdo.
+    """
+    from image_store import store_file # Import local: image_store depende deste módulo
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS image_refs (
+            path TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Caminhos antigos (nome original do upload, às vezes com "\" do Windows) -> endereço do conteúdo.
+    # Os arquivos antigos são apenas copiados; arquivos inexistentes mantêm o valor original.
+    legacy_paths = cursor.execute("""
+        SELECT image_path FROM products WHERE image_path IS NOT NULL
+        UNION SELECT reference_image_path FROM orders WHERE reference_image_path IS NOT NULL
+    """).fetchall()
+    for (old_path,) in legacy_paths:
+        source = Path(old_path.replace("\\", "/"))
+        if not source.is_file():
+            continue
+        new_path = store_file(source)
+        cursor.execute("UPDATE products SET image_path = ? WHERE image_path = ?", (new_path, old_path))
+        cursor.execute("UPDATE orders SET reference_image_path = ? WHERE reference_image_path = ?", (new_path, old_path))
+    
+    for table, column in (("products", "image_path"), ("orders", "reference_image_path")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_image_ref_insert AFTER INSERT ON {table}
+            WHEN new.{column} IS NOT NULL BEGIN
+                INSERT INTO image_refs (path, refcount) VALUES (new.{column}, 1)
+                ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_image_ref_update AFTER UPDATE OF {column} ON {table}
+            WHEN old.{column} IS NOT new.{column} BEGIN
+                UPDATE image_refs SET refcount = refcount - 1 WHERE path = old.{column};
+                INSERT INTO image_refs (path, refcount) SELECT new.{column}, 1 WHERE new.{column} IS NOT NULL
+                ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_image_ref_delete AFTER DELETE ON {table}
+            WHEN old.{column} IS NOT NULL BEGIN
+                UPDATE image_refs SET refcount = refcount - 1 WHERE path = old.{column};
+            END
+        """)
+    
+    cursor.execute("""
+        INSERT INTO image_refs (path, refcount)
+        SELECT path, COUNT(*) FROM (
+            SELECT image_path AS path FROM products WHERE image_path IS NOT NULL
+            UNION ALL SELECT reference_image_path FROM orders WHERE reference_image_path IS NOT NULL
+        ) GROUP BY path
+        ON CONFLICT (path) DO UPDATE SET refcount = excluded.refcount
+    """)
+
+def _migration_5_fila_pedidos(cursor: sqlite3.Cursor) -> None:
+    """Data de criação dos pedidos e índices compostos para a fila de pedidos do Admin."""
+    # ALTER TABLE não aceita DEFAULT CURRENT_TIMESTAMP; add_order preenche a data (pedidos antigos ficam NULL)
+    cursor.execute("ALTER TABLE orders ADD COLUMN created_at TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_id ON orders (status, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_email_id ON orders (user_email, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at)")
+
+def _migration_6_sessoes(cursor: sqlite3.Cursor) -> None:
+    """Sessões persistentes: apenas o hash do token é gravado, com data de expiração."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            FOREIGN KEY (email) REFERENCES users (email)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+def _migration_7_confirmacao_pedidos(cursor: sqlite3.Cursor) -> None:
+    """Código de confirmação dos pedidos enviados pela fila (único: reenviar o mesmo lote não duplica pedidos)."""
+    cursor.execute("ALTER TABLE orders ADD COLUMN confirmation_id TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_confirmation_id ON orders (confirmation_id)")
+
+def _migration_8_versao_produtos(cursor: sqlite3.Cursor) -> None:
+    """Versão de cada produto, incrementada a cada alteração (controle de concorrência otimista)."""
+    cursor.execute("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+# Agregados de vendas mantidos pelos triggers de orders: tabela -> (coluna, tipo, expressão sobre a
+# linha do pedido) de cada coluna da chave ({r} = new, old ou a própria tabela orders na reconstrução).
+# Pedidos antigos sem created_at ficam com o dia ''; pedidos sem produto cadastrado, com product_id 0.
+# product_name (nome na data do pedido) também faz parte da chave para que os relatórios ainda
+# mostrem um nome para produtos removidos; produtos renomeados são somados pelo product_id.
+SALES_AGGREGATES = {
+    "sales_daily_product": (
+        ("day", "TEXT", "COALESCE(date({r}.created_at), '')"),
+        ("product_id", "INTEGER", "COALESCE({r}.product_id, 0)"),
+        ("product_name", "TEXT", "{r}.product_name"),
+        ("status", "TEXT", "COALESCE({r}.status, 'Pendente')"),
+    ),
+    "sales_by_status": (
+        ("status", "TEXT", "COALESCE({r}.status, 'Pendente')"),
+    ),
+    "sales_by_customer": (
+        ("user_email", "TEXT", "{r}.user_email"),
+        ("status", "TEXT", "COALESCE({r}.status, 'Pendente')"),
+    ),
+}
+_SALES_MEASURES = "orders, units, revenue"
+_SALES_TRACKED_COLUMNS = ("status", "quantity", "unit_price", "product_id", "product_name", "user_email", "created_at")
+
+def _sales_delta_sql(row: str, sign: str) -> str:
+    """Instruções que somam (sign '+') ou subtraem (sign '-') o pedido `row` (new/old) em cada agregado."""
+    statements = []
+    for table, keys in SALES_AGGREGATES.items():
+        columns = ", ".join(column for column, _, _ in keys)
+        values = ", ".join(expr.format(r=row) for _, _, expr in keys)
+        statements.append(f"""
+            INSERT INTO {table} ({columns}, {_SALES_MEASURES})
+            VALUES ({values}, {sign}1, {sign}{row}.quantity, {sign}({row}.quantity * COALESCE({row}.unit_price, 0)))
+            ON CONFLICT ({columns}) DO UPDATE SET orders = orders + excluded.orders, units = units + excluded.units,
+                revenue = revenue + excluded.revenue;""")
+        if sign == "-":
+            match = " AND ".join(f"{column} = {expr.format(r=row)}" for column, _, expr in keys)
+            statements.append(f"DELETE FROM {table} WHERE {match} AND orders = 0;")
+    return "\n".join(statements)
+
+def _rebuild_sales(cursor: sqlite3.Cursor) -> None:
+    """Recalcula todos os agregados de vendas a partir da tabela orders (dentro da transação de quem chamou)."""
+    for table, keys in SALES_AGGREGATES.items():
+        columns = ", ".join(column for column, _, _ in keys)
+        exprs = ", ".join(expr.format(r="o") for _, _, expr in keys)
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO {table} ({columns}, {_SALES_MEASURES})
+            SELECT {exprs}, COUNT(*), SUM(o.quantity), SUM(o.quantity * COALESCE(o.unit_price, 0))
+            FROM orders AS o GROUP BY {exprs}
+        """)
+
+def _create_sales_aggregates(cursor: sqlite3.Cursor) -> None:
+    """(Re)cria as tabelas de agregados de vendas e os triggers conforme SALES_AGGREGATES e as preenche."""
+    for trigger in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_orders_sales_{trigger}")
+    for table, keys in SALES_AGGREGATES.items():
+        columns = ", ".join(f"{column} {sql_type} NOT NULL" for column, sql_type, _ in keys)
+        primary_key = ", ".join(column for column, _, _ in keys)
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"""
+            CREATE TABLE {table} (
+                {columns},
+                orders INTEGER NOT NULL,
+                units INTEGER NOT NULL,
+                revenue REAL NOT NULL,
+                PRIMARY KEY ({primary_key})
+            ) WITHOUT ROWID
+        """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_orders_sales_insert AFTER INSERT ON orders BEGIN
+            {_sales_delta_sql("new", "+")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_orders_sales_delete AFTER DELETE ON orders BEGIN
+            {_sales_delta_sql("old", "-")}
+        END
+    """)
+    changed = " OR ".join(f"old.{column} IS NOT new.{column}" for column in _SALES_TRACKED_COLUMNS)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_orders_sales_update
+        AFTER UPDATE OF {", ".join(_SALES_TRACKED_COLUMNS)} ON orders
+        WHEN {changed} BEGIN
+            {_sales_delta_sql("old", "-")}
+            {_sales_delta_sql("new", "+")}
+        END
+    """)
+    # Preenche com os pedidos já existentes
+    _rebuild_sales(cursor)
+
+# Definição dos agregados na migração 9, congelada: a migração 10 os recria conforme SALES_AGGREGATES
+_SALES_AGGREGATES_V9 = {
+    "sales_daily_product": (
+        ("day", "COALESCE(date({r}.created_at), '')"),
+        ("product_name", "{r}.product_name"),
+        ("status", "COALESCE({r}.status, 'Pendente')"),
+    ),
+    "sales_by_status": (
+        ("status", "COALESCE({r}.status, 'Pendente')"),
+    ),
+    "sales_by_customer": (
+        ("user_email", "{r}.user_email"),
+        ("status", "COALESCE({r}.status, 'Pendente')"),
+    ),
+}
+
+def _migration_9_agregados_vendas(cursor: sqlite3.Cursor) -> None:
+    """Pedidos e unidades por produto/dia/status, por status e por cliente, mantidos por triggers em orders."""
+
+    def _sales_delta_sql(row: str, sign: str) -> str:
+        statements = []
+        for table, keys in _SALES_AGGREGATES_V9.items():
+            columns = ", ".join(column for column, _ in keys)
+            values = ", ".join(expr.format(r=row) for _, expr in keys)
+            statements.append(f"""
+                INSERT INTO {table} ({columns}, orders, units) VALUES ({values}, {sign}1, {sign}{row}.quantity)
+                ON CONFLICT ({columns}) DO UPDATE SET orders = orders + excluded.orders, units = units + excluded.units;""")
+            if sign == "-":
+                match = " AND ".join(f"{column} = {expr.format(r=row)}" for column, expr in keys)
+                statements.append(f"DELETE FROM {table} WHERE {match} AND orders = 0;")
+        return "\n".join(statements)
+
+    for table, keys in _SALES_AGGREGATES_V9.items():
+        columns = ", ".join(f"{column} TEXT NOT NULL" for column, _ in keys)
+        primary_key = ", ".join(column for column, _ in keys)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {columns},
+                orders INTEGER NOT NULL,
+                units INTEGER NOT NULL,
+                PRIMARY KEY ({primary_key})
+            ) WITHOUT ROWID
+        """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_sales_insert AFTER INSERT ON orders BEGIN
+            {_sales_delta_sql("new", "+")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_sales_delete AFTER DELETE ON orders BEGIN
+            {_sales_delta_sql("old", "-")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_sales_update
+        AFTER UPDATE OF status, quantity, product_name, user_email, created_at ON orders
+        WHEN old.status IS NOT new.status OR old.quantity IS NOT new.quantity OR old.product_name IS NOT new.product_name
+          OR old.user_email IS NOT new.user_email OR old.created_at IS NOT new.created_at BEGIN
+            {_sales_delta_sql("old", "-")}
+            {_sales_delta_sql("new", "+")}
+        END
+    """)
+    # Preenche com os pedidos já existentes
+    for table, keys in _SALES_AGGREGATES_V9.items():
+        columns = ", ".join(column for column, _ in keys)
+        exprs = ", ".join(expr.format(r="o") for _, expr in keys)
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO {table} ({columns}, orders, units)
+            SELECT {exprs}, COUNT(*), SUM(o.quantity) FROM orders AS o GROUP BY {exprs}
+        """)
+
+def _migration_10_produto_nos_pedidos(cursor: sqlite3.Cursor) -> None:
+    """
+    Pedidos passam a referenciar o produto pelo id (índice product_id, id) e guardam o preço unitário
+    cobrado. Pedidos antigos são associados pelo nome ao produto atual, com o preço atual dele
+    (o preço da época não foi registrado); pedidos de produtos que não existem mais ficam sem id.
+    """
+    cursor.execute("ALTER TABLE orders ADD COLUMN product_id INTEGER REFERENCES products (id)")
+    cursor.execute("ALTER TABLE orders ADD COLUMN unit_price REAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_product_id_id ON orders (product_id, id)")
+    # Sem gatilhos durante o preenchimento: os agregados são recriados (e recalculados) logo abaixo
+    for trigger in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_orders_sales_{trigger}")
+    cursor.execute("""
+        UPDATE orders SET (product_id, unit_price) = (
+            SELECT p.id, p.price FROM products AS p WHERE p.name = orders.product_name ORDER BY p.id LIMIT 1
+        )
+        WHERE product_id IS NULL
+    """)
+    _create_sales_aggregates(cursor)
+
+def _migration_11_imagens_aguardando_pedido(cursor: sqlite3.Cursor) -> None:
+    """
+    Imagens de referência processadas antes de o pedido sair da fila (order_queue): ficam aqui até a
+    gravação do pedido, que as associa na mesma transação. Contam como referência em image_refs.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pending_reference_images (
+            confirmation_id TEXT PRIMARY KEY,
+            image_path TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_pending_reference_images_image_ref_insert AFTER INSERT ON pending_reference_images
+        BEGIN
+            INSERT INTO image_refs (path, refcount) VALUES (new.image_path, 1)
+            ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_pending_reference_images_image_ref_update AFTER UPDATE OF image_path ON pending_reference_images
+        WHEN old.image_path IS NOT new.image_path BEGIN
+            UPDATE image_refs SET refcount = refcount - 1 WHERE path = old.image_path;
+            INSERT INTO image_refs (path, refcount) VALUES (new.image_path, 1)
+            ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_pending_reference_images_image_ref_delete AFTER DELETE ON pending_reference_images
+        BEGIN
+            UPDATE image_refs SET refcount = refcount - 1 WHERE path = old.image_path;
+        END
+    """)
+
+MIGRATIONS = [
+    (1, _migration_1_schema_inicial),
+    (2, _migration_2_versao_catalogo),
+    (3, _migration_3_busca_catalogo),
+    (4, _migration_4_referencias_imagens),
+    (5, _migration_5_fila_pedidos),
+    (6, _migration_6_sessoes),
+    (7, _migration_7_confirmacao_pedidos),
+    (8, _migration_8_versao_produtos),
+    (9, _migration_9_agregados_vendas),
+    (10, _migration_10_produto_nos_pedidos),
+    (11, _migration_11_imagens_aguardando_pedido),
+]
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def run_migrations() -> int:
+    """
+    Aplica, em ordem, as migrações com versão maior que PRAGMA user_version.
+    Usa BEGIN IMMEDIATE e relê a versão dentro da transação, então dois processos
+    iniciando ao mesmo tempo não aplicam o mesmo passo duas vezes.
+    """
+    latest = MIGRATIONS[-1][0]
+    with db_connection() as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= latest:
+            return latest
         
-    conn.commit()
-    conn.close()
+        conn.execute("BEGIN IMMEDIATE")
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        cursor = conn.cursor()
+        for version, step in MIGRATIONS:
+            if version > current:
+                step(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                current = version
+    return current
+
+def initialize_db():
+    """Garante o esquema atualizado. Só acessa o banco na primeira chamada de cada processo."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            run_migrations()
+            _schema_ready = True
 
 # --- Funções de CRUD (Usuários) ---
 
 def get_user(email: str) -> Optional[Dict]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-    user_data = cursor.fetchone()
-    conn.close()
+    with db_read_connection() as conn:
+        user_data = conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
     return dict(user_data) if user_data else None
 
 def add_user(data: Dict) -> bool:
     if get_user(data['email']): return False 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    password_hash = hash_password(data['password'])
     try:
-        cursor.execute(
-            "INSERT INTO users (email, name, password, cpf, address, role) VALUES (?, ?, ?, ?, ?, ?)",
-            (data['email'], data['name'], data['password'], data['cpf'], data['address'], data['role'])
-        )
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT INTO users (email, name, password, cpf, address, role) VALUES (?, ?, ?, ?, ?, ?)",
+                (data['email'], data['name'], password_hash, data['cpf'], data['address'], data['role'])
+            )
         return True
     except sqlite3.Error as e:
         print(f"ERRO SQL ao adicionar usuário '{data['email']}': {e}")
         return False
-    finally:
-        conn.close()
 
-def get_all_users() -> Dict:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users")
-    users_list = cursor.fetchall()
-    conn.close()
-    return {user['email']: dict(user) for user in users_list}
+def authenticate_user(email: str, password: str) -> Optional[Dict]:
+    """
+    Confere email e senha. Senhas antigas em texto puro (ou com hash desatualizado)
+    são regravadas com o hash atual no primeiro login bem-sucedido.
+    """
+    user = get_user(email)
+    if not user:
+        return None
+    ok, needs_rehash = verify_password(password, user['password'])
+    if not ok:
+        return None
+    if needs_rehash:
+        new_hash = hash_password(password)
+        try:
+            with db_connection() as conn:
+                # Só regrava se ninguém alterou a senha nesse meio tempo
+                conn.execute("UPDATE users SET password = ? WHERE email = ? AND password = ?", (new_hash, email, user['password']))
+        except sqlite3.Error as e:
+            print(f"ERRO SQL ao atualizar hash da senha de '{email}': {e}")
+    return user
+
+# --- Sessões Persistentes ---
+
+def add_session(token_hash: str, email: str, expires_at: str) -> bool:
+    try:
+        with db_connection() as conn:
+            conn.execute("INSERT INTO sessions (token_hash, email, expires_at) VALUES (?, ?, ?)", (token_hash, email, expires_at))
+        return True
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao criar sessão de '{email}': {e}")
+        return False
+
+def get_session_user(token_hash: str) -> Optional[Dict]:
+    """Usuário dono de uma sessão válida (uma busca pela chave primária da sessão)."""
+    with db_read_connection() as conn:
+        row = conn.execute(
+            """
+            SELECT u.email, u.name, u.role, s.expires_at FROM sessions s JOIN users u ON u.email = s.email
+            WHERE s.token_hash = ? AND s.expires_at > datetime('now')
+            """,
+            (token_hash,)
+        ).fetchone()
+    return dict(row) if row else None
+
+def delete_session(token_hash: str) -> None:
+    try:
+        with db_connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao remover sessão: {e}")
+
+def delete_expired_sessions() -> int:
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE expires_at <= datetime('now')")
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao limpar sessões expiradas: {e}")
+        return 0
 
 def get_all_users_list() -> List[Dict]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, email, role, cpf FROM users ORDER BY role DESC, name ASC")
-    users_list = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with db_read_connection() as conn:
+        cursor = conn.execute("SELECT name, email, role, cpf FROM users ORDER BY role DESC, name ASC")
+        users_list = [dict(row) for row in cursor.fetchall()]
     return users_list
 
+# --- Cache do Catálogo de Produtos ---
+# Compartilhado por todas as sessões do processo. As escritas deste processo invalidam
+# o cache explicitamente; escritas externas (outro processo, sqlite3 na mão) são detectadas
+# via PRAGMA data_version e confirmadas pela tabela catalog_version.
+
+_catalog_lock = threading.Lock()
+_catalog = {"products": None, "by_id": {}, "data_version": None, "version": None}
+_catalog_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_catalog_watcher = None # Conexão somente leitura dedicada: seu data_version muda a cada commit de outra conexão
+
+def invalidate_catalog_cache() -> None:
+    """Descarta o catálogo em memória; a próxima leitura recarrega do banco."""
+    with _catalog_lock:
+        if _catalog["products"] is not None:
+            _catalog_stats["invalidations"] += 1
+        _catalog["products"] = None
+
+def get_catalog_cache_stats() -> Dict:
+    with _catalog_lock:
+        stats = dict(_catalog_stats)
+        stats["cached_products"] = len(_catalog["products"]) if _catalog["products"] is not None else 0
+    return stats
+
+def _load_catalog() -> List[Dict]:
+    """Retorna o catálogo em cache, recarregando-o se estiver inválido. Chamar com _catalog_lock."""
+    global _catalog_watcher
+    if _catalog_watcher is None:
+        _catalog_watcher = get_db_connection(read_only=True)
+    
+    data_version = _catalog_watcher.execute("PRAGMA data_version").fetchone()[0]
+    if _catalog["products"] is not None and data_version != _catalog["data_version"]:
+        # Alguma conexão gravou no banco; só invalida se a escrita atingiu products
+        version = _catalog_watcher.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+        _catalog["data_version"] = data_version
+        if version != _catalog["version"]:
+            _catalog_stats["invalidations"] += 1
+            _catalog["products"] = None
+    
+    if _catalog["products"] is not None:
+        _catalog_stats["hits"] += 1
+        return _catalog["products"]
+    
+    _catalog_stats["misses"] += 1
+    # Versão e linhas lidas no mesmo snapshot para que fiquem consistentes entre si
+    _catalog_watcher.execute("BEGIN")
+    try:
+        version = _catalog_watcher.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+        rows = _catalog_watcher.execute("SELECT * FROM products ORDER BY name ASC").fetchall()
+    finally:
+        _catalog_watcher.commit()
+    
+    products = [dict(row) for row in rows]
+    _catalog.update(
+        products=products,
+        by_id={p['id']: p for p in products},
+        data_version=data_version,
+        version=version,
+    )
+    return products
+
 # --- Funções de CRUD (Produtos) ---
 
 def get_product(product_id: int) -> Optional[Dict]:
-    """Busca um produto pelo ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-    product_data = cursor.fetchone()
-    conn.close()
+    """Busca um produto pelo ID (servido pelo cache do catálogo)."""
+    with _catalog_lock:
+        _load_catalog()
+        product_data = _catalog["by_id"].get(product_id)
     return dict(product_data) if product_data else None
     
 def add_product(name: str, description: str, price: float, stock: int, image_path: str = None) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO products (name, description, price, stock, image_path) VALUES (?, ?, ?, ?, ?)",
-            (name, description, price, stock, image_path)
-        )
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT INTO products (name, description, price, stock, image_path) VALUES (?, ?, ?, ?, ?)",
+                (name, description, price, stock, image_path)
+            )
+        invalidate_catalog_cache()
         return True
     except sqlite3.Error as e:
         print(f"ERRO SQL ao adicionar produto '{name}': {e}") 
         return False
-    finally:
-        conn.close()
 
-def update_product(product_id: int, name: str, description: str, price: float, stock: int, image_path: Optional[str] = None) -> bool:
-    """Atualiza um produto existente. O image_path é atualizado se for fornecido (não None)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def update_product(product_id: int, name: str, description: str, price: float, stock: int, image_path: Optional[str] = None, expected_version: Optional[int] = None) -> bool:
+    """
+    Atualiza um produto existente. O image_path é atualizado se for fornecido (não None).
+    Com `expected_version` (a versão lida ao abrir o formulário), só grava se ninguém alterou o
+    produto nesse meio tempo (pedidos que reservam estoque também contam); caso contrário retorna False.
+    """
+    columns, params = ["name=?", "description=?", "price=?", "stock=?"], [name, description, price, stock]
+    if image_path:
+        columns.append("image_path=?")
+        params.append(image_path)
+    # Não atualiza o campo image_path se a variável image_path for None (mantém o valor antigo)
+    where, where_params = "id=?", [product_id]
+    if expected_version is not None:
+        where += " AND version=?"
+        where_params.append(expected_version)
     try:
-        if image_path:
-            cursor.execute(
-                "UPDATE products SET name=?, description=?, price=?, stock=?, image_path=? WHERE id=?",
-                (name, description, price, stock, image_path, product_id)
-            )
-        else:
-            # Não atualiza o campo image_path se a variável image_path for None (mantém o valor antigo)
-            cursor.execute(
-                "UPDATE products SET name=?, description=?, price=?, stock=? WHERE id=?",
-                (name, description, price, stock, product_id)
+        with db_connection() as conn:
+            cursor = conn.execute(
+                f"UPDATE products SET {', '.join(columns)}, version = version + 1 WHERE {where}",
+                (*params, *where_params)
             )
-        conn.commit()
+        invalidate_catalog_cache()
         return cursor.rowcount > 0 
     except sqlite3.Error as e:
         print(f"ERRO SQL ao atualizar produto ID {product_id}: {e}")
         return False
-    finally:
-        conn.close()
 
 def delete_product(product_id: int) -> bool:
     """Deleta um produto pelo ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-        conn.commit()
+        with db_connection() as conn:
+            cursor = conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+        invalidate_catalog_cache()
         return cursor.rowcount > 0 
     except sqlite3.Error as e:
         print(f"ERRO SQL ao deletar produto ID {product_id}: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_all_products() -> List[Dict]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM products ORDER BY name ASC")
-    products_list = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    """Lista todos os produtos ordenados por nome (servido pelo cache do catálogo)."""
+    with _catalog_lock:
+        products_list = [dict(p) for p in _load_catalog()]
     return products_list
 
+# --- Snapshots Colunares (Tabelas do Admin) ---
+# pandas é importado só aqui dentro: as páginas de cliente não carregam pandas.
+
+ADMIN_TABLE_PAGE_SIZE = 50
+
+_products_frame = {"version": None, "frame": None}
+
+def get_products_frame():
+    """
+    Catálogo em formato colunar (DataFrame lido com pd.read_sql) para as tabelas do Admin.
+    Só é relido quando catalog_version muda; quem chama não deve alterar o DataFrame retornado.
+    """
+    import pandas as pd
+    global _catalog_watcher
+    with _catalog_lock:
+        if _catalog_watcher is None:
+            _catalog_watcher = get_db_connection(read_only=True)
+        # Versão e linhas lidas no mesmo snapshot para que fiquem consistentes entre si
+        _catalog_watcher.execute("BEGIN")
+        try:
+            version = _catalog_watcher.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+            if version != _products_frame["version"]:
+                frame = pd.read_sql("SELECT id, name, description, price, stock, image_path FROM products", _catalog_watcher)
+                _products_frame.update(version=version, frame=frame)
+        finally:
+            _catalog_watcher.commit()
+        return _products_frame["frame"]
+
+USER_SORT_COLUMNS = {"role": "role", "name": "name", "email": "email"}
+
+def _users_filter(search: str) -> Tuple[str, list]:
+    if not search:
+        return "", []
+    return "WHERE name LIKE ? OR email LIKE ?", [f"%{search}%", f"%{search}%"]
+
+def count_users(search: str = "") -> int:
+    """Quantidade de usuários cujo nome ou email contém `search`."""
+    where, params = _users_filter(search)
+    with db_read_connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM users {where}", params).fetchone()[0]
+
+def query_users_frame(search: str = "", sort_by: str = "role", descending: bool = False,
+                      offset: int = 0, limit: int = ADMIN_TABLE_PAGE_SIZE):
+    """
+    Uma página da lista de usuários em DataFrame (pd.read_sql): filtro por nome/email,
+    ordenação e LIMIT/OFFSET feitos no SQLite, permissão já formatada no SELECT.
+    """
+    import pandas as pd
+
+    where, params = _users_filter(search)
+    direction = "DESC" if descending else "ASC"
+    # users.<coluna>: ordena pelo valor gravado, não pelo rótulo calculado no SELECT
+    order = f"users.{USER_SORT_COLUMNS[sort_by]} {direction}, users.name ASC, users.email ASC"
+    with db_read_connection() as conn:
+        return pd.read_sql(
+            f"""
+            SELECT name, email, CASE role WHEN 'admin' THEN '⭐ ADMIN' ELSE 'CLIENTE' END AS role, cpf
+            FROM users {where} ORDER BY {order} LIMIT ? OFFSET ?
+            """,
+            conn, params=(*params, limit, offset)
+        )
+
+# --- Importação em Lote de Produtos ---
+
+IMPORT_CHUNK_SIZE = 500
+
+_UPSERT_PRODUCT_SQL = """
+    INSERT INTO products (id, name, description, price, stock) VALUES (:id, :name, :description, :price, :stock)
+    ON CONFLICT (id) DO UPDATE SET
+        name = excluded.name, description = excluded.description,
+        price = excluded.price, stock = excluded.stock, version = version + 1
+"""
+
+def upsert_products(rows: List[Dict], chunk_size: int = IMPORT_CHUNK_SIZE, progress=None) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Insere/atualiza produtos em lotes: um executemany e um único commit por lote.
+    Cada linha é um dict com id (None para inserir), name, description, price, stock e
+    opcionalmente `row` (número da linha na planilha, usado nos erros).
+    Um lote que falha é refeito linha a linha para identificar as linhas com erro.
+    `progress(done, total)` é chamado após cada lote. Retorna (linhas gravadas, [(linha, erro)]).
+    """
+    saved, errors = 0, []
+    total = len(rows)
+    for start in range(0, total, chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            with db_connection() as conn:
+                conn.executemany(_UPSERT_PRODUCT_SQL, chunk)
+            saved += len(chunk)
+        except sqlite3.Error:
+            for offset, row in enumerate(chunk):
+                try:
+                    with db_connection() as conn:
+                        conn.execute(_UPSERT_PRODUCT_SQL, row)
+                    saved += 1
+                except sqlite3.Error as e:
+                    errors.append((row.get('row', start + offset + 1), str(e)))
+        if progress:
+            progress(min(start + chunk_size, total), total)
+    
+    invalidate_catalog_cache()
+    return saved, errors
+
+# --- Consulta Paginada do Catálogo ---
+
+CATALOG_PAGE_SIZE = 20
+
+def _fts_query(text: str) -> str:
+    """Converte o texto digitado em uma consulta FTS5 por prefixo ("toal pers" -> "toal"* "pers"*)."""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", text))
+
+def search_products(query: str = "", after: Optional[Tuple[str, int]] = None, limit: int = CATALOG_PAGE_SIZE) -> List[Dict]:
+    """
+    Retorna uma página do catálogo ordenada por (name, id).
+    `after` é a chave (name, id) do último item da página anterior (paginação keyset, sem OFFSET).
+    Com `query`, filtra pelo índice FTS5 de nome/descrição.
+    """
+    after_name, after_id = after if after else ("", 0)
+    fts = _fts_query(query or "")
+    with db_read_connection() as conn:
+        if fts:
+            cursor = conn.execute(
+                """
+                SELECT p.* FROM products_fts f JOIN products p ON p.id = f.rowid
+                WHERE products_fts MATCH ? AND (p.name, p.id) > (?, ?)
+                ORDER BY p.name, p.id LIMIT ?
+                """,
+                (fts, after_name, after_id, limit)
+            )
+        else:
+            cursor = conn.execute(
+                "SELECT * FROM products WHERE (name, id) > (?, ?) ORDER BY name, id LIMIT ?",
+                (after_name, after_id, limit)
+            )
+        products_list = [dict(row) for row in cursor.fetchall()]
+    return products_list
+
+# --- Referências de Imagens ---
+
+def get_referenced_images() -> set:
+    """Caminhos de imagem ainda referenciados por algum produto ou pedido."""
+    with db_read_connection() as conn:
+        rows = conn.execute("SELECT path FROM image_refs WHERE refcount > 0").fetchall()
+    return {row['path'] for row in rows}
+
+def drop_unreferenced_image(image_path: str) -> bool:
+    """
+    Remove o registro da imagem se a contagem chegou a zero. Retorna True se o arquivo pode ser apagado.
+    Uma imagem que nunca foi referenciada não tem registro e fica para collect_orphan_images, que respeita
+    o intervalo de carência (outro upload do mesmo conteúdo pode estar sendo gravado neste momento).
+    """
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute("DELETE FROM image_refs WHERE path = ? AND refcount <= 0", (image_path,))
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao liberar imagem '{image_path}': {e}")
+        return False
+
 # --- Funções de CRUD (Pedidos) ---
 
-def add_order(user_email: str, product_name: str, quantity: int, details: str, reference_image_path: str = None) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# O preço unitário é copiado do produto na mesma transação em que o estoque é reservado, e a imagem
+# de referência que ficou pronta antes do pedido é retirada de pending_reference_images
+_INSERT_ORDER_SQL = """
+    INSERT INTO orders (user_email, product_id, product_name, quantity, unit_price, details, reference_image_path, created_at, confirmation_id)
+    VALUES (:user_email, :product_id, :product_name, :quantity, (SELECT price FROM products WHERE id = :product_id),
+            :details, COALESCE(:reference_image_path, (SELECT image_path FROM pending_reference_images WHERE confirmation_id = :confirmation_id)),
+            :created_at, :confirmation_id)
+    ON CONFLICT (confirmation_id) DO NOTHING
+"""
+
+def _reserve_stock(conn: sqlite3.Connection, product_id: int, quantity: int) -> bool:
+    """Baixa o estoque apenas se houver quantidade suficiente: verificação e baixa na mesma instrução."""
+    cursor = conn.execute(
+        "UPDATE products SET stock = stock - ?, version = version + 1 WHERE id = ? AND stock >= ?",
+        (quantity, product_id, quantity)
+    )
+    return cursor.rowcount > 0
+
+def add_order(user_email: str, product_name: str, quantity: int, details: str, reference_image_path: str = None, product_id: Optional[int] = None) -> bool:
+    """
+    Registra um pedido. Com `product_id`, reserva o estoque na mesma transação (BEGIN IMMEDIATE):
+    se não houver estoque suficiente nada é gravado e retorna False.
+    """
     try:
-        cursor.execute(
-            "INSERT INTO orders (user_email, product_name, quantity, details, reference_image_path) VALUES (?, ?, ?, ?, ?)",
-            (user_email, product_name, quantity, details, reference_image_path)
-        )
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if product_id is not None and not _reserve_stock(conn, product_id, quantity):
+                conn.rollback()
+                return False
+            conn.execute(_INSERT_ORDER_SQL, {
+                "user_email": user_email, "product_id": product_id, "product_name": product_name,
+                "quantity": quantity, "details": details, "reference_image_path": reference_image_path,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), "confirmation_id": None,
+            })
         return True
     except sqlite3.Error as e:
         print(f"ERRO SQL ao adicionar pedido: {e}")
         return False
-    finally:
-        conn.close()
+
+def add_orders_batch(orders: List[Dict]) -> Tuple[int, int]:
+    """
+    Grava um lote de pedidos em uma única transação (BEGIN IMMEDIATE, um commit para o lote inteiro).
+    Cada pedido traz user_email, product_name, quantity, details, reference_image_path,
+    created_at, confirmation_id e opcionalmente product_id; pedidos com confirmation_id já
+    gravado são ignorados. Com product_id o estoque é reservado na mesma transação, e o pedido
+    sem estoque suficiente é gravado como 'Cancelado'.
+    Retorna (pedidos inseridos, pedidos cancelados por falta de estoque).
+    Erros do SQLite são propagados para quem chamou.
+    """
+    inserted, out_of_stock = 0, 0
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for order in orders:
+            cursor = conn.execute(_INSERT_ORDER_SQL, {"product_id": None, **order}) # Lotes antigos da fila não têm product_id
+            if cursor.rowcount == 0:
+                continue # Já gravado (lote reenviado): o estoque também já foi reservado
+            inserted += 1
+            conn.execute("DELETE FROM pending_reference_images WHERE confirmation_id = ?", (order['confirmation_id'],))
+            if order.get('product_id') is not None and not _reserve_stock(conn, order['product_id'], order['quantity']):
+                conn.execute("UPDATE orders SET status = 'Cancelado' WHERE id = ?", (cursor.lastrowid,))
+                out_of_stock += 1
+    return inserted, out_of_stock
+
+def set_order_reference_image(confirmation_id: str, image_path: str) -> Optional[bool]:
+    """
+    Associa a imagem de referência (já processada por ingest.py) ao pedido. Se o pedido ainda está na
+    fila, a imagem fica em pending_reference_images e add_orders_batch a associa ao gravá-lo (na mesma
+    conexão de escrita, então não há corrida entre as duas). Retorna True se associou agora, False se
+    ficou aguardando o pedido e None em caso de erro.
+    """
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE orders SET reference_image_path = ? WHERE confirmation_id = ?",
+                (image_path, confirmation_id)
+            )
+            if cursor.rowcount > 0:
+                return True
+            conn.execute("""
+                INSERT INTO pending_reference_images (confirmation_id, image_path, created_at) VALUES (?, ?, ?)
+                ON CONFLICT (confirmation_id) DO UPDATE SET image_path = excluded.image_path, created_at = excluded.created_at
+            """, (confirmation_id, image_path, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())))
+        return False
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao associar imagem ao pedido {confirmation_id}: {e}")
+        return None
+
+def discard_pending_reference_image(confirmation_id: str) -> Optional[str]:
+    """
+    Descarta a imagem que aguardava um pedido que não será gravado (recusado pelo banco).
+    Retorna o caminho da imagem, para que release_image a apague se não houver outra referência.
+    """
+    try:
+        with db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT image_path FROM pending_reference_images WHERE confirmation_id = ?", (confirmation_id,)
+            ).fetchone()
+            conn.execute("DELETE FROM pending_reference_images WHERE confirmation_id = ?", (confirmation_id,))
+        return row['image_path'] if row else None
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao descartar imagem do pedido {confirmation_id}: {e}")
+        return None
+
+def expire_pending_reference_images(max_age_seconds: int) -> int:
+    """
+    Remove as imagens que aguardam há mais de `max_age_seconds` um pedido que nunca chegou.
+    A imagem deixa de ser referenciada e é removida por collect_orphan_images. Retorna quantas expiraram.
+    """
+    cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - max_age_seconds))
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute("DELETE FROM pending_reference_images WHERE created_at < ?", (cutoff,))
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao expirar imagens aguardando pedido: {e}")
+        return 0
+
+# --- Fila de Pedidos (Admin) ---
+
+ORDERS_PAGE_SIZE = 25
+
+# Status possíveis e para quais status cada um pode avançar
+ORDER_STATUS_TRANSITIONS = {
+    "Pendente": ["Em produção", "Cancelado"],
+    "Em produção": ["Pronto", "Cancelado"],
+    "Pronto": ["Entregue"],
+    "Entregue": [],
+    "Cancelado": [],
+}
+
+# Pedido com o produto atual (busca pela chave primária de products). current_product_name é None
+# se o produto foi removido; product_name é sempre o nome na data do pedido.
+_ORDERS_WITH_PRODUCT_SQL = """
+    SELECT o.*, p.name AS current_product_name, p.price AS current_price, p.stock AS current_stock
+    FROM orders AS o LEFT JOIN products AS p ON p.id = o.product_id
+"""
+
+def list_orders(status: Optional[str] = None, user_email: Optional[str] = None,
+                date_from: Optional[str] = None, date_to: Optional[str] = None,
+                before_id: Optional[int] = None, limit: int = ORDERS_PAGE_SIZE,
+                product_id: Optional[int] = None) -> List[Dict]:
+    """
+    Página de pedidos do mais recente para o mais antigo, com filtros opcionais e os dados atuais do produto.
+    `before_id` é o id do último pedido da página anterior (paginação keyset).
+    Datas no formato 'AAAA-MM-DD' (UTC); `date_to` é inclusivo.
+    """
+    clauses, params = [], []
+    if status:
+        clauses.append("o.status = ?")
+        params.append(status)
+    if user_email:
+        clauses.append("o.user_email = ?")
+        params.append(user_email)
+    if product_id is not None:
+        clauses.append("o.product_id = ?")
+        params.append(product_id)
+    if date_from:
+        clauses.append("o.created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("o.created_at < date(?, '+1 day')")
+        params.append(date_to)
+    if before_id:
+        clauses.append("o.id < ?")
+        params.append(before_id)
+    
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with db_read_connection() as conn:
+        cursor = conn.execute(f"{_ORDERS_WITH_PRODUCT_SQL} {where} ORDER BY o.id DESC LIMIT ?", (*params, limit))
+        orders_list = [dict(row) for row in cursor.fetchall()]
+    return orders_list
+
+def get_order(order_id: int) -> Optional[Dict]:
+    """Um pedido com os dados atuais do produto."""
+    with db_read_connection() as conn:
+        row = conn.execute(f"{_ORDERS_WITH_PRODUCT_SQL} WHERE o.id = ?", (order_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_order_by_confirmation(confirmation_id: str) -> Optional[Dict]:
+    """Um pedido pelo código de confirmação (índice único), com os dados atuais do produto."""
+    with db_read_connection() as conn:
+        row = conn.execute(f"{_ORDERS_WITH_PRODUCT_SQL} WHERE o.confirmation_id = ?", (confirmation_id,)).fetchone()
+    return dict(row) if row else None
+
+def count_orders_by_status() -> Dict[str, int]:
+    """Quantidade de pedidos em cada status (lida do agregado sales_by_status, uma linha por status)."""
+    with db_read_connection() as conn:
+        rows = conn.execute("SELECT status, orders FROM sales_by_status").fetchall()
+    return {row['status']: row['orders'] for row in rows}
+
+def get_customer_orders(user_email: str, before_id: Optional[int] = None, limit: int = ORDERS_PAGE_SIZE) -> List[Dict]:
+    """Histórico de pedidos de um cliente (índice user_email, id)."""
+    return list_orders(user_email=user_email, before_id=before_id, limit=limit)
+
+def get_product_orders(product_id: int, before_id: Optional[int] = None, limit: int = ORDERS_PAGE_SIZE) -> List[Dict]:
+    """Pedidos de um produto, inclusive os feitos antes de uma mudança de nome (índice product_id, id)."""
+    return list_orders(product_id=product_id, before_id=before_id, limit=limit)
+
+def update_order_status(order_id: int, new_status: str) -> bool:
+    """
+    Avança o pedido para `new_status` se a transição for permitida a partir do status atual.
+    A verificação é feita no próprio UPDATE, então duas pessoas da equipe não conseguem
+    aplicar transições conflitantes ao mesmo pedido.
+    """
+    allowed_from = [status for status, targets in ORDER_STATUS_TRANSITIONS.items() if new_status in targets]
+    if not allowed_from:
+        return False
+    placeholders = ", ".join("?" for _ in allowed_from)
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute(
+                f"UPDATE orders SET status = ? WHERE id = ? AND status IN ({placeholders})",
+                (new_status, order_id, *allowed_from)
+            )
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao atualizar status do pedido ID {order_id}: {e}")
+        return False
+
+# --- Relatórios de Vendas (agregados mantidos pelos triggers da migração 9) ---
+
+SALES_EXCLUDED_STATUSES = ("Cancelado",)   # Fora dos totais de vendas, a não ser que include_cancelled=True
+
+def _sales_filter(date_from: Optional[str], date_to: Optional[str], include_cancelled: bool) -> Tuple[str, list]:
+    """WHERE por período ('AAAA-MM-DD', inclusivo) e status para sales_daily_product."""
+    clauses, params = [], []
+    if date_from:
+        clauses.append("day >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("day <= ?")
+        params.append(date_to)
+    if not include_cancelled:
+        clauses.append(f"status NOT IN ({', '.join('?' for _ in SALES_EXCLUDED_STATUSES)})")
+        params.extend(SALES_EXCLUDED_STATUSES)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+def get_sales_totals(date_from: Optional[str] = None, date_to: Optional[str] = None, include_cancelled: bool = False) -> Dict:
+    """Total de pedidos, unidades e faturamento (quantidade x preço unitário do pedido) no período."""
+    where, params = _sales_filter(date_from, date_to, include_cancelled)
+    with db_read_connection() as conn:
+        row = conn.execute(
+            f"""SELECT COALESCE(SUM(orders), 0) AS orders, COALESCE(SUM(units), 0) AS units,
+                       COALESCE(SUM(revenue), 0) AS revenue FROM sales_daily_product {where}""",
+            params
+        ).fetchone()
+    return dict(row)
+
+def get_daily_sales(date_from: Optional[str] = None, date_to: Optional[str] = None, include_cancelled: bool = False) -> List[Dict]:
+    """Pedidos, unidades e faturamento por dia ('' = pedidos antigos sem data), em ordem cronológica."""
+    where, params = _sales_filter(date_from, date_to, include_cancelled)
+    with db_read_connection() as conn:
+        rows = conn.execute(
+            f"""SELECT day, SUM(orders) AS orders, SUM(units) AS units, SUM(revenue) AS revenue
+                FROM sales_daily_product {where} GROUP BY day ORDER BY day""",
+            params
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def get_product_sales(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      include_cancelled: bool = False, limit: int = 20) -> List[Dict]:
+    """
+    Produtos mais vendidos (em unidades) no período, somados pelo product_id (um produto renomeado
+    continua em uma linha só) e com o nome atual do catálogo. Produtos removidos aparecem com o nome
+    da data do pedido; pedidos antigos sem produto cadastrado (product_id 0) são agrupados pelo nome.
+    """
+    where, params = _sales_filter(date_from, date_to, include_cancelled)
+    with db_read_connection() as conn:
+        rows = conn.execute(
+            f"""SELECT s.product_id, COALESCE(p.name, s.product_name) AS product_name, s.orders, s.units, s.revenue
+                FROM (
+                    SELECT product_id, MAX(product_name) AS product_name, SUM(orders) AS orders,
+                           SUM(units) AS units, SUM(revenue) AS revenue
+                    FROM sales_daily_product {where}
+                    GROUP BY product_id, CASE WHEN product_id = 0 THEN product_name END
+                    ORDER BY units DESC LIMIT ?
+                ) AS s LEFT JOIN products AS p ON p.id = s.product_id
+                ORDER BY s.units DESC, product_name""",
+            (*params, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def get_sales_by_status() -> List[Dict]:
+    """Pedidos, unidades e faturamento em cada status (todo o histórico)."""
+    with db_read_connection() as conn:
+        rows = conn.execute("SELECT status, orders, units, revenue FROM sales_by_status ORDER BY orders DESC").fetchall()
+    return [dict(row) for row in rows]
+
+def get_top_customers(include_cancelled: bool = False, limit: int = 20) -> List[Dict]:
+    """Clientes com mais unidades pedidas (todo o histórico)."""
+    placeholders = ", ".join("?" for _ in SALES_EXCLUDED_STATUSES)
+    where = "" if include_cancelled else f"WHERE status NOT IN ({placeholders})"
+    params = [] if include_cancelled else list(SALES_EXCLUDED_STATUSES)
+    with db_read_connection() as conn:
+        rows = conn.execute(
+            f"""SELECT user_email, SUM(orders) AS orders, SUM(units) AS units, SUM(revenue) AS revenue FROM sales_by_customer {where}
+                GROUP BY user_email ORDER BY units DESC, user_email LIMIT ?""",
+            (*params, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def rebuild_sales_aggregates() -> int:
+    """
+    Recalcula os agregados de vendas a partir de orders (após importações diretas no banco ou
+    para conferir os triggers). Uma transação: as leituras veem os valores antigos até o commit.
+    Retorna a quantidade de pedidos considerados.
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _rebuild_sales(conn.cursor())
+        return conn.execute("SELECT COALESCE(SUM(orders), 0) FROM sales_by_status").fetchone()[0]
+
+# --- Leitura em Blocos (Exportações/Relatórios) ---
+
+EXPORT_QUERIES = {
+    "orders": "SELECT id, created_at, user_email, product_id, product_name, quantity, unit_price, status, details FROM orders ORDER BY id",
+    "products": "SELECT id, name, description, price, stock FROM products ORDER BY name, id",
+}
+
+def iter_export_rows(kind: str, chunk_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+    """
+    Percorre a consulta de exportação `kind` em blocos de `chunk_size` linhas (fetchmany),
+    sem carregar a tabela inteira em memória. Em WAL, a leitura longa não bloqueia as escritas.
+    """
+    with db_read_connection() as conn:
+        cursor = conn.execute(EXPORT_QUERIES[kind])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def main(argv=None) -> None:
+    """Comandos de manutenção do banco (na raiz do projeto): python database.py rebuild-sales"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manutenção do banco de dados da Fadinha.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-sales", help="Recalcula os agregados de vendas a partir da tabela orders")
+    args = parser.parse_args(argv)
+
+    initialize_db()
+    if args.command == "rebuild-sales":
+        start = time.perf_counter()
+        total = rebuild_sales_aggregates()
+        print(f"Agregados de vendas recalculados: {total} pedidos em {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# exports.py
+
+import csv
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict
+
+from database import iter_export_rows
+
+EXPORT_FOLDER = Path(tempfile.gettempdir()) / "fadinha_exports"
+EXPORT_CHUNK_SIZE = 1000              # Linhas lidas do SQLite por vez
+EXPORT_PDF_MAX_ROWS = 20000           # O fpdf2 monta o PDF em memória; acima disso, use o CSV
+EXPORT_MAX_AGE_SECONDS = 24 * 60 * 60 # Arquivos gerados mais antigos que isso são apagados
+
+# Cabeçalho e largura (mm, PDF paisagem) de cada coluna exportada
+EXPORT_COLUMNS = {
+    "orders": [("ID", 12), ("Criado em (UTC)", 32), ("Cliente", 50), ("ID Produto", 16), ("Produto", 50), ("Qtd.", 10),
+               ("Preço unit. (R$)", 22), ("Status", 24), ("Detalhes", 61)],
+    "products": [("ID", 14), ("Produto", 80), ("Descrição", 120), ("Preço (R$)", 28), ("Estoque", 20)],
+}
+EXPORT_TITLES = {"orders": "Pedidos", "products": "Catálogo de Produtos"}
+
+# Um único worker: exportações não competem entre si nem com o servidor por CPU/IO
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+_jobs: Dict[str, Dict] = {}
+_jobs_lock = threading.Lock()
+
+def _update_job(job_id: str, **fields) -> None:
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+def _cleanup_old_exports() -> None:
+    cutoff = time.time() - EXPORT_MAX_AGE_SECONDS
+    for path in EXPORT_FOLDER.glob("*"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+def _write_csv(job_id: str, kind: str, target: Path) -> None:
+    # ";" e BOM UTF-8 para abrir corretamente no Excel em português
+    with open(target, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow([header for header, _ in EXPORT_COLUMNS[kind]])
+        total = 0
+        for rows in iter_export_rows(kind, EXPORT_CHUNK_SIZE):
+            writer.writerows(tuple(row) for row in rows)
+            total += len(rows)
+            _update_job(job_id, rows=total)
+
+def _latin1(value) -> str:
+    """As fontes padrão do PDF só têm Latin-1 (acentos ok; emojis viram '?')."""
+    text = "" if value is None else str(value)
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+def _fit(pdf, text: str, width: float) -> str:
+    """Trunca o texto para caber na largura da coluna (relatório de uma linha por registro)."""
+    text_width = pdf.get_string_width(text)
+    if text_width <= width:
+        return text
+    # Corte proporcional e ajuste fino, em vez de medir caractere a caractere
+    text = text[:int(len(text) * width / text_width)]
+    while text and pdf.get_string_width(text) > width:
+        text = text[:-1]
+    return text
+
+def _write_pdf(job_id: str, kind: str, target: Path) -> None:
+    from fpdf import FPDF
+
+    columns = EXPORT_COLUMNS[kind]
+    pdf = FPDF(orientation="L", format="A4")
+    pdf.set_auto_page_break(auto=True, margin=10)
+
+    def header_row():
+        pdf.set_font("Helvetica", "B", 8)
+        for header, width in columns:
+            pdf.cell(width, 6, _latin1(header), border=1)
+        pdf.ln()
+        pdf.set_font("Helvetica", "", 7)
+
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 10, _latin1(f"A Fadinha Bordados - {EXPORT_TITLES[kind]}"), new_x="LMARGIN", new_y="NEXT")
+    header_row()
+    
+    total = 0
+    for rows in iter_export_rows(kind, EXPORT_CHUNK_SIZE):
+        for row in rows:
+            if total >= EXPORT_PDF_MAX_ROWS:
+                break
+            if pdf.will_page_break(5):
+                pdf.add_page()
+                header_row()
+            for (_, width), value in zip(columns, row):
+                pdf.cell(width, 5, _fit(pdf, _latin1(value), width - 2), border=1)
+            pdf.ln()
+            total += 1
+        _update_job(job_id, rows=total)
+        if total >= EXPORT_PDF_MAX_ROWS:
+            pdf.set_font("Helvetica", "I", 8)
+            pdf.cell(0, 8, _latin1(f"Relatório limitado a {EXPORT_PDF_MAX_ROWS} linhas. Use a exportação CSV para a lista completa."))
+            break
+    pdf.output(str(target))
+
+def _run_export(job_id: str, kind: str, fmt: str) -> None:
+    target = EXPORT_FOLDER / f"{kind}_{job_id}.{fmt}"
+    _update_job(job_id, status="running")
+    try:
+        if fmt == "csv":
+            _write_csv(job_id, kind, target)
+        else:
+            _write_pdf(job_id, kind, target)
+        _update_job(job_id, status="done", path=str(target), finished=time.time())
+    except Exception as e:
+        print(f"Erro ao exportar {kind} ({fmt}): {e}")
+        target.unlink(missing_ok=True)
+        _update_job(job_id, status="error", error=str(e), finished=time.time())
+
+def start_export(kind: str, fmt: str) -> str:
+    """Agenda a exportação (`kind`: orders/products, `fmt`: csv/pdf) no worker e retorna o id do job."""
+    if kind not in EXPORT_COLUMNS or fmt not in ("csv", "pdf"):
+        raise ValueError(f"Exportação inválida: {kind}/{fmt}")
+    EXPORT_FOLDER.mkdir(exist_ok=True)
+    _cleanup_old_exports()
+    
+    job_id = uuid.uuid4().hex[:12]
+    with _jobs_lock:
+        _jobs[job_id] = {"kind": kind, "format": fmt, "status": "queued", "rows": 0,
+                         "path": None, "error": None, "started": time.time(), "finished": None}
+    _executor.submit(_run_export, job_id, kind, fmt)
+    return job_id
+
+def get_export_job(job_id: str) -> Optional[Dict]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return dict(job) if job else None
@@ -0,0 +1,85 @@
+# image_store.py
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from database import IMAGE_FOLDER, drop_unreferenced_image, expire_pending_reference_images, get_referenced_images
+from storage import get_storage, put_object_file, delete_object
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024   # Bytes lidos/gravados por vez (o upload nunca é materializado inteiro)
+ORPHAN_GRACE_SECONDS = 60 * 60    # Arquivos sem referência mais novos que isso podem ser de um upload em andamento
+PENDING_IMAGE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60  # Imagem aguardando um pedido que não chegou nesse prazo é descartada
+
+def content_path(digest: str, suffix: str) -> Path:
+    """Endereço do conteúdo: product_images/<2 primeiros hex>/<sha256><extensão>."""
+    return IMAGE_FOLDER / digest[:2] / f"{digest}{suffix.lower()}"
+
+def store_stream(stream: BinaryIO, suffix: str) -> str:
+    """
+    Grava o conteúdo em blocos num arquivo temporário enquanto calcula o SHA-256 e então
+    o entrega ao armazenamento (storage.py) no endereço do conteúdo: no disco local é um
+    rename atômico; no S3, um upload. Se o mesmo conteúdo já existir, o temporário é
+    descartado e o objeto existente é reaproveitado.
+    Retorna a chave (caminho no formato POSIX) a ser gravada no banco.
+    """
+    sha = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(dir=IMAGE_FOLDER, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                sha.update(chunk)
+                tmp.write(chunk)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        
+        key = content_path(sha.hexdigest(), suffix).as_posix()
+        if not get_storage().exists(key):
+            put_object_file(key, Path(tmp_name))
+        return key
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+def store_file(path: Path) -> str:
+    """Copia um arquivo existente para o armazenamento por conteúdo."""
+    with open(path, "rb") as f:
+        return store_stream(f, path.suffix)
+
+def release_image(image_path: Optional[str]) -> bool:
+    """Apaga a imagem do armazenamento se nenhum produto/pedido a referencia mais. Retorna True se apagou."""
+    if not image_path or not drop_unreferenced_image(image_path):
+        return False
+    try:
+        delete_object(image_path)
+        return True
+    except Exception as e:
+        print(f"Aviso: Não foi possível deletar o arquivo {image_path}: {e}")
+        return False
+
+def collect_orphan_images() -> int:
+    """
+    Remove imagens do armazenamento por conteúdo que não são referenciadas (ex.: cadastro que falhou).
+    Antes, descarta as imagens de referência que aguardam há mais de PENDING_IMAGE_MAX_AGE_SECONDS
+    um pedido que nunca foi gravado.
+    """
+    expire_pending_reference_images(PENDING_IMAGE_MAX_AGE_SECONDS)
+    referenced = get_referenced_images()
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    removed = 0
+    for key, _, modified in get_storage().list(f"{IMAGE_FOLDER.as_posix()}/"):
+        parts = key.split("/")
+        # Só o endereçamento por conteúdo (<pasta>/<2 hex>/<arquivo>); ignora uploads em andamento
+        if len(parts) != 3 or len(parts[1]) != 2 or key.endswith(".part"):
+            continue
+        if key in referenced or modified > cutoff:
+            continue
+        try:
+            delete_object(key)
+            removed += 1
+        except Exception as e:
+            print(f"Aviso: Não foi possível deletar o arquivo {key}: {e}")
+    return removed
@@ -0,0 +1,284 @@
+# ingest.py
+"""
+Processamento em segundo plano das imagens de referência enviadas com os pedidos.
+
+O envio do formulário só grava o arquivo recebido na pasta de espera (INGEST_SPOOL_FOLDER, nome =
+código de confirmação do pedido + marca do processo que o reservou) e retorna. Um pool de processos valida a imagem, corrige a
+orientação e descarta os metadados EXIF (localização GPS, modelo da câmera...), reduz para no
+máximo INGEST_MAX_SIDE px e recomprime (INGEST_FORMAT/INGEST_QUALITY). Uma thread grava o
+resultado no armazenamento de imagens e preenche orders.reference_image_path (ou, se o pedido ainda
+está na fila, deixa a imagem em pending_reference_images para a gravação do pedido associá-la).
+
+Arquivos deixados na pasta de espera por uma execução interrompida são reprocessados na partida. Cada
+processo só reprocessa o arquivo que conseguiu reservar (rename atômico para o seu nome), então vários
+processos do app na mesma pasta de trabalho não processam o mesmo upload.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+INGEST_SPOOL_FOLDER = Path(".ingest_spool")
+INGEST_WORKERS = int(os.environ.get("FADINHA_INGEST_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+INGEST_MAX_SIDE = int(os.environ.get("FADINHA_INGEST_MAX_SIDE", "2048"))  # Maior lado (px) guardado
+INGEST_FORMAT = os.environ.get("FADINHA_INGEST_FORMAT", "WEBP")           # WEBP ou JPEG
+INGEST_QUALITY = int(os.environ.get("FADINHA_INGEST_QUALITY", "82"))
+INGEST_MAX_PIXELS = 50_000_000         # Acima disso a imagem é recusada (proteção contra "bombas" de descompressão)
+INGEST_MAX_ATTEMPTS = 2               # Tentativas por imagem se um processo do pool morrer (ex.: falta de memória)
+INGEST_ALLOWED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "HEIF"}
+INGEST_CLAIM_TIMEOUT = int(os.environ.get("FADINHA_INGEST_CLAIM_TIMEOUT", "1800"))  # Reserva mais antiga que isso é de um processo que parou
+
+_OUTPUT_SUFFIX = {"WEBP": ".webp", "JPEG": ".jpg"}
+_CLAIM_TAG = f"c{os.getpid()}"  # Marca dos uploads reservados por este processo: <código>.c<pid><extensão>
+
+_pool = None        # Processos que fazem o trabalho de CPU (decodificar, redimensionar, comprimir)
+_finisher = None    # Uma thread grava o resultado no armazenamento e no banco
+_pool_lock = threading.Lock()
+_recovered = False
+_stats = {"submitted": 0, "done": 0, "failed": 0, "waiting_order": 0, "bytes_in": 0, "bytes_out": 0,
+          "total_ms": 0.0, "max_ms": 0.0, "first_submit": None, "last_done": None, "last_error": None}
+_stats_lock = threading.Lock()
+
+def heif_supported() -> bool:
+    """HEIC/HEIF (fotos de iPhone) só é aceito com o pacote opcional pillow-heif instalado."""
+    import importlib.util
+    return importlib.util.find_spec("pillow_heif") is not None
+
+def process_image(source: str, target_stem: str, max_side: int, fmt: str, quality: int) -> Dict:
+    """
+    Executado nos processos do pool: valida, corrige a orientação, remove o EXIF, reduz e recomprime.
+    Grava `target_stem` + extensão do formato e retorna tamanhos e duração. Levanta ValueError se o
+    arquivo não for uma imagem aceita.
+    """
+    from PIL import Image, ImageOps
+
+    start = time.perf_counter()
+    Image.MAX_IMAGE_PIXELS = INGEST_MAX_PIXELS
+    if heif_supported():
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+
+    try:
+        with Image.open(source) as probe:
+            probe.verify() # Detecta arquivos truncados/corrompidos sem decodificar a imagem inteira
+        image = Image.open(source)
+    except Exception as e:
+        raise ValueError(f"arquivo não é uma imagem válida: {e}") from e
+
+    with image:
+        if image.format not in INGEST_ALLOWED_FORMATS:
+            raise ValueError(f"formato não aceito: {image.format}")
+        # JPEG: decodifica já reduzido (1/2, 1/4, 1/8) quando a imagem é muito maior que o destino
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = "A" in image.getbands() or image.mode == "P"
+        if fmt == "JPEG" or not has_alpha:
+            if has_alpha:
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+                image = background
+            else:
+                image = image.convert("RGB")
+        else:
+            image = image.convert("RGBA")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        target = f"{target_stem}{_OUTPUT_SUFFIX[fmt]}"
+        # Salvo sem o parâmetro exif: nenhum metadado do arquivo original é copiado
+        options = {"optimize": True, "progressive": True} if fmt == "JPEG" else {"method": 4}
+        image.save(target, format=fmt, quality=quality, **options)
+        width, height = image.size
+
+    return {
+        "target": target,
+        "bytes_in": os.path.getsize(source),
+        "bytes_out": os.path.getsize(target),
+        "width": width,
+        "height": height,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
+
+def _executors(broken=None):
+    """Pool de processos e thread de finalização; `broken` é um pool que parou e deve ser substituído."""
+    global _pool, _finisher
+    if _pool is None or _pool is broken:
+        with _pool_lock:
+            if _pool is broken and broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+                _pool = None
+            if _pool is None:
+                # "spawn": não copia o processo do servidor (com suas threads e conexões) para os workers
+                _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=get_context("spawn"))
+                _finisher = _finisher or ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-finisher")
+    return _pool, _finisher
+
+def _record_failure(confirmation_id: str, error: str) -> None:
+    print(f"ERRO ao processar imagem de referência do pedido {confirmation_id}: {error}")
+    with _stats_lock:
+        _stats["failed"] += 1
+        _stats["last_error"] = error
+
+def _finish(confirmation_id: str, raw: Path, pool, future, attempt: int) -> None:
+    """Grava o resultado de um job no armazenamento e no pedido (thread ingest-finisher)."""
+    # Imports locais: os processos do pool só precisam do PIL
+    from database import set_order_reference_image
+    from image_store import store_file
+
+    try:
+        result = future.result()
+    except BrokenProcessPool as e:
+        if attempt < INGEST_MAX_ATTEMPTS:
+            # Um processo do pool morreu: recria o pool e tenta esta imagem de novo
+            _executors(broken=pool)
+            _submit(confirmation_id, raw, attempt + 1, count=False)
+            return
+        result = e
+    except Exception as e:
+        result = e
+
+    try:
+        if isinstance(result, Exception):
+            raise result
+        image_path = store_file(Path(result["target"]))
+        # Não espera pelo pedido: se ele ainda está na fila, a gravação do pedido associa a imagem
+        attached = set_order_reference_image(confirmation_id, image_path)
+        if attached is None:
+            raise RuntimeError("não foi possível registrar a imagem no banco")
+        with _stats_lock:
+            _stats["done"] += 1
+            _stats["bytes_in"] += result["bytes_in"]
+            _stats["bytes_out"] += result["bytes_out"]
+            _stats["total_ms"] += result["elapsed_ms"]
+            _stats["max_ms"] = max(_stats["max_ms"], result["elapsed_ms"])
+            _stats["last_done"] = time.time()
+            if not attached:
+                _stats["waiting_order"] += 1
+    except Exception as e:
+        _record_failure(confirmation_id, str(e))
+    finally:
+        raw.unlink(missing_ok=True)
+        for output in INGEST_SPOOL_FOLDER.glob(f"{confirmation_id}.out.*"):
+            output.unlink(missing_ok=True)
+
+def _spool_path(confirmation_id: str, suffix: str) -> Path:
+    """Nome na pasta de espera de um upload reservado por este processo."""
+    return INGEST_SPOOL_FOLDER / f"{confirmation_id}.{_CLAIM_TAG}{suffix}"
+
+def _parse_spool_name(path: Path) -> Tuple[str, bool, str]:
+    """(código de confirmação, reservado por algum processo?, extensão) de um upload na pasta de espera."""
+    confirmation_id, _, rest = path.name.partition(".")
+    tag, _, ext = rest.partition(".")
+    if tag[:1] == "c" and tag[1:].isdigit():
+        return confirmation_id, True, f".{ext}" if ext else ""
+    return confirmation_id, False, f".{rest}" if rest else "" # Nome sem reserva (versões anteriores)
+
+def _submit(confirmation_id: str, raw: Path, attempt: int = 1, count: bool = True) -> None:
+    pool, finisher = _executors()
+    try:
+        future = pool.submit(process_image, str(raw), str(INGEST_SPOOL_FOLDER / f"{confirmation_id}.out"),
+                             INGEST_MAX_SIDE, INGEST_FORMAT, INGEST_QUALITY)
+    except BrokenProcessPool:
+        pool, finisher = _executors(broken=pool)
+        future = pool.submit(process_image, str(raw), str(INGEST_SPOOL_FOLDER / f"{confirmation_id}.out"),
+                             INGEST_MAX_SIDE, INGEST_FORMAT, INGEST_QUALITY)
+    future.add_done_callback(lambda f: finisher.submit(_finish, confirmation_id, raw, pool, f, attempt))
+    if not count:
+        return
+    with _stats_lock:
+        _stats["submitted"] += 1
+        if _stats["first_submit"] is None:
+            _stats["first_submit"] = time.time()
+
+def submit_reference_image(confirmation_id: str, uploaded_file) -> bool:
+    """
+    Guarda o upload na pasta de espera e agenda o processamento; retorna sem esperar por ele.
+    `uploaded_file` é o UploadedFile do Streamlit (ou qualquer objeto com .name e .read()).
+    """
+    try:
+        INGEST_SPOOL_FOLDER.mkdir(exist_ok=True)
+        raw = _spool_path(confirmation_id, Path(uploaded_file.name).suffix.lower())
+        uploaded_file.seek(0)
+        with open(raw, "wb") as f:
+            for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+                f.write(chunk)
+        _submit(confirmation_id, raw)
+        return True
+    except Exception as e:
+        _record_failure(confirmation_id, str(e))
+        return False
+
+def start_ingest() -> None:
+    """Reagenda (uma vez por processo) os uploads que uma execução anterior não chegou a processar."""
+    global _recovered
+    if _recovered:
+        return
+    with _pool_lock:
+        if _recovered:
+            return
+        _recovered = True
+    if not INGEST_SPOOL_FOLDER.is_dir():
+        return
+    stale = time.time() - INGEST_CLAIM_TIMEOUT
+    for path in INGEST_SPOOL_FOLDER.iterdir():
+        try:
+            if not path.is_file():
+                continue
+            modified = path.stat().st_mtime
+        except OSError:
+            continue # Reservado ou concluído por outro processo neste meio tempo
+        if ".out" in path.suffixes:
+            if modified < stale:
+                path.unlink(missing_ok=True) # Resultado incompleto: a imagem original é processada de novo
+            continue
+        confirmation_id, claimed, suffix = _parse_spool_name(path)
+        if claimed and modified >= stale:
+            continue # Em processamento por outro processo do app
+        target = _spool_path(confirmation_id, suffix)
+        try:
+            path.rename(target) # Atômico: só um dos processos consegue reservar o arquivo
+            os.utime(target)
+        except OSError:
+            continue
+        _submit(confirmation_id, target)
+
+def get_ingest_stats() -> Dict:
+    """Jobs em andamento, vazão, tempo médio por imagem e bytes economizados."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pending"] = stats["submitted"] - stats["done"] - stats["failed"]
+    processed = stats["done"]
+    stats["avg_ms"] = stats["total_ms"] / processed if processed else 0.0
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    window = (stats["last_done"] or 0) - (stats["first_submit"] or 0)
+    stats["images_per_s"] = processed / window if processed and window > 0 else 0.0
+    stats["workers"] = INGEST_WORKERS
+    return stats
+
+def stop_ingest(wait: bool = True) -> None:
+    """
+    Encerra o pool de processos e a thread de finalização (o próximo envio os recria). Necessário
+    quando o app roda dentro de um processo do multiprocessing, que ao sair espera pelos processos
+    filhos sem encerrar o pool.
+    """
+    global _pool, _finisher
+    with _pool_lock:
+        pool, finisher = _pool, _finisher
+        _pool, _finisher = None, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+    if finisher is not None:
+        finisher.shutdown(wait=wait)
+
+def wait_for_ingest(timeout: Optional[float] = None) -> bool:
+    """Espera os jobs em andamento terminarem (benchmarks e desligamento). Retorna False se o tempo acabar."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while get_ingest_stats()["pending"] > 0:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
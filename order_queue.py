@@ -0,0 +1,284 @@
+# order_queue.py
+
+import atexit
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, List
+
+from database import add_orders_batch, discard_pending_reference_image, get_order_by_confirmation
+from image_store import release_image
+
+# Fila local e durável dos pedidos enviados pelo site. O envio só grava aqui (um INSERT em um
+# arquivo próprio, sem disputar o lock de escrita do banco principal); uma única thread
+# transfere os pedidos para a tabela orders em lotes, com um commit por lote (group commit).
+ORDER_QUEUE_DB = "fadinha_order_queue.db"
+ORDER_QUEUE_BATCH_SIZE = 200          # Máximo de pedidos gravados por transação no banco principal
+ORDER_QUEUE_GROUP_WINDOW_MS = 20      # Espera após o primeiro pedido para juntar outros no mesmo commit
+ORDER_QUEUE_RETRY_SECONDS = 1.0       # Pausa após uma falha antes de tentar o lote de novo
+ORDER_QUEUED_STATUS = "Na fila"       # Status exibido ao cliente enquanto o pedido aguarda a gravação
+ORDER_REJECTED_STATUS = "Não registrado"
+
+_conn = None                          # Conexão da fila (protegida por _conn_lock)
+_conn_lock = threading.Lock()
+_wakeup = threading.Condition()       # Avisa a thread de escrita e quem espera o esvaziamento da fila
+_pending_signal = False
+_stop = False
+_writer = None
+_writer_lock = threading.Lock()
+
+_stats = {
+    "enqueued": 0, "flushed": 0, "duplicates": 0, "out_of_stock": 0, "failed": 0, "batches": 0, "errors": 0,
+    "last_batch_size": 0, "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0,
+    "last_lag_ms": 0.0, "last_error": None,
+}
+_stats_lock = threading.Lock()
+
+def _queue_connection() -> sqlite3.Connection:
+    """Abre (uma vez) o banco da fila. synchronous=FULL: o pedido confirmado sobrevive a uma queda de energia."""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(ORDER_QUEUE_DB, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_orders (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                confirmation_id TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL
+            )
+        """)
+        # Pedidos recusados pelo banco principal ficam guardados aqui para análise, sem travar a fila
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS failed_orders (
+                confirmation_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        _conn = conn
+    return _conn
+
+def _update_stats(**increments) -> None:
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+def enqueue_order(user_email: str, product_name: str, quantity: int, details: str, reference_image_path: str = None, product_id: Optional[int] = None) -> Optional[str]:
+    """
+    Registra o pedido na fila durável e retorna o código de confirmação (ou None em caso de erro).
+    O pedido aparece na tabela orders assim que a thread de escrita grava o próximo lote; com
+    `product_id`, o estoque é reservado nessa gravação (sem estoque, o pedido fica 'Cancelado').
+    """
+    if not user_email or not product_name or int(quantity) < 1:
+        print("ERRO ao enfileirar pedido: cliente, produto e quantidade são obrigatórios.")
+        return None
+
+    confirmation_id = secrets.token_hex(8).upper()
+    payload = {
+        "user_email": user_email,
+        "product_name": product_name,
+        "quantity": int(quantity),
+        "details": details,
+        "reference_image_path": reference_image_path,
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "confirmation_id": confirmation_id,
+        "product_id": product_id,
+    }
+    try:
+        with _conn_lock:
+            conn = _queue_connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO pending_orders (confirmation_id, payload, enqueued_at) VALUES (?, ?, ?)",
+                    (confirmation_id, json.dumps(payload), time.time())
+                )
+    except sqlite3.Error as e:
+        print(f"ERRO SQL ao enfileirar pedido: {e}")
+        return None
+
+    _update_stats(enqueued=1)
+    start_order_writer()
+    _notify()
+    return confirmation_id
+
+def _notify() -> None:
+    global _pending_signal
+    with _wakeup:
+        _pending_signal = True
+        _wakeup.notify_all()
+
+def _next_batch() -> List[sqlite3.Row]:
+    with _conn_lock:
+        return _queue_connection().execute(
+            "SELECT seq, confirmation_id, payload, enqueued_at FROM pending_orders ORDER BY seq LIMIT ?",
+            (ORDER_QUEUE_BATCH_SIZE,)
+        ).fetchall()
+
+def _remove_batch(last_seq: int) -> None:
+    with _conn_lock:
+        conn = _queue_connection()
+        with conn:
+            conn.execute("DELETE FROM pending_orders WHERE seq <= ?", (last_seq,))
+
+def _flush_one_by_one(batch: List[sqlite3.Row]) -> None:
+    """Após um erro de integridade no lote, grava pedido a pedido e separa os recusados."""
+    for seq, confirmation_id, payload, _ in batch:
+        try:
+            inserted, out_of_stock = add_orders_batch([json.loads(payload)])
+            _update_stats(flushed=inserted, duplicates=1 - inserted, out_of_stock=out_of_stock)
+        except sqlite3.IntegrityError as e:
+            print(f"ERRO SQL: pedido {confirmation_id} recusado e movido para failed_orders: {e}")
+            with _conn_lock:
+                conn = _queue_connection()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO failed_orders (confirmation_id, payload, error, failed_at) VALUES (?, ?, ?, ?)",
+                        (confirmation_id, payload, str(e), time.time())
+                    )
+            # A imagem de referência que aguardava este pedido não será mais usada
+            release_image(discard_pending_reference_image(confirmation_id))
+            _update_stats(failed=1)
+        _remove_batch(seq)
+
+def _drain(retry: bool = True) -> None:
+    """
+    Transfere a fila para o banco principal, um lote por transação, até esvaziá-la.
+    Com retry=False (desligamento) desiste no primeiro erro: o que sobrar fica no arquivo da fila.
+    """
+    while True:
+        batch = _next_batch()
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            inserted, out_of_stock = add_orders_batch([json.loads(row[2]) for row in batch])
+        except sqlite3.IntegrityError:
+            _flush_one_by_one(batch)
+            continue
+        except sqlite3.Error as e:
+            # Banco ocupado/indisponível: os pedidos continuam na fila e o lote é tentado de novo
+            print(f"ERRO SQL ao gravar lote de pedidos da fila: {e}")
+            with _stats_lock:
+                _stats["errors"] += 1
+                _stats["last_error"] = str(e)
+            if not retry or _stop:
+                return
+            time.sleep(ORDER_QUEUE_RETRY_SECONDS)
+            continue
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Se o processo cair aqui, o lote é regravado na próxima vez e o índice único de confirmation_id descarta as repetições
+        _remove_batch(batch[-1][0])
+        with _stats_lock:
+            _stats["batches"] += 1
+            _stats["flushed"] += inserted
+            _stats["duplicates"] += len(batch) - inserted
+            _stats["out_of_stock"] += out_of_stock
+            _stats["last_batch_size"] = len(batch)
+            _stats["last_flush_ms"] = elapsed_ms
+            _stats["max_flush_ms"] = max(_stats["max_flush_ms"], elapsed_ms)
+            _stats["total_flush_ms"] += elapsed_ms
+            _stats["last_lag_ms"] = (time.time() - batch[0][3]) * 1000
+
+def _writer_loop() -> None:
+    global _pending_signal
+    while True:
+        with _wakeup:
+            # Acorda também periodicamente, para retomar pedidos deixados por uma execução anterior
+            _wakeup.wait_for(lambda: _pending_signal or _stop, timeout=5.0)
+            _pending_signal = False
+            stopping = _stop
+        if not stopping:
+            time.sleep(ORDER_QUEUE_GROUP_WINDOW_MS / 1000)
+        try:
+            _drain(retry=not stopping)
+        except Exception as e:
+            print(f"ERRO na thread de gravação de pedidos: {e}")
+            time.sleep(ORDER_QUEUE_RETRY_SECONDS)
+        with _wakeup:
+            _wakeup.notify_all()
+        if stopping:
+            break
+
+def start_order_writer() -> None:
+    """Inicia a thread de escrita (uma por processo). Pedidos pendentes de uma execução anterior são gravados em seguida."""
+    global _writer, _stop
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _stop = False
+            _writer = threading.Thread(target=_writer_loop, name="order-writer", daemon=True)
+            _writer.start()
+    _notify()
+
+def stop_order_writer(timeout: float = 10.0) -> None:
+    """Encerra a thread de escrita depois de gravar o que estiver na fila (chamado no desligamento)."""
+    global _stop
+    if _writer is None or not _writer.is_alive():
+        return
+    with _wakeup:
+        _stop = True
+        _wakeup.notify_all()
+    _writer.join(timeout)
+
+atexit.register(stop_order_writer)
+
+def pending_order_count() -> int:
+    with _conn_lock:
+        return _queue_connection().execute("SELECT COUNT(*) FROM pending_orders").fetchone()[0]
+
+def flush_order_queue(timeout: float = 10.0) -> bool:
+    """Pede a gravação imediata e espera a fila esvaziar. Retorna False se o tempo acabar."""
+    start_order_writer()
+    deadline = time.monotonic() + timeout
+    while pending_order_count() > 0:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        _notify()
+        with _wakeup:
+            _wakeup.wait(min(remaining, 0.5))
+    return True
+
+def get_order_status(confirmation_id: str, user_email: str) -> Optional[str]:
+    """
+    Status de um pedido do cliente `user_email` pelo código de confirmação: ORDER_QUEUED_STATUS enquanto
+    aguarda a gravação, ORDER_REJECTED_STATUS se o banco o recusou, ou o status gravado em orders
+    ('Cancelado' se faltou estoque na reserva). None se o código não existe ou é de outro cliente.
+    """
+    # A fila é consultada antes do banco: o pedido só sai da fila depois de gravado em orders
+    with _conn_lock:
+        conn = _queue_connection()
+        queued = conn.execute("SELECT payload FROM pending_orders WHERE confirmation_id = ?", (confirmation_id,)).fetchone()
+        failed = conn.execute("SELECT payload FROM failed_orders WHERE confirmation_id = ?", (confirmation_id,)).fetchone()
+    for row, status in ((queued, ORDER_QUEUED_STATUS), (failed, ORDER_REJECTED_STATUS)):
+        if row is not None:
+            return status if json.loads(row[0])["user_email"] == user_email else None
+    order = get_order_by_confirmation(confirmation_id)
+    if order is None or order["user_email"] != user_email:
+        return None
+    return order["status"] or "Pendente"
+
+def get_order_queue_stats() -> Dict:
+    """Profundidade da fila, idade do pedido mais antigo e tempos dos commits em lote."""
+    with _conn_lock:
+        conn = _queue_connection()
+        pending, oldest = conn.execute("SELECT COUNT(*), MIN(enqueued_at) FROM pending_orders").fetchone()
+        failed = conn.execute("SELECT COUNT(*) FROM failed_orders").fetchone()[0]
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pending"] = pending
+    stats["oldest_pending_s"] = time.time() - oldest if oldest else 0.0
+    stats["failed_stored"] = failed
+    stats["avg_batch_size"] = (stats["flushed"] + stats["duplicates"]) / stats["batches"] if stats["batches"] else 0.0
+    stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["batches"] if stats["batches"] else 0.0
+    stats["writer_alive"] = _writer is not None and _writer.is_alive()
+    return stats
@@ -0,0 +1,54 @@
+# page_timings.py
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("fadinha.startup")
+
+# Importado pelo app.py antes das demais dependências: aproxima o início do processo
+PROCESS_STARTED = time.perf_counter()
+
+_lock = threading.Lock()
+_startup = {"imports_ms": None, "first_run_ms": None, "runs": 0}
+_pages: Dict[str, Dict] = {}
+
+def record_imports(elapsed_ms: float) -> None:
+    """Tempo de importação do app.py (streamlit + módulos usados em toda execução), só na primeira vez."""
+    with _lock:
+        if _startup["imports_ms"] is None:
+            _startup["imports_ms"] = elapsed_ms
+            logger.info("Importações iniciais do app: %.1f ms", elapsed_ms)
+
+def record_run(elapsed_ms: float) -> None:
+    """Duração de uma execução completa do script; a primeira do processo é a partida a frio."""
+    with _lock:
+        _startup["runs"] += 1
+        if _startup["first_run_ms"] is None:
+            _startup["first_run_ms"] = elapsed_ms
+            logger.info("Primeira execução do app: %.1f ms (%.1f ms desde o início do processo)",
+                        elapsed_ms, (time.perf_counter() - PROCESS_STARTED) * 1000)
+
+def record_page(page: str, render_ms: float, import_ms: Optional[float] = None) -> None:
+    """Tempo de renderização de uma página; `import_ms` é informado quando o módulo foi importado agora."""
+    with _lock:
+        stats = _pages.setdefault(page, {"page": page, "import_ms": None, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += render_ms
+        stats["max_ms"] = max(stats["max_ms"], render_ms)
+        stats["last_ms"] = render_ms
+        if import_ms is not None:
+            stats["import_ms"] = import_ms
+    if import_ms is not None:
+        logger.info("Página '%s' carregada sob demanda: importação %.1f ms, renderização %.1f ms", page, import_ms, render_ms)
+
+def get_startup_timings() -> Dict:
+    with _lock:
+        return dict(_startup)
+
+def get_page_timings() -> list:
+    """Estatísticas por página, da mais lenta (média) para a mais rápida."""
+    with _lock:
+        rows = [dict(s, avg_ms=s["total_ms"] / s["count"]) for s in _pages.values()]
+    return sorted(rows, key=lambda r: r["avg_ms"], reverse=True)
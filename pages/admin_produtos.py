@@ -2,22 +2,118 @@
 
 import streamlit as st
 import pandas as pd
-from database import add_product, get_all_products, get_product, update_product, delete_product
-from utils import save_uploaded_file, IMAGE_FOLDER
-from pathlib import Path
-
-def display_product_table(products_data):
-    """Exibe a lista de produtos em um DataFrame."""
-    if products_data:
-        df_products = pd.DataFrame(products_data)
-        df_products = df_products.rename(columns={'name': 'Produto', 'description': 'Descrição', 'price': 'Preço (R$)', 'stock': 'Estoque', 'image_path': 'Caminho Imagem', 'id': 'ID'})
-        
-        df_products['Preço (R$)'] = df_products['Preço (R$)'].apply(lambda x: f"R$ {x:.2f}".replace('.', ','))
-        
-        cols_to_display = ['ID', 'Produto', 'Preço (R$)', 'Estoque', 'Caminho Imagem']
-        st.dataframe(df_products[cols_to_display], use_container_width=True, hide_index=True)
-    else:
+import unicodedata
+from database import add_product, get_product, update_product, delete_product, upsert_products, get_products_frame, ADMIN_TABLE_PAGE_SIZE
+from utils import save_uploaded_file, catalog_picker, export_panel, format_brl, table_pager
+from thumbnails import get_thumbnail
+from image_store import release_image
+
+# Opções de ordenação da listagem -> coluna do snapshot
+PRODUCT_SORT_OPTIONS = {"Nome": "name", "Preço": "price", "Estoque": "stock", "ID": "id"}
+
+def display_product_table():
+    """
+    Exibe o catálogo a partir do snapshot colunar: filtro, ordenação e paginação feitos no
+    servidor (vetorizados); só a página visível é formatada e enviada ao st.dataframe.
+    """
+    products = get_products_frame()
+    if products.empty:
         st.info("Nenhum produto cadastrado ainda.")
+        return
+
+    col_search, col_sort, col_order = st.columns([3, 2, 1])
+    with col_search:
+        search = st.text_input("🔎 Filtrar por nome", key="list_prod_search")
+    with col_sort:
+        sort_label = st.selectbox("Ordenar por", list(PRODUCT_SORT_OPTIONS), key="list_prod_sort")
+    with col_order:
+        descending = st.toggle("Decrescente", key="list_prod_desc")
+
+    view = products
+    if search:
+        view = view[view['name'].str.contains(search, case=False, regex=False)]
+    sort_column = PRODUCT_SORT_OPTIONS[sort_label]
+    view = view.sort_values(
+        sort_column, ascending=not descending, kind="stable",
+        key=(lambda names: names.str.lower()) if sort_column == 'name' else None
+    )
+
+    page = table_pager("list_prod", len(view), ADMIN_TABLE_PAGE_SIZE, filters=(search, sort_label, descending))
+    page_df = view.iloc[page * ADMIN_TABLE_PAGE_SIZE:(page + 1) * ADMIN_TABLE_PAGE_SIZE]
+    if page_df.empty:
+        st.info("Nenhum produto encontrado com esse filtro.")
+        return
+
+    df_products = pd.DataFrame({
+        'ID': page_df['id'],
+        'Produto': page_df['name'],
+        'Preço (R$)': format_brl(page_df['price']),
+        'Estoque': page_df['stock'],
+        'Caminho Imagem': page_df['image_path'],
+    })
+    st.dataframe(df_products, use_container_width=True, hide_index=True)
+
+# Cabeçalhos aceitos na planilha de importação (sem acento, minúsculos) -> coluna do banco
+IMPORT_COLUMNS = {
+    'id': 'id',
+    'nome': 'name', 'name': 'name', 'produto': 'name',
+    'descricao': 'description', 'description': 'description',
+    'preco': 'price', 'price': 'price', 'preco (r$)': 'price',
+    'estoque': 'stock', 'stock': 'stock',
+}
+
+def _normalize_header(header):
+    text = unicodedata.normalize('NFKD', str(header)).encode('ascii', 'ignore').decode()
+    return text.strip().lower()
+
+def parse_product_sheet(uploaded_file):
+    """
+    Lê um CSV/XLSX de produtos e valida todas as linhas de forma vetorizada.
+    Retorna (linhas válidas prontas para upsert_products, [(linha, erro)]).
+    """
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        df = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        # sep=None detecta "," ou ";" (CSV exportado pelo Excel em pt-BR)
+        df = pd.read_csv(uploaded_file, sep=None, engine='python', dtype=str, encoding='utf-8-sig')
+    
+    df = df.rename(columns=lambda c: IMPORT_COLUMNS.get(_normalize_header(c), c))
+    missing = {'name', 'price'} - set(df.columns)
+    if missing:
+        return [], [(1, f"Colunas obrigatórias ausentes: {', '.join(sorted(missing))}")]
+    
+    for column in ('id', 'description', 'stock'):
+        if column not in df.columns:
+            df[column] = None
+    
+    # Número da linha na planilha (cabeçalho é a linha 1)
+    df['row'] = df.index + 2
+    df['name'] = df['name'].fillna('').str.strip()
+    df['description'] = df['description'].fillna('')
+    # Aceita "1.234,56" e "1234.56"
+    price_text = df['price'].fillna('').str.replace(r'[R$\s]', '', regex=True)
+    price_text = price_text.where(~price_text.str.contains(','), price_text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    df['price'] = pd.to_numeric(price_text, errors='coerce')
+    df['stock'] = pd.to_numeric(df['stock'].fillna('0'), errors='coerce')
+    id_informed = df['id'].fillna('').str.strip() != ''
+    df['id'] = pd.to_numeric(df['id'], errors='coerce')
+    
+    checks = [
+        (df['name'] == '', "Nome do produto vazio."),
+        (df['price'].isna() | (df['price'] <= 0), "Preço inválido (deve ser um número maior que zero)."),
+        (df['stock'].isna() | (df['stock'] < 0) | (df['stock'] % 1 != 0), "Estoque inválido (deve ser um inteiro maior ou igual a zero)."),
+        (id_informed & (df['id'].isna() | (df['id'] % 1 != 0)), "ID inválido (deve ser um número inteiro)."),
+    ]
+    errors = []
+    invalid = pd.Series(False, index=df.index)
+    for mask, message in checks:
+        errors.extend((int(row), message) for row in df.loc[mask, 'row'])
+        invalid |= mask
+    
+    valid = df.loc[~invalid, ['id', 'name', 'description', 'price', 'stock', 'row']]
+    valid = valid.astype({'stock': 'int64', 'id': 'Int64'}).astype(object)
+    valid['id'] = valid['id'].where(valid['id'].notna(), None)
+    return valid.to_dict('records'), sorted(errors)
 
 def pagina_admin_produtos():
     """Página dedicada ao Gerenciamento de Produtos (Acesso Restrito a Admin)."""
@@ -29,15 +125,13 @@ def pagina_admin_produtos():
     st.title("Gerenciamento de Produtos 📦")
     st.markdown("---")
     
-    products_data = get_all_products()
-    product_ids = [p['id'] for p in products_data]
-    
     # 1. Abas para as operações
-    tab_cadastrar, tab_modificar, tab_deletar, tab_listar = st.tabs([
+    tab_cadastrar, tab_modificar, tab_deletar, tab_listar, tab_importar = st.tabs([
         "➕ Cadastrar", 
         "✏️ Modificar", 
         "🗑️ Deletar", 
-        "📋 Listar Todos"
+        "📋 Listar Todos",
+        "📥 Importar"
     ])
 
     # --- TAB 1: Cadastrar Novo Produto ---
@@ -71,35 +165,45 @@ def pagina_admin_produtos():
                         st.success(f"Produto '{prod_name}' cadastrado com sucesso! Recarregando lista...")
                         st.rerun()
                     else:
+                        # O upload sem produto é removido depois por collect_orphan_images (backup.py)
                         st.error("❌ Erro ao cadastrar o produto no banco de dados. Verifique o terminal Streamlit.") 
 
     # --- TAB 2: Modificar Produto ---
     with tab_modificar:
         st.header("Modificar Produto Existente")
         
-        if not product_ids:
-            st.warning("Nenhum produto cadastrado para modificar.")
-        else:
-            product_to_edit_id = st.selectbox(
-                "Selecione o ID do Produto para Modificar:",
-                options=product_ids,
-                key="mod_prod_id"
-            )
-            
+        picked_product = catalog_picker("mod_prod", "Selecione o Produto para Modificar:", empty_message="Nenhum produto encontrado para modificar.")
+        
+        if picked_product:
+            product_to_edit_id = picked_product['id']
             selected_product = get_product(product_to_edit_id)
             
             if selected_product:
+                # Os campos e a versão lida são (re)carregados juntos do produto: o update só é gravado
+                # se o produto não mudou desde que os valores exibidos no formulário foram lidos
+                if st.session_state.get("mod_prod_loaded_id") != product_to_edit_id or "mod_prod_name" not in st.session_state:
+                    st.session_state.update({
+                        "mod_prod_loaded_id": product_to_edit_id,
+                        "mod_prod_version": selected_product['version'],
+                        "mod_prod_name": selected_product['name'],
+                        "mod_prod_description": selected_product['description'],
+                        "mod_prod_price": float(selected_product['price']),
+                        "mod_prod_stock": int(selected_product['stock']),
+                    })
+                if st.session_state.pop("mod_prod_conflict", False):
+                    st.error("⚠️ Este produto foi alterado por outra pessoa (ou teve estoque reservado por um pedido) enquanto você editava. Os valores atuais foram recarregados; revise e salve novamente.")
+
                 with st.form(f"form_modify_product_{product_to_edit_id}"):
                     
                     # Campos pré-preenchidos
-                    mod_name = st.text_input("Nome do Produto", value=selected_product['name'], key="mod_prod_name")
-                    mod_description = st.text_area("Descrição", value=selected_product['description'], key="mod_prod_description")
+                    mod_name = st.text_input("Nome do Produto", key="mod_prod_name")
+                    mod_description = st.text_area("Descrição", key="mod_prod_description")
                     
                     colA, colB, colC = st.columns(3)
                     with colA:
-                        mod_price = st.number_input("Preço (R$)", min_value=0.01, format="%.2f", value=selected_product['price'], key="mod_prod_price")
+                        mod_price = st.number_input("Preço (R$)", min_value=0.01, format="%.2f", key="mod_prod_price")
                     with colB:
-                        mod_stock = st.number_input("Estoque", min_value=0, step=1, value=selected_product['stock'], key="mod_prod_stock")
+                        mod_stock = st.number_input("Estoque", min_value=0, step=1, key="mod_prod_stock")
                     with colC:
                         mod_uploaded_file = st.file_uploader(
                             "Nova Imagem do Produto (Opcional)",
@@ -108,9 +212,10 @@ def pagina_admin_produtos():
                         )
                         st.caption(f"Imagem atual: {selected_product['image_path'] or 'Nenhuma'}")
                     
-                    # Exibe a imagem atual
-                    if selected_product['image_path'] and Path(selected_product['image_path']).exists():
-                         st.image(selected_product['image_path'], width=100, caption="Imagem Atual")
+                    # Exibe a imagem atual (miniatura em cache; None se a imagem não existe mais no armazenamento)
+                    current_thumbnail = get_thumbnail(selected_product['image_path'], 100)
+                    if current_thumbnail:
+                         st.image(current_thumbnail, width=100, caption="Imagem Atual")
 
                     modify_submitted = st.form_submit_button("Salvar Modificações")
 
@@ -122,11 +227,22 @@ def pagina_admin_produtos():
                             new_image_path = save_uploaded_file(mod_uploaded_file)
                         
                         # Executa o update. Passamos None para new_image_path se nenhuma nova imagem foi enviada.
-                        if update_product(product_to_edit_id, mod_name, mod_description, mod_price, mod_stock, new_image_path):
+                        if update_product(product_to_edit_id, mod_name, mod_description, mod_price, mod_stock, new_image_path, expected_version=st.session_state.mod_prod_version):
+                            if new_image_path:
+                                release_image(selected_product['image_path']) # Apaga a imagem antiga se ficou sem uso
+                            st.session_state.pop("mod_prod_loaded_id", None) # Recarrega a nova versão
                             st.success(f"Produto ID {product_to_edit_id} modificado com sucesso!")
                             st.rerun()
                         else:
-                            st.error("❌ Erro ao modificar produto. Verifique o terminal Streamlit.")
+                            # Alteração recusada: o upload novo fica sem referência e é removido por collect_orphan_images
+                            current = get_product(product_to_edit_id)
+                            if current and current['version'] != st.session_state.mod_prod_version:
+                                # Recarrega os valores e a versão do produto atual no próximo carregamento
+                                st.session_state.pop("mod_prod_loaded_id", None)
+                                st.session_state.mod_prod_conflict = True
+                                st.rerun()
+                            else:
+                                st.error("❌ Erro ao modificar produto. Verifique o terminal Streamlit.")
             else:
                 st.error("Produto não encontrado.")
 
@@ -134,30 +250,19 @@ def pagina_admin_produtos():
     with tab_deletar:
         st.header("Deletar Produto")
         
-        if not product_ids:
-            st.warning("Nenhum produto cadastrado para deletar.")
-        else:
-            product_to_delete_id = st.selectbox(
-                "Selecione o ID do Produto para Deletar:",
-                options=product_ids,
-                key="del_prod_id"
-            )
+        picked_product = catalog_picker("del_prod", "Selecione o Produto para Deletar:", empty_message="Nenhum produto encontrado para deletar.")
+        
+        if picked_product:
+            product_to_delete_id = picked_product['id']
             
             if st.button(f"🗑️ Confirmar Deleção do Produto ID {product_to_delete_id}", key="btn_delete_product"):
                 
                 prod_data = get_product(product_to_delete_id)
                 
-                # 1. Tenta deletar o arquivo de imagem (opcional)
-                if prod_data and prod_data['image_path']:
-                    img_path = Path(prod_data['image_path'])
-                    try:
-                        if img_path.exists():
-                            img_path.unlink() # Deleta o arquivo
-                    except Exception as e:
-                        print(f"Aviso: Não foi possível deletar o arquivo {img_path}: {e}")
-                
-                # 2. Deleta do banco
+                # 1. Deleta do banco e 2. apaga a imagem se nenhum outro produto/pedido a usa
                 if delete_product(product_to_delete_id):
+                    if prod_data:
+                        release_image(prod_data['image_path'])
                     st.success(f"Produto ID {product_to_delete_id} deletado permanentemente.")
                     st.rerun()
                 else:
@@ -166,7 +271,34 @@ def pagina_admin_produtos():
     # --- TAB 4: Listar Todos ---
     with tab_listar:
         st.header("Produtos Cadastrados")
-        products_data = get_all_products()
-        display_product_table(products_data)
+        display_product_table()
+        
+        with st.expander("📤 Exportar catálogo"):
+            export_panel("products")
 
-pagina_admin_produtos()
+    # --- TAB 5: Importação em Lote ---
+    with tab_importar:
+        st.header("Importar Produtos (CSV/XLSX)")
+        st.caption("Colunas: nome, preco (obrigatórias), descricao, estoque e id (opcional — se informado, atualiza o produto existente).")
+        
+        sheet_file = st.file_uploader("Planilha de Produtos", type=["csv", "xlsx"], key="admin_prod_import_file")
+        
+        if sheet_file and st.button("Importar Planilha", key="btn_import_products"):
+            try:
+                rows, errors = parse_product_sheet(sheet_file)
+            except Exception as e:
+                st.error(f"Não foi possível ler a planilha: {e}")
+                rows, errors = [], []
+            
+            if rows:
+                progress_bar = st.progress(0.0, text="Importando...")
+                saved, db_errors = upsert_products(
+                    rows,
+                    progress=lambda done, total: progress_bar.progress(done / total, text=f"Importando... {done}/{total}")
+                )
+                errors = sorted(errors + db_errors)
+                st.success(f"{saved} produto(s) importado(s) com sucesso.")
+            
+            if errors:
+                st.warning(f"{len(errors)} linha(s) com erro não foram importadas:")
+                st.dataframe(pd.DataFrame(errors, columns=['Linha', 'Erro']), use_container_width=True, hide_index=True)
@@ -1,11 +1,12 @@
 # pages/administracao.py
 
 import streamlit as st
-import pandas as pd
 import re
-from database import get_all_users_list, add_user, get_all_users
+from database import add_user, count_users, query_users_frame, ADMIN_TABLE_PAGE_SIZE
+from utils import table_pager
 
 MIN_PASSWORD_LENGTH = 6
+USER_SORT_OPTIONS = {"role": "Permissão", "name": "Nome", "email": "Email"}
 
 def is_valid_email(email):
     """Verifica se o email possui um formato básico válido."""
@@ -26,10 +27,19 @@ def pagina_administracao():
     
     st.subheader("👥 Listagem de Usuários")
     
+    col_search, col_sort, col_order = st.columns([3, 2, 1])
+    with col_search:
+        search = st.text_input("🔎 Filtrar por nome ou email", key="list_users_search").strip()
+    with col_sort:
+        sort_by = st.selectbox("Ordenar por", list(USER_SORT_OPTIONS), format_func=USER_SORT_OPTIONS.get, key="list_users_sort")
+    with col_order:
+        descending = st.toggle("Decrescente", key="list_users_desc")
+
+    # Filtro, ordenação e paginação no SQLite: só a página visível é lida e enviada ao navegador
     try:
-        users_data = get_all_users_list()
-        df = pd.DataFrame(users_data)
-        df['role'] = df['role'].apply(lambda x: '⭐ ADMIN' if x == 'admin' else 'CLIENTE')
+        total = count_users(search)
+        page = table_pager("list_users", total, ADMIN_TABLE_PAGE_SIZE, filters=(search, sort_by, descending))
+        df = query_users_frame(search, sort_by, descending, offset=page * ADMIN_TABLE_PAGE_SIZE)
         st.dataframe(df, use_container_width=True, hide_index=True)
     except Exception as e:
         st.error(f"Não foi possível carregar a lista de usuários: {e}")
@@ -76,9 +86,6 @@ def pagina_administracao():
             
             if add_user(user_data):
                 st.success(f"Usuário '{new_user_name}' criado com sucesso como **{new_user_role.upper()}**!")
-                st.session_state.users = get_all_users()
                 st.rerun() 
             else:
                 st.error(f"Erro: O email '{new_user_email}' já está cadastrado ou houve um erro no DB.")
-
-pagina_administracao()
@@ -2,7 +2,8 @@
 
 import streamlit as st
 import re 
-from database import add_user, get_all_users 
+from database import add_user, get_user, authenticate_user
+from session_store import create_session
 
 MIN_PASSWORD_LENGTH = 6
 
@@ -14,9 +15,6 @@ def pagina_login_cadastro():
     """Gerencia o login e cadastro de usuários na sidebar em duas abas."""
     st.sidebar.header("🚪 Login / Cadastro")
     
-    if 'users' not in st.session_state:
-        st.session_state.users = get_all_users() 
-    
     tab1, tab2 = st.sidebar.tabs(["Login", "Novo Cadastro"])
 
     # --- Tab 1: Login ---
@@ -29,10 +27,14 @@ def pagina_login_cadastro():
             if not login_email or not login_password:
                 st.sidebar.error("Preencha email e senha para entrar.")
             
-            elif login_email in st.session_state.users:
-                user = st.session_state.users[login_email]
+            else:
+                # Busca pontual pela chave primária (email) + verificação do hash da senha
+                user = authenticate_user(login_email, login_password)
                 
-                if user['password'] == login_password:
+                if user:
+                    st.session_state.session_token = create_session(user)
+                    # Gravado num cookie no próximo rerun: ao recarregar a aba, a sessão é restaurada sem novo login
+                    st.session_state.pending_session_cookie = st.session_state.session_token
                     st.session_state.logged_in = True
                     st.session_state.username = user['name']
                     st.session_state.user_email = login_email
@@ -41,8 +43,6 @@ def pagina_login_cadastro():
                     st.rerun()
                 else:
                     st.sidebar.error("Email ou senha incorretos.")
-            else:
-                st.sidebar.error("Email ou senha incorretos.")
 
     # --- Tab 2: Novo Cadastro (PÚBLICO) ---
     with tab2:
@@ -77,7 +77,7 @@ def pagina_login_cadastro():
                 st.error(f"A senha deve ter no mínimo {MIN_PASSWORD_LENGTH} caracteres.")
                 return
 
-            if new_email in st.session_state.users:
+            if get_user(new_email):
                 st.error("Este email já está cadastrado. Tente fazer login.")
                 return
 
@@ -87,7 +87,6 @@ def pagina_login_cadastro():
             }
             
             if add_user(user_data):
-                st.session_state.users = get_all_users() 
                 st.success(f"Cadastro realizado com sucesso como **{new_role.upper()}**! Faça o login na aba ao lado.")
             else:
                 st.error("❌ Erro interno ao salvar no banco de dados. Verifique o terminal Streamlit.")
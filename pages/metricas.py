@@ -0,0 +1,136 @@
+# pages/metricas.py
+
+import streamlit as st
+import pandas as pd
+from database import get_catalog_cache_stats
+from order_queue import get_order_queue_stats
+from ingest import get_ingest_stats
+from query_stats import top_statements, recent_queries, traced_statement_counts, reset_stats, SLOW_QUERY_MS
+from page_timings import get_startup_timings, get_page_timings
+from assets import get_asset_stats
+from storage import get_storage_stats
+from backup import list_backups, get_backup_stats, start_backup_now, BACKUP_FOLDER, BACKUP_INTERVAL_HOURS
+
+def _statements_table(rows):
+    """Exibe instruções agregadas em um DataFrame."""
+    if not rows:
+        st.info("Nenhuma consulta registrada ainda.")
+        return
+    df = pd.DataFrame(rows)
+    df = df.rename(columns={'sql': 'SQL', 'caller': 'Função', 'count': 'Execuções', 'total_ms': 'Total (ms)', 'avg_ms': 'Média (ms)', 'max_ms': 'Máx. (ms)', 'rows': 'Linhas'})
+    cols_to_display = ['Função', 'Execuções', 'Total (ms)', 'Média (ms)', 'Máx. (ms)', 'Linhas', 'SQL']
+    st.dataframe(df[cols_to_display].round(3), use_container_width=True, hide_index=True)
+
+def pagina_metricas():
+    """Métricas do Banco de Dados (Acesso Restrito a Admin): consultas mais custosas e lentas."""
+
+    if not st.session_state.get('logged_in') or not st.session_state.get('is_admin'):
+        st.error("Acesso negado. Esta página é restrita a Administradores.")
+        return
+
+    st.title("Métricas do Banco de Dados 📈")
+    st.caption("Dados deste processo do servidor desde o início (ou desde o último reset).")
+    st.markdown("---")
+
+    # 1. Cache do catálogo e instruções vistas pelo trace do SQLite
+    cache = get_catalog_cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cache do catálogo: acertos", cache['hits'])
+    col2.metric("Cache do catálogo: faltas", cache['misses'])
+    col3.metric("Invalidações", cache['invalidations'])
+    col4.metric("Produtos em cache", cache['cached_products'])
+
+    traced = traced_statement_counts()
+    if traced:
+        st.caption("Instruções executadas pelo SQLite (trace): " + " · ".join(f"{k}: {v}" for k, v in sorted(traced.items(), key=lambda kv: -kv[1])))
+
+    # 2. Fila de pedidos (gravação em lote)
+    queue = get_order_queue_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pedidos na fila", queue['pending'], help=f"Mais antigo aguardando há {queue['oldest_pending_s']:.1f} s")
+    col2.metric("Último commit em lote (ms)", f"{queue['last_flush_ms']:.1f}", help=f"Média {queue['avg_flush_ms']:.1f} ms · máx. {queue['max_flush_ms']:.1f} ms")
+    col3.metric("Pedidos por lote (média)", f"{queue['avg_batch_size']:.1f}", help=f"{queue['batches']} lotes gravados")
+    col4.metric("Espera até gravar (ms)", f"{queue['last_lag_ms']:.0f}", help="Do envio do pedido até o commit do seu lote (último lote)")
+    if not queue['writer_alive']:
+        st.warning("A thread de gravação da fila de pedidos não está em execução.")
+    if queue['out_of_stock']:
+        st.caption(f"Pedidos cancelados na gravação por falta de estoque: {queue['out_of_stock']}")
+    if queue['errors'] or queue['failed_stored']:
+        st.caption(f"Falhas ao gravar lotes: {queue['errors']} (última: {queue['last_error']}) · Pedidos recusados guardados em failed_orders: {queue['failed_stored']}")
+
+    # Imagens de referência processadas em segundo plano
+    ingest = get_ingest_stats()
+    if ingest['submitted']:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Imagens em processamento", ingest['pending'], help=f"{ingest['workers']} processo(s) no pool")
+        col2.metric("Imagens processadas", ingest['done'], help=f"{ingest['images_per_s']:.1f} imagens/s desde o primeiro envio")
+        col3.metric("Tempo por imagem (ms)", f"{ingest['avg_ms']:.0f}", help=f"Máx. {ingest['max_ms']:.0f} ms")
+        col4.metric("Espaço economizado (MB)", f"{ingest['bytes_saved'] / 1e6:.1f}", help=f"{ingest['bytes_in'] / 1e6:.1f} MB recebidos -> {ingest['bytes_out'] / 1e6:.1f} MB guardados")
+        if ingest['failed'] or ingest['waiting_order']:
+            st.caption(f"Imagens recusadas/com erro: {ingest['failed']} (última: {ingest['last_error']}) · prontas antes da gravação do pedido: {ingest['waiting_order']}")
+
+    # 3. Instruções agregadas
+    tab_tempo, tab_contagem, tab_lentas = st.tabs(["⏱️ Por tempo total", "🔢 Por execuções", f"🐢 Lentas (≥ {SLOW_QUERY_MS:.0f} ms)"])
+    with tab_tempo:
+        _statements_table(top_statements("total_ms"))
+    with tab_contagem:
+        _statements_table(top_statements("count"))
+    with tab_lentas:
+        slow = recent_queries(min_ms=SLOW_QUERY_MS)
+        if slow:
+            df = pd.DataFrame(slow)
+            df['at'] = pd.to_datetime(df['at'], unit='s')
+            df = df.rename(columns={'at': 'Quando (UTC)', 'caller': 'Função', 'ms': 'Duração (ms)', 'rows': 'Linhas', 'sql': 'SQL'})
+            st.dataframe(df[['Quando (UTC)', 'Função', 'Duração (ms)', 'Linhas', 'SQL']].round(3), use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhuma consulta lenta nas execuções recentes.")
+
+    # 4. Partida do app e tempo de cada página
+    st.markdown("---")
+    st.subheader("⏱️ Partida e Navegação")
+    startup = get_startup_timings()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Importações do app (ms)", f"{startup['imports_ms'] or 0:.0f}")
+    col2.metric("Primeira execução (ms)", f"{startup['first_run_ms'] or 0:.0f}")
+    col3.metric("Execuções desde a partida", startup['runs'])
+    assets = get_asset_stats()
+    st.caption(f"Arquivos estáticos (CSS/logo) em memória: {assets['cached']} · carregados {assets['loads']}x · servidos da memória {assets['hits']}x")
+    storage = get_storage_stats()
+    st.caption(f"Imagens (armazenamento {storage['backend']}): {storage['cached']} em memória ({storage['bytes'] / 1e6:.1f} MB) · servidas da memória {storage['hits']}x · lidas do armazenamento {storage['misses']}x")
+    page_rows = get_page_timings()
+    if page_rows:
+        df = pd.DataFrame(page_rows)
+        df = df.rename(columns={'page': 'Página', 'import_ms': 'Importação (ms)', 'count': 'Renderizações', 'avg_ms': 'Média (ms)', 'max_ms': 'Máx. (ms)', 'last_ms': 'Última (ms)'})
+        cols_to_display = ['Página', 'Importação (ms)', 'Renderizações', 'Média (ms)', 'Máx. (ms)', 'Última (ms)']
+        st.dataframe(df[cols_to_display].round(1), use_container_width=True, hide_index=True)
+
+    # 5. Backups do banco e das imagens
+    st.markdown("---")
+    st.subheader("💾 Backups")
+    backup_stats = get_backup_stats()
+    backups = list_backups() if BACKUP_FOLDER.exists() else []
+    schedule = f"a cada {BACKUP_INTERVAL_HOURS:g} h" if backup_stats['scheduled'] else "desligado"
+    st.caption(f"Pasta: {BACKUP_FOLDER} · backup automático: {schedule} · erros: {backup_stats['errors']} · "
+               f"imagens sem referência removidas: {backup_stats['orphans_removed']}")
+    if backup_stats['last_error']:
+        st.caption(f"Último erro: {backup_stats['last_error']}")
+    if backups:
+        df = pd.DataFrame(backups)
+        df['Imagens'] = df['images'].map(len)
+        df['Banco (MB)'] = df['db_bytes'] / 1e6
+        df['Arquivo (MB)'] = df['archive_bytes'] / 1e6
+        df['Duração (s)'] = df['elapsed_ms'] / 1000
+        df = df.rename(columns={'name': 'Backup', 'created_at': 'Criado em (UTC)', 'new_images': 'Imagens novas'})
+        cols_to_display = ['Backup', 'Criado em (UTC)', 'Banco (MB)', 'Arquivo (MB)', 'Imagens', 'Imagens novas', 'Duração (s)']
+        st.dataframe(df[cols_to_display].round(2), use_container_width=True, hide_index=True)
+    else:
+        st.info("Nenhum backup gerado ainda.")
+    if backup_stats['running']:
+        st.info("Backup em andamento...")
+    elif st.button("💾 Gerar backup agora", key="btn_backup_now"):
+        start_backup_now()
+        st.rerun()
+
+    if st.button("♻️ Zerar métricas", key="btn_reset_query_stats"):
+        reset_stats()
+        st.rerun()
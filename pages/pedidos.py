@@ -0,0 +1,103 @@
+# pages/pedidos.py
+
+import streamlit as st
+import pandas as pd
+from utils import export_panel, format_brl
+from order_queue import pending_order_count
+from database import list_orders, count_orders_by_status, update_order_status, ORDER_STATUS_TRANSITIONS, ORDERS_PAGE_SIZE
+
+def pagina_pedidos():
+    """Fila de Pedidos (Acesso Restrito a Admin): filtros, paginação e mudança de status."""
+
+    if not st.session_state.get('logged_in') or not st.session_state.get('is_admin'):
+        st.error("Acesso negado. Esta página é restrita a Administradores.")
+        return
+
+    st.title("Fila de Pedidos 🧾")
+    st.markdown("---")
+
+    # 1. Resumo por status
+    counts = count_orders_by_status()
+    status_list = list(ORDER_STATUS_TRANSITIONS.keys())
+    for col, status in zip(st.columns(len(status_list)), status_list):
+        col.metric(status, counts.get(status, 0))
+    pending = pending_order_count()
+    if pending:
+        st.caption(f"⏳ {pending} pedido(s) recém-enviado(s) aguardando gravação na fila.")
+
+    with st.expander("📤 Exportar todos os pedidos"):
+        export_panel("orders")
+
+    # 2. Filtros
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        status_filter = st.selectbox("Status", ["Todos"] + status_list, key="orders_status_filter")
+    with col2:
+        customer_filter = st.text_input("Email do Cliente", key="orders_customer_filter", help="Mostra o histórico de pedidos do cliente.")
+    with col3:
+        product_filter = st.number_input("ID do Produto", min_value=0, step=1, value=0, key="orders_product_filter", help="0 = todos os produtos.")
+    with col4:
+        date_range = st.date_input("Período (UTC)", value=(), key="orders_date_filter")
+
+    filters = {
+        "status": None if status_filter == "Todos" else status_filter,
+        "user_email": customer_filter.strip() or None,
+        "product_id": int(product_filter) or None,
+        "date_from": date_range[0].isoformat() if len(date_range) > 0 else None,
+        "date_to": date_range[-1].isoformat() if len(date_range) > 0 else None,
+    }
+
+    # Pilha com o id de início de cada página visitada; reinicia quando os filtros mudam
+    if st.session_state.get("orders_pages", {}).get("filters") != filters:
+        st.session_state.orders_pages = {"filters": filters, "stack": [None]}
+    stack = st.session_state.orders_pages["stack"]
+
+    orders = list_orders(**filters, before_id=stack[-1], limit=ORDERS_PAGE_SIZE + 1)
+    has_next = len(orders) > ORDERS_PAGE_SIZE
+    orders = orders[:ORDERS_PAGE_SIZE]
+
+    # 3. Listagem
+    st.subheader("📋 Pedidos")
+    if not orders:
+        st.info("Nenhum pedido encontrado com esses filtros.")
+        return
+
+    df = pd.DataFrame(orders)
+    # Preço cobrado no pedido; pedidos antigos de produtos que não existem mais não têm preço registrado
+    df['Preço unit.'] = format_brl(df['unit_price'])
+    df = df.rename(columns={'id': 'ID', 'created_at': 'Criado em (UTC)', 'user_email': 'Cliente', 'product_id': 'ID Produto', 'product_name': 'Produto', 'quantity': 'Qtd.', 'status': 'Status', 'details': 'Detalhes', 'confirmation_id': 'Confirmação'})
+    cols_to_display = ['ID', 'Criado em (UTC)', 'Cliente', 'ID Produto', 'Produto', 'Qtd.', 'Preço unit.', 'Status', 'Detalhes', 'Confirmação']
+    st.dataframe(df[cols_to_display], use_container_width=True, hide_index=True)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("◀ Anterior", key="orders_prev", disabled=len(stack) == 1, on_click=stack.pop)
+    with col_page:
+        st.caption(f"Página {len(stack)}")
+    with col_next:
+        st.button("Próxima ▶", key="orders_next", disabled=not has_next, on_click=stack.append, args=(orders[-1]['id'],))
+
+    # 4. Mudança de status
+    st.markdown("---")
+    st.subheader("🔄 Atualizar Status")
+
+    orders_by_id = {o['id']: o for o in orders}
+    order_id = st.selectbox(
+        "Pedido:",
+        options=list(orders_by_id.keys()),
+        format_func=lambda oid: f"#{oid} · {orders_by_id[oid]['product_name']} ({orders_by_id[oid]['status']})",
+        key="orders_status_order"
+    )
+    next_statuses = ORDER_STATUS_TRANSITIONS.get(orders_by_id[order_id]['status'], [])
+
+    if not next_statuses:
+        st.caption("Este pedido já está em um status final.")
+        return
+
+    new_status = st.selectbox("Novo status:", next_statuses, key="orders_status_new")
+    if st.button("Salvar Status", key="btn_order_status"):
+        if update_order_status(order_id, new_status):
+            st.success(f"Pedido #{order_id} atualizado para **{new_status}**.")
+            st.rerun()
+        else:
+            st.error("❌ Não foi possível atualizar: o status do pedido mudou ou a transição não é permitida.")
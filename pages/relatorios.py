@@ -0,0 +1,89 @@
+# pages/relatorios.py
+
+import datetime
+import streamlit as st
+import pandas as pd
+from utils import format_brl
+from database import (get_sales_totals, get_daily_sales, get_product_sales, get_sales_by_status,
+                      get_top_customers, rebuild_sales_aggregates)
+
+REPORT_DEFAULT_DAYS = 30
+REPORT_TOP_LIMIT = 20
+
+def pagina_relatorios():
+    """Relatórios de Vendas (Acesso Restrito a Admin): lidos das tabelas de agregados, sem varrer os pedidos."""
+
+    if not st.session_state.get('logged_in') or not st.session_state.get('is_admin'):
+        st.error("Acesso negado. Esta página é restrita a Administradores.")
+        return
+
+    st.title("Relatórios de Vendas 📊")
+    st.markdown("---")
+
+    # 1. Filtros
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        date_range = st.date_input("Período (UTC)", value=(today - datetime.timedelta(days=REPORT_DEFAULT_DAYS - 1), today), key="report_date_filter")
+    with col2:
+        include_cancelled = st.checkbox("Incluir cancelados", key="report_include_cancelled")
+    date_from = date_range[0].isoformat() if len(date_range) > 0 else None
+    date_to = date_range[-1].isoformat() if len(date_range) > 0 else None
+
+    # 2. Totais e vendas por dia
+    totals = get_sales_totals(date_from, date_to, include_cancelled)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pedidos no período", totals['orders'])
+    col2.metric("Unidades no período", totals['units'])
+    col3.metric("Faturamento no período", format_brl(pd.Series([totals['revenue']]))[0])
+
+    daily = get_daily_sales(date_from, date_to, include_cancelled)
+    if daily:
+        df = pd.DataFrame(daily)
+        df['day'] = df['day'].replace('', 'sem data')
+        st.bar_chart(df.set_index('day')[['orders', 'units']].rename(columns={'orders': 'Pedidos', 'units': 'Unidades'}))
+    else:
+        st.info("Nenhum pedido no período.")
+
+    # 3. Produtos mais vendidos no período
+    st.subheader("🏆 Produtos Mais Vendidos")
+    products = get_product_sales(date_from, date_to, include_cancelled, limit=REPORT_TOP_LIMIT)
+    if products:
+        df = pd.DataFrame(products)
+        df['revenue'] = format_brl(df['revenue'])
+        df['product_id'] = df['product_id'].replace(0, None)
+        df = df.rename(columns={'product_id': 'ID', 'product_name': 'Produto', 'orders': 'Pedidos', 'units': 'Unidades', 'revenue': 'Faturamento'})
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.caption("Nenhum produto vendido no período.")
+
+    # 4. Histórico completo: status e clientes
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("📋 Por Status")
+        by_status = get_sales_by_status()
+        if by_status:
+            df = pd.DataFrame(by_status)
+            df['revenue'] = format_brl(df['revenue'])
+            df = df.rename(columns={'status': 'Status', 'orders': 'Pedidos', 'units': 'Unidades', 'revenue': 'Faturamento'})
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nenhum pedido registrado.")
+    with col2:
+        st.subheader("👥 Melhores Clientes")
+        customers = get_top_customers(include_cancelled, limit=REPORT_TOP_LIMIT)
+        if customers:
+            df = pd.DataFrame(customers)
+            df['revenue'] = format_brl(df['revenue'])
+            df = df.rename(columns={'user_email': 'Cliente', 'orders': 'Pedidos', 'units': 'Unidades', 'revenue': 'Faturamento'})
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nenhum pedido registrado.")
+    st.caption("Status e clientes consideram todo o histórico de pedidos. Faturamento = quantidade × preço unitário registrado no pedido.")
+
+    # 5. Manutenção
+    with st.expander("🔧 Recalcular agregados"):
+        st.caption("Os agregados são atualizados a cada pedido. Recalcule apenas após alterar a tabela de pedidos diretamente no banco (também disponível em `python database.py rebuild-sales`).")
+        if st.button("Recalcular a partir dos pedidos", key="btn_rebuild_sales"):
+            total = rebuild_sales_aggregates()
+            st.success(f"Agregados recalculados a partir de {total} pedidos.")
@@ -1,8 +1,43 @@
 # pages/servicos.py
 
 import streamlit as st
-from database import add_order, get_all_products
-from utils import save_uploaded_file
+from database import get_customer_orders
+from order_queue import enqueue_order, get_order_status, ORDER_QUEUED_STATUS, ORDER_REJECTED_STATUS
+from utils import catalog_picker
+from thumbnails import get_thumbnail
+from ingest import submit_reference_image, heif_supported
+
+# Fotos de celular (HEIC) só com o pacote opcional pillow-heif
+REFERENCE_IMAGE_TYPES = ["png", "jpg", "jpeg", "webp"] + (["heic", "heif"] if heif_supported() else [])
+MY_ORDERS_LIMIT = 10           # Pedidos do cliente listados em "Meus Pedidos"
+RECENT_CONFIRMATIONS = 5       # Códigos enviados nesta sessão cujo status é acompanhado
+
+def meus_pedidos():
+    """
+    Status dos pedidos do cliente. O envio só coloca o pedido na fila: a reserva do estoque acontece
+    na gravação, e um pedido sem estoque é gravado como 'Cancelado'; os códigos enviados nesta sessão
+    são consultados para avisar o cliente (também enquanto ainda estão na fila).
+    """
+    email = st.session_state.user_email
+    recent = st.session_state.get('my_order_confirmations', [])
+    with st.expander("📋 Meus Pedidos", expanded=bool(recent)):
+        for code in recent:
+            status = get_order_status(code, email)
+            if status == "Cancelado":
+                st.error(f"Pedido **{code}** cancelado: não havia estoque suficiente quando o pedido foi registrado. Fale conosco pelo WhatsApp.")
+            elif status == ORDER_REJECTED_STATUS:
+                st.error(f"Pedido **{code}** não pôde ser registrado. Fale conosco pelo WhatsApp informando o código.")
+            elif status == ORDER_QUEUED_STATUS:
+                st.info(f"Pedido **{code}**: aguardando registro e confirmação do estoque...")
+            elif status:
+                st.success(f"Pedido **{code}** registrado · status: **{status}**")
+
+        orders = get_customer_orders(email, limit=MY_ORDERS_LIMIT)
+        if not orders:
+            st.caption("Nenhum pedido registrado ainda.")
+        for order in orders:
+            st.markdown(f"- `{order['confirmation_id'] or order['id']}` · {order['product_name']} × {order['quantity']} · "
+                        f"**{order['status']}** · {order['created_at'] or ''}")
 
 def pagina_servicos():
     """Conteúdo da Página de Nossos Serviços/Pedidos."""
@@ -15,46 +50,47 @@ def pagina_servicos():
 
     st.header(f"Bem-vindo(a), {st.session_state.get('username')}!")
     st.write("Selecione o produto ou serviço desejado e anexe uma imagem de referência para personalização (opcional).")
+    meus_pedidos()
 
-    products = get_all_products()
+    # Busca paginada: só a página atual do catálogo é consultada a cada rerun
+    selected_product = catalog_picker(
+        "order_product",
+        "Produto/Serviço Desejado:",
+        empty_message="Nenhum produto/serviço disponível no momento. O administrador precisa cadastrar produtos."
+    )
     
-    if not products:
-        st.info("Nenhum produto/serviço disponível no momento. O administrador precisa cadastrar produtos.")
+    if not selected_product:
         return
 
-    product_options = {p['name']: p for p in products}
-    product_names = list(product_options.keys())
+    selected_product_name = selected_product['name']
+    if selected_product.get('image_path'):
+        try:
+            st.image(get_thumbnail(selected_product['image_path'], 200), caption=selected_product_name, width=200)
+        except Exception:
+            st.warning("Imagem do produto não encontrada no caminho especificado. O arquivo pode ter sido perdido na hospedagem online.")
+
+    # O estoque exibido pode estar desatualizado: a reserva definitiva é feita na gravação do pedido
+    if selected_product['stock'] <= 0:
+        st.warning("Produto esgotado no momento. Entre em contato pelo WhatsApp para encomendas.")
+        return
 
     with st.form("form_order_product"):
         
-        selected_product_name = st.selectbox(
-            "Produto/Serviço Desejado:",
-            product_names,
-            key="order_product_name"
-        )
-        
-        selected_product = product_options[selected_product_name]
-        if selected_product.get('image_path'):
-            try:
-                st.image(selected_product['image_path'], caption=selected_product_name, width=200)
-            except Exception:
-                st.warning("Imagem do produto não encontrada no caminho especificado. O arquivo pode ter sido perdido na hospedagem online.")
-
-
         col1, col2 = st.columns(2)
         with col1:
             order_quantity = st.number_input(
                 "Quantidade:",
                 min_value=1,
-                max_value=selected_product['stock'] if selected_product['stock'] > 0 else 100, 
+                max_value=selected_product['stock'], 
                 step=1,
                 key="order_quantity"
             )
+            st.caption(f"Disponível: {selected_product['stock']}")
             
         with col2:
             reference_file = st.file_uploader(
                 "Imagem de Referência/Personalização (Opcional)",
-                type=["png", "jpg", "jpeg"],
+                type=REFERENCE_IMAGE_TYPES,
                 key="order_reference_image"
             )
             
@@ -67,17 +103,21 @@ def pagina_servicos():
         order_submitted = st.form_submit_button("Finalizar Pedido")
 
         if order_submitted:
-            reference_image_path = save_uploaded_file(reference_file)
-            
-            if add_order(
+            # O pedido vai para a fila durável; a gravação na tabela de pedidos é feita em lote, em segundo plano
+            confirmation_id = enqueue_order(
                 user_email=st.session_state.user_email,
                 product_name=selected_product_name,
                 quantity=order_quantity,
                 details=order_details,
-                reference_image_path=reference_image_path
-            ):
-                st.success("🎉 Pedido de serviço enviado com sucesso! Entraremos em contato em breve.")
+                product_id=selected_product['id']
+            )
+            if confirmation_id:
+                st.session_state.my_order_confirmations = ([confirmation_id] + st.session_state.get('my_order_confirmations', []))[:RECENT_CONFIRMATIONS]
+                # A imagem é validada, reduzida e associada ao pedido em segundo plano (ingest.py)
+                if reference_file is not None and not submit_reference_image(confirmation_id, reference_file):
+                    st.warning("Não foi possível receber a imagem de referência. Envie-a pelo WhatsApp informando o código do pedido.")
+                # Ainda não é a confirmação do pedido: o estoque só é reservado quando ele sai da fila
+                st.success(f"📨 Pedido de serviço recebido! Código de confirmação: **{confirmation_id}**. "
+                           "A disponibilidade em estoque é confirmada no registro do pedido; acompanhe o status em **Meus Pedidos**, acima.")
             else:
                 st.error("❌ Erro ao registrar o pedido no banco de dados. Verifique o terminal Streamlit.")
-
-pagina_servicos()
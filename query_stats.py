@@ -0,0 +1,151 @@
+# query_stats.py
+
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque, Counter
+from typing import Dict, List
+
+SLOW_QUERY_MS = float(os.environ.get("FADINHA_SLOW_QUERY_MS", 100))  # Acima disso a consulta vai para o log
+RECENT_QUERIES_SIZE = 1000                                          # Tamanho do buffer circular
+
+logger = logging.getLogger("fadinha.sql")
+
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_QUERIES_SIZE)
+_aggregates: Dict[str, Dict] = {}
+# Contagem por tipo de instrução vista pelo trace do SQLite (inclui BEGIN/COMMIT implícitos e corpos de triggers)
+_traced = Counter()
+
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+
+def _normalize(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+def _caller() -> str:
+    """Primeira função fora deste módulo na pilha (ex.: database.get_user)."""
+    frame = sys._getframe(2)
+    while frame and os.path.normcase(os.path.abspath(frame.f_code.co_filename)) == _THIS_FILE:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}.{frame.f_code.co_name}"
+
+def _begin(sql: str) -> Dict:
+    """Registra uma nova execução da instrução (buffer circular + agregado)."""
+    entry = {"sql": _normalize(sql), "caller": _caller(), "at": time.time(), "ms": 0.0, "rows": 0, "logged": False}
+    with _lock:
+        agg = _aggregates.get(entry["sql"])
+        if agg is None:
+            agg = _aggregates[entry["sql"]] = {"sql": entry["sql"], "caller": entry["caller"], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+        agg["count"] += 1
+        _recent.append(entry)
+    return entry
+
+def _add(entry: Dict, elapsed_ms: float, rows: int) -> None:
+    """Soma tempo/linhas à execução e ao agregado; registra no log quando passa de SLOW_QUERY_MS."""
+    with _lock:
+        entry["ms"] += elapsed_ms
+        entry["rows"] += rows
+        agg = _aggregates.get(entry["sql"])
+        if agg is not None:
+            agg["total_ms"] += elapsed_ms
+            agg["rows"] += rows
+            agg["max_ms"] = max(agg["max_ms"], entry["ms"])
+        slow = entry["ms"] >= SLOW_QUERY_MS and not entry["logged"]
+        if slow:
+            entry["logged"] = True
+    if slow:
+        logger.warning("Consulta lenta (%.1f ms, %d linhas) em %s: %s", entry["ms"], entry["rows"], entry["caller"], entry["sql"][:500])
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede execute/executemany e as leituras (fetch*) de cada instrução."""
+
+    _entry = None
+
+    def execute(self, sql, parameters=()):
+        entry = self._entry = _begin(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _add(entry, (time.perf_counter() - start) * 1000, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        entry = self._entry = _begin(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _add(entry, (time.perf_counter() - start) * 1000, max(self.rowcount, 0))
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if self._entry is not None:
+            _add(self._entry, (time.perf_counter() - start) * 1000, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._entry is not None:
+            _add(self._entry, (time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if self._entry is not None:
+            _add(self._entry, (time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão cujos atalhos execute/executemany passam pelo InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def _trace(statement: str) -> None:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+    if keyword == "--":
+        keyword = "TRIGGER"
+    with _lock:
+        _traced[keyword] += 1
+
+def install_trace(conn: sqlite3.Connection) -> None:
+    """Registra o trace do SQLite na conexão (conta também o que não passa por um cursor)."""
+    conn.set_trace_callback(_trace)
+
+def top_statements(order_by: str = "total_ms", limit: int = 20) -> List[Dict]:
+    """Instruções agregadas, ordenadas por tempo total ('total_ms') ou quantidade ('count')."""
+    with _lock:
+        rows = [dict(agg, avg_ms=agg["total_ms"] / agg["count"] if agg["count"] else 0.0) for agg in _aggregates.values()]
+    return sorted(rows, key=lambda r: r[order_by], reverse=True)[:limit]
+
+def recent_queries(min_ms: float = 0.0, limit: int = 100) -> List[Dict]:
+    """Execuções mais recentes do buffer circular (as mais novas primeiro)."""
+    with _lock:
+        entries = [dict(e) for e in reversed(_recent) if e["ms"] >= min_ms]
+    return entries[:limit]
+
+def traced_statement_counts() -> Dict[str, int]:
+    with _lock:
+        return dict(_traced)
+
+def reset_stats() -> None:
+    with _lock:
+        _recent.clear()
+        _aggregates.clear()
+        _traced.clear()
@@ -0,0 +1,47 @@
+# security.py
+
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+HASH_SCHEME = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 600_000   # Recomendação OWASP para PBKDF2-HMAC-SHA256
+HASH_WORKERS = 2              # Máximo de hashes simultâneos no processo (limita o pico de CPU em logins)
+
+# O hashlib libera o GIL durante o PBKDF2, então o pool não trava as demais sessões;
+# o tamanho limitado evita que uma rajada de logins ocupe todos os núcleos.
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+def _hash(password: str) -> str:
+    salt = os.urandom(16)
+    digest = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+    return f"{HASH_SCHEME}${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+def _verify(password: str, stored: str) -> Tuple[bool, bool]:
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != HASH_SCHEME:
+        # Senha antiga gravada em texto puro: confere e pede a migração para hash
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+    _, iterations, salt, digest = parts
+    ok = hmac.compare_digest(_pbkdf2(password, bytes.fromhex(salt), int(iterations)), bytes.fromhex(digest))
+    return ok, ok and int(iterations) != PBKDF2_ITERATIONS
+
+def hash_password(password: str) -> str:
+    """Gera o hash PBKDF2 (com salt aleatório) no pool de hashing."""
+    return _hash_executor.submit(_hash, password).result()
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    Confere a senha no pool de hashing. Retorna (senha correta, precisa refazer o hash),
+    onde o segundo valor indica senha em texto puro ou parâmetros de hash desatualizados.
+    """
+    return _hash_executor.submit(_verify, password, stored).result()
+
+def hash_token(token: str) -> str:
+    """Hash rápido para tokens de sessão (aleatórios de 256 bits, não precisam de hash lento)."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
@@ -0,0 +1,94 @@
+# session_store.py
+
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Tuple
+
+from database import add_session, get_session_user, delete_session, delete_expired_sessions
+from security import hash_token
+
+# Dados mínimos do usuário mantidos no servidor por sessão (a senha nunca entra aqui)
+SESSION_FIELDS = ("email", "name", "role")
+SESSION_TTL = timedelta(days=7)
+SESSION_COOKIE = "fadinha_sessao"   # Cookie que restaura a sessão numa aba recarregada (nunca a URL)
+
+# Cache em memória na frente da tabela sessions: reruns da mesma sessão não acessam o banco
+_sessions: Dict[str, Dict] = {}
+_lock = threading.Lock()
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def create_session(user: Dict) -> str:
+    """Registra o usuário autenticado (memória + tabela sessions) e retorna o token da sessão."""
+    token = secrets.token_urlsafe(32)
+    expires_at = (_utcnow() + SESSION_TTL).strftime("%Y-%m-%d %H:%M:%S")
+    session = {field: user[field] for field in SESSION_FIELDS}
+    session["expires_at"] = expires_at
+
+    add_session(hash_token(token), user["email"], expires_at)
+    delete_expired_sessions()
+    now = _utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    with _lock:
+        # Tokens que nunca mais foram usados não ficam na memória até o fim do processo
+        for expired in [t for t, cached in _sessions.items() if cached["expires_at"] <= now]:
+            del _sessions[expired]
+        _sessions[token] = session
+    return token
+
+def get_session(token: str) -> Optional[Dict]:
+    """
+    Busca a sessão pelo token: primeiro na memória, depois uma busca indexada na tabela
+    sessions (ex.: aba recarregada ou servidor reiniciado). Retorna None se expirou.
+    """
+    if not token:
+        return None
+    with _lock:
+        session = _sessions.get(token)
+
+    if session is None:
+        session = get_session_user(hash_token(token))
+        if session is None:
+            return None
+        with _lock:
+            _sessions[token] = session
+
+    if session["expires_at"] <= _utcnow().strftime("%Y-%m-%d %H:%M:%S"):
+        end_session(token)
+        return None
+    return {field: session[field] for field in SESSION_FIELDS}
+
+def end_session(token: str) -> None:
+    """Remove a sessão da memória e do banco."""
+    if not token:
+        return
+    with _lock:
+        _sessions.pop(token, None)
+    delete_session(hash_token(token))
+
+def rotate_session(token: str) -> Optional[Tuple[str, Dict]]:
+    """
+    Troca o token de uma sessão válida por um novo (o antigo deixa de valer) e retorna
+    (novo token, dados do usuário). Usado ao restaurar a sessão pelo cookie, para que um
+    token copiado só funcione até o dono recarregar a página. None se a sessão expirou.
+    """
+    session = get_session(token)
+    if session is None:
+        return None
+    end_session(token)
+    return create_session(session), session
+
+def session_cookie_script(token: str, persistent: bool = True) -> str:
+    """
+    JavaScript que grava (ou apaga, com token vazio) o cookie da sessão no navegador. Com
+    `persistent=False` o cookie vale só até o navegador ser fechado (sessões de administrador).
+    """
+    if not token:
+        attributes = "; Max-Age=0"
+    elif persistent:
+        attributes = f"; Max-Age={int(SESSION_TTL.total_seconds())}"
+    else:
+        attributes = ""
+    return (f"<script>document.cookie = '{SESSION_COOKIE}={token}; Path=/; SameSite=Strict{attributes}'"
+            " + (location.protocol === 'https:' ? '; Secure' : '');</script>")
@@ -0,0 +1,281 @@
+# storage.py
+"""
+Armazenamento das imagens (produtos e referências dos pedidos) atrás de uma interface única.
+
+Backends:
+  - LocalStorage: arquivos no disco do servidor (padrão). Em hospedagens como o Streamlit Cloud
+    esse disco é VOLÁTIL e é apagado a cada nova implantação;
+  - S3Storage: bucket compatível com S3 (AWS S3, MinIO, Cloudflare R2...). Requer boto3.
+
+Configuração por variáveis de ambiente:
+    FADINHA_STORAGE=s3
+    FADINHA_S3_BUCKET=fadinha-imagens
+    FADINHA_S3_ENDPOINT=http://localhost:9000   (opcional: MinIO ou `moto_server` local para testes)
+    Credenciais e região pelas variáveis padrão da AWS (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_DEFAULT_REGION).
+
+As chaves são os caminhos gravados no banco (ex.: product_images/ab/<sha256>.png), iguais nos
+dois backends: trocar de backend é só copiar os objetos, sem migrar o banco.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+STORAGE_BACKEND = os.environ.get("FADINHA_STORAGE", "local")
+STORAGE_CHUNK_SIZE = 1024 * 1024             # Bytes por bloco nas leituras em streaming e cópias
+STORAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024   # LRU em memória dos objetos lidos recentemente
+STORAGE_CACHE_MAX_OBJECT = 8 * 1024 * 1024   # Objetos maiores que isso não entram no LRU
+STORAGE_S3_MAX_CONNECTIONS = 16              # Conexões HTTP mantidas abertas pelo cliente S3
+
+class Storage:
+    """Interface dos backends. `key` é sempre um caminho relativo no formato POSIX."""
+
+    name = "base"
+
+    def put(self, key: str, stream: BinaryIO) -> None:
+        """Grava o conteúdo lido de `stream` (em blocos) sob `key`, substituindo o existente."""
+        raise NotImplementedError
+
+    def put_file(self, key: str, path: Path) -> None:
+        """Grava um arquivo local sob `key`. O arquivo pode ser movido (não use `path` depois)."""
+        with open(path, "rb") as f:
+            self.put(key, f)
+
+    def get(self, key: str) -> bytes:
+        """Conteúdo completo do objeto (FileNotFoundError se não existir)."""
+        return b"".join(self.stream(key))
+
+    def get_range(self, key: str, start: int, length: int) -> bytes:
+        """Lê `length` bytes a partir de `start` sem baixar o objeto inteiro."""
+        raise NotImplementedError
+
+    def stream(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        """Lê o objeto em blocos de até `chunk_size` bytes (FileNotFoundError se não existir)."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Remove o objeto; não é erro se ele não existir."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> Iterator[Tuple[str, int, float]]:
+        """Objetos cuja chave começa com `prefix`: (chave, tamanho em bytes, data de modificação em epoch)."""
+        raise NotImplementedError
+
+class LocalStorage(Storage):
+    """Arquivos em disco, relativos a `root` (por padrão o diretório do app, onde fica product_images/)."""
+
+    name = "local"
+
+    def __init__(self, root: str = "."):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, stream: BinaryIO) -> None:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                shutil.copyfileobj(stream, tmp, STORAGE_CHUNK_SIZE)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_name, target)
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def put_file(self, key: str, path: Path) -> None:
+        # Mesmo disco: um rename atômico, sem copiar os bytes
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(path), target)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def get_range(self, key: str, start: int, length: int) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    def stream(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            yield from iter(lambda: f.read(chunk_size), b"")
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def list(self, prefix: str) -> Iterator[Tuple[str, int, float]]:
+        folder = self._path(prefix)
+        if not folder.is_dir():
+            return
+        for path in folder.rglob("*"):
+            if path.is_file():
+                stat = path.stat()
+                yield path.relative_to(self.root).as_posix(), stat.st_size, stat.st_mtime
+
+    def local_path(self, key: str) -> Path:
+        """Caminho do arquivo no disco (só existe neste backend)."""
+        return self._path(key)
+
+class S3Storage(Storage):
+    """Bucket compatível com S3. O cliente boto3 é criado uma vez e reaproveita as conexões HTTP."""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None):
+        import boto3 # Dependência opcional: só é necessária com FADINHA_STORAGE=s3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3", endpoint_url=endpoint_url,
+            config=Config(max_pool_connections=STORAGE_S3_MAX_CONNECTIONS, retries={"max_attempts": 3, "mode": "standard"})
+        )
+
+    def _not_found(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def _get_object(self, key: str, **kwargs):
+        from botocore.exceptions import ClientError
+        try:
+            return self._client.get_object(Bucket=self.bucket, Key=key, **kwargs)
+        except ClientError as e:
+            if self._not_found(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def put(self, key: str, stream: BinaryIO) -> None:
+        # upload_fileobj envia em partes (multipart) objetos grandes, sem lê-los inteiros
+        self._client.upload_fileobj(stream, self.bucket, key)
+
+    def put_file(self, key: str, path: Path) -> None:
+        self._client.upload_file(str(path), self.bucket, key)
+        Path(path).unlink(missing_ok=True)
+
+    def get(self, key: str) -> bytes:
+        return self._get_object(key)["Body"].read()
+
+    def get_range(self, key: str, start: int, length: int) -> bytes:
+        return self._get_object(key, Range=f"bytes={start}-{start + length - 1}")["Body"].read()
+
+    def stream(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        body = self._get_object(key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if self._not_found(e):
+                return False
+            raise
+
+    def list(self, prefix: str) -> Iterator[Tuple[str, int, float]]:
+        for page in self._client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"], obj["Size"], obj["LastModified"].timestamp()
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> Storage:
+    """Backend configurado (criado na primeira chamada e compartilhado pelo processo)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "s3":
+                    _storage = S3Storage(os.environ["FADINHA_S3_BUCKET"], os.environ.get("FADINHA_S3_ENDPOINT") or None)
+                else:
+                    _storage = LocalStorage()
+    return _storage
+
+def set_storage(storage: Storage) -> None:
+    """Troca o backend em uso (benchmarks e ferramentas de migração) e esvazia o LRU."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+    clear_cache()
+
+# --- LRU de objetos lidos recentemente ---
+# Imagens endereçadas por conteúdo nunca mudam sob a mesma chave; ainda assim put/delete
+# feitos por este processo descartam a entrada.
+
+_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "bytes": 0}
+
+def _forget(key: str) -> None:
+    with _cache_lock:
+        data = _cache.pop(key, None)
+        if data is not None:
+            _cache_stats["bytes"] -= len(data)
+
+def read_object(key: str) -> Optional[bytes]:
+    """Conteúdo do objeto, do LRU em memória quando possível. None se o objeto não existir."""
+    with _cache_lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return data
+        _cache_stats["misses"] += 1
+
+    try:
+        data = get_storage().get(key)
+    except FileNotFoundError:
+        return None
+
+    if len(data) <= STORAGE_CACHE_MAX_OBJECT:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = data
+                _cache_stats["bytes"] += len(data)
+            while _cache_stats["bytes"] > STORAGE_CACHE_MAX_BYTES:
+                _, evicted = _cache.popitem(last=False)
+                _cache_stats["bytes"] -= len(evicted)
+    return data
+
+def put_object(key: str, stream: BinaryIO) -> None:
+    get_storage().put(key, stream)
+    _forget(key)
+
+def put_object_file(key: str, path: Path) -> None:
+    get_storage().put_file(key, path)
+    _forget(key)
+
+def delete_object(key: str) -> None:
+    get_storage().delete(key)
+    _forget(key)
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+        _cache_stats["bytes"] = 0
+
+def get_storage_stats() -> Dict:
+    with _cache_lock:
+        stats = dict(_cache_stats, cached=len(_cache))
+    stats["backend"] = get_storage().name
+    return stats
@@ -0,0 +1,190 @@
+# thumbnails.py
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Optional, Dict, Tuple, Union
+
+from storage import STORAGE_CACHE_MAX_OBJECT, LocalStorage, get_storage
+
+THUMBNAIL_FOLDER = Path(".thumbnail_cache")
+THUMBNAIL_SIZES = (100, 200, 800)               # Larguras geradas (px); pedidos são arredondados para cima
+THUMBNAIL_QUALITY = 80                          # Qualidade WebP das miniaturas
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024   # Orçamento do cache em disco (LRU)
+THUMBNAIL_SPOOL_MAX_MEMORY = 4 * 1024 * 1024    # Original baixado (S3) fica em memória até isso; acima vai para um arquivo temporário
+
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+# (caminho, mtime_ns, tamanho) -> sha256 do conteúdo, para não reler a imagem original a cada rerun.
+# _lock protege só este dicionário: downloads e renderizações rodam em paralelo entre as sessões
+_source_hashes: Dict[Tuple[str, int, int], str] = {}
+_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+def _size_bucket(width: int) -> int:
+    """Menor tamanho pré-definido que atende a largura pedida."""
+    for size in THUMBNAIL_SIZES:
+        if width <= size:
+            return size
+    return THUMBNAIL_SIZES[-1]
+
+def _source_hash(path: Path, stat: os.stat_result) -> str:
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        digest = _source_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _lock:
+            _source_hashes[key] = digest
+    return digest
+
+def _source_digest(image_path: str) -> Optional[str]:
+    """
+    Hash do conteúdo da imagem original, sem baixá-la quando possível: no endereçamento por
+    conteúdo o nome do arquivo já é o hash. None se a imagem (local) não existir.
+    """
+    stem = Path(image_path).stem
+    if _HASH_NAME.match(stem):
+        return stem
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        source = storage.local_path(image_path)
+        try:
+            return _source_hash(source, source.stat())
+        except OSError:
+            return None
+    return hashlib.sha256(image_path.encode("utf-8")).hexdigest()
+
+def _render_thumbnail(source: BinaryIO, target: Path, size: int) -> None:
+    """
+    Redimensiona para a largura `size`, corrige a orientação EXIF e grava em WebP. A escrita é atômica
+    (arquivo temporário único + os.replace): duas sessões gerando a mesma miniatura não se atrapalham.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        img.draft("RGB", (size, size)) # JPEG: decodifica já reduzido (1/2, 1/4, 1/8), sem a imagem inteira na memória
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        if img.width > size:
+            img = img.resize((size, max(1, round(img.height * size / img.width))), Image.LANCZOS)
+        tmp_path = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        img.save(tmp_path, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+    os.replace(tmp_path, target)
+
+def _evict_if_needed(keep: Path) -> None:
+    """
+    Remove as miniaturas menos usadas recentemente até caber no orçamento de bytes (exceto `keep`).
+    Se outra sessão já estiver fazendo a limpeza, retorna sem esperar.
+    """
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        _evict(keep)
+    finally:
+        _evict_lock.release()
+
+def _evict(keep: Path) -> None:
+    entries = []
+    total = 0
+    for entry in os.scandir(THUMBNAIL_FOLDER):
+        if entry.is_file() and entry.name.endswith(".webp"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue # Substituída ou removida por outra sessão durante a varredura
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= THUMBNAIL_CACHE_MAX_BYTES:
+        return
+    for _, size, path in sorted(entries):
+        if path == str(keep):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= THUMBNAIL_CACHE_MAX_BYTES:
+            break
+
+def get_thumbnail(image_path: str, width: int) -> Optional[Union[str, bytes]]:
+    """
+    Retorna o caminho (cache local) de uma miniatura da imagem com pelo menos `width` px de largura,
+    gerando-a uma única vez por conteúdo/tamanho: a imagem original só é lida do armazenamento
+    (storage.py, disco ou S3) quando a miniatura ainda não existe, direto do arquivo local ou
+    baixada em blocos para um arquivo temporário (sem passar pelo LRU de objetos do storage).
+    Retorna None se a imagem original não existir e os bytes originais (se couberem em
+    STORAGE_CACHE_MAX_OBJECT) quando não for possível gerar a miniatura.
+    """
+    if not image_path:
+        return None
+
+    size = _size_bucket(width)
+    source = None
+    try:
+        digest = _source_digest(image_path)
+        if digest is None:
+            return None
+        target = THUMBNAIL_FOLDER / f"{digest}_{size}.webp"
+        try:
+            os.utime(target) # Já gerada: marca como usada recentemente (LRU)
+            return str(target)
+        except FileNotFoundError:
+            pass
+        
+        source = _open_source(image_path)
+        if source is None:
+            return None
+        THUMBNAIL_FOLDER.mkdir(exist_ok=True)
+        _render_thumbnail(source, target, size)
+        _evict_if_needed(keep=target)
+        return str(target)
+    except Exception as e:
+        print(f"Aviso: Não foi possível gerar a miniatura de {image_path}: {e}")
+        return _fallback_bytes(source)
+    finally:
+        if source is not None:
+            source.close()
+
+def _open_source(image_path: str) -> Optional[BinaryIO]:
+    """Abre a imagem original para leitura: o arquivo local ou uma cópia temporária baixada em blocos."""
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        try:
+            return open(storage.local_path(image_path), "rb")
+        except FileNotFoundError:
+            return None
+    spool = tempfile.SpooledTemporaryFile(max_size=THUMBNAIL_SPOOL_MAX_MEMORY)
+    try:
+        for chunk in storage.stream(image_path):
+            spool.write(chunk)
+    except FileNotFoundError:
+        spool.close()
+        return None
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def _fallback_bytes(source: Optional[BinaryIO]) -> Optional[bytes]:
+    """Bytes da original para exibir sem miniatura (formato que o PIL não abre), só se for pequena."""
+    if source is None:
+        return None
+    try:
+        source.seek(0, os.SEEK_END)
+        if source.tell() > STORAGE_CACHE_MAX_OBJECT:
+            return None
+        source.seek(0)
+        return source.read()
+    except Exception:
+        return None
@@ -1,7 +1,7 @@
 # utils.py
 
 from pathlib import Path
-from database import IMAGE_FOLDER 
+from image_store import store_stream
 
 COR_PRINCIPAL = "#FFC0CB" # Rosa
 LOGO_PATH = "logo.png"
@@ -9,19 +9,136 @@ NUMERO_CONTATO = "+5535992645905"
 
 def save_uploaded_file(uploaded_file):
     """
-    Salva o arquivo enviado para a pasta product_images. 
-    Aviso: Em ambientes de hospedagem como Streamlit Cloud, esta pasta é VOLÁTIL.
+    Salva o arquivo enviado no armazenamento de imagens (storage.py), endereçado pelo hash do conteúdo
+    (uploads com o mesmo nome não se sobrescrevem e imagens idênticas são gravadas uma vez só).
+    Aviso: com o armazenamento local (padrão), em hospedagens como o Streamlit Cloud a pasta
+    product_images é VOLÁTIL; configure FADINHA_STORAGE=s3 para manter as imagens fora do servidor.
     """
     if uploaded_file is None:
         return None
 
-    file_path = IMAGE_FOLDER / uploaded_file.name
-    
     try:
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        return str(file_path)
+        uploaded_file.seek(0)
+        return store_stream(uploaded_file, Path(uploaded_file.name).suffix)
     except Exception as e:
         print(f"Erro ao salvar arquivo: {e}")
         return None
+
+def format_brl(values):
+    """
+    Formata uma Series de valores como moeda ("R$ 1234,56") de forma vetorizada:
+    trabalha com centavos inteiros em vez de formatar linha a linha.
+    Negativos levam o sinal antes do símbolo ("-R$ 0,50") e valores ausentes (NaN) viram "—".
+    """
+    numbers = values.astype(float)
+    cents = (numbers.fillna(0) * 100).round().astype("int64")
+    magnitude = cents.abs() # Divisão inteira de negativos arredonda para baixo: formata o valor absoluto
+    text = "R$ " + (magnitude // 100).astype(str) + "," + (magnitude % 100).astype(str).str.zfill(2)
+    return text.where(cents >= 0, "-" + text).where(numbers.notna(), "—")
+
+def table_pager(key: str, total: int, page_size: int, filters=None) -> int:
+    """
+    Navegação Anterior/Próxima para tabelas paginadas. Retorna o índice (0..) da página atual;
+    volta para a primeira página quando `filters` (busca/ordenação) muda.
+    """
+    import streamlit as st
+
+    page_count = max(1, -(-total // page_size))
+    page_key = f"{key}_page"
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[page_key] = 0
+    page = min(st.session_state.get(page_key, 0), page_count - 1)
+    st.session_state[page_key] = page
+
+    def move(step: int):
+        st.session_state[page_key] = page + step
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("◀ Anterior", key=f"{key}_prev", disabled=page == 0, on_click=move, args=(-1,))
+    with col_page:
+        st.caption(f"Página {page + 1} de {page_count} ({total} registros)")
+    with col_next:
+        st.button("Próxima ▶", key=f"{key}_next", disabled=page >= page_count - 1, on_click=move, args=(1,))
+    return page
+
+def catalog_picker(key: str, label: str, empty_message: str = "Nenhum produto encontrado."):
+    """
+    Busca + seleção de produto paginada: consulta apenas a página atual do catálogo
+    (FTS5 por nome/descrição) e navega entre páginas pela chave do último item.
+    Retorna o produto selecionado (dict) ou None.
+    """
+    import streamlit as st
+    from database import search_products, CATALOG_PAGE_SIZE
+
+    search = st.text_input("🔎 Buscar produto", key=f"{key}_search", placeholder="Digite parte do nome ou da descrição")
+    
+    # Pilha com as chaves (name, id) do início de cada página visitada; reinicia quando a busca muda
+    pages_key = f"{key}_pages"
+    if st.session_state.get(pages_key, {}).get("search") != search:
+        st.session_state[pages_key] = {"search": search, "stack": [None]}
+    stack = st.session_state[pages_key]["stack"]
+
+    products = search_products(search, after=stack[-1], limit=CATALOG_PAGE_SIZE + 1)
+    has_next = len(products) > CATALOG_PAGE_SIZE
+    products = products[:CATALOG_PAGE_SIZE]
+
+    if not products:
+        st.info(empty_message)
+        return None
+
+    options = {p['id']: p for p in products}
+    selected_id = st.selectbox(
+        label,
+        options=list(options.keys()),
+        format_func=lambda product_id: f"#{product_id} · {options[product_id]['name']}",
+        key=f"{key}_select"
+    )
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("◀ Anterior", key=f"{key}_prev", disabled=len(stack) == 1, on_click=stack.pop)
+    with col_page:
+        st.caption(f"Página {len(stack)}")
+    with col_next:
+        last = products[-1]
+        st.button("Próxima ▶", key=f"{key}_next", disabled=not has_next, on_click=stack.append, args=((last['name'], last['id']),))
+
+    return options.get(selected_id)
+
+def export_panel(kind: str):
+    """Botões de exportação CSV/PDF gerada em segundo plano, com status e download do arquivo pronto."""
+    import streamlit as st
+    from exports import start_export, get_export_job
+
+    jobs_key = f"export_jobs_{kind}"
+    jobs = st.session_state.setdefault(jobs_key, {})
+
+    col_csv, col_pdf, col_refresh = st.columns(3)
+    with col_csv:
+        if st.button("📄 Gerar CSV", key=f"{kind}_export_csv"):
+            jobs["csv"] = start_export(kind, "csv")
+    with col_pdf:
+        if st.button("🧾 Gerar PDF", key=f"{kind}_export_pdf"):
+            jobs["pdf"] = start_export(kind, "pdf")
+    with col_refresh:
+        st.button("🔄 Atualizar status", key=f"{kind}_export_refresh")
+
+    for fmt, job_id in jobs.items():
+        job = get_export_job(job_id)
+        if not job or (job["status"] == "done" and not Path(job["path"]).exists()):
+            continue
+        if job["status"] == "done":
+            # Função em vez dos bytes: o arquivo só é lido quando o botão é clicado, e não a cada rerun
+            st.download_button(
+                f"⬇️ Baixar {fmt.upper()} ({job['rows']} linhas)",
+                data=lambda path=job["path"]: Path(path).read_bytes(),
+                file_name=f"fadinha_{kind}.{fmt}",
+                mime="text/csv" if fmt == "csv" else "application/pdf",
+                key=f"{kind}_export_download_{fmt}"
+            )
+        elif job["status"] == "error":
+            st.error(f"Erro ao gerar {fmt.upper()}: {job['error']}")
+        else:
+            st.info(f"Gerando {fmt.upper()}... {job['rows']} linhas processadas.")